@@ -1,4 +1,5 @@
 import os
+import sys
 import discordmovies
 import argparse
 from dotenv import load_dotenv
@@ -44,6 +45,14 @@ parser.add_argument('--max-messages', action='store', type=int,
                          'large amount may result in rate limiting.',
                     default=100)
 
+parser.add_argument('--archive', action='store', type=str, nargs='+',
+                    help='Read messages from exports of the channels, such as '
+                         'those of DiscordChatExporter, instead of from '
+                         'Discord. Takes JSON or JSONL files or folders of '
+                         'them. No token is needed, and the whole export is '
+                         'read regardless of --max-messages.',
+                    default=None)
+
 parser.add_argument('--no-bot', action='store_true',
                     help='Use if token is not a bot token.')
 
@@ -56,6 +65,70 @@ parser.add_argument('--reformat-sheet', action='store_true',
                          'on by default.',
                     default=False)
 
+parser.add_argument('--report', action='store_true',
+                    help='Also write statistics about the movies, such as '
+                         'suggestions and watch rates per user and genre. '
+                         'Sheets get a Report tab, CSV files a JSON file next '
+                         'to them.',
+                    default=False)
+
+parser.add_argument('--merge-similar', action='store_true',
+                    help='Also merge titles that only look alike, such as '
+                         'the same film linked from IMDB and MyAnimeList '
+                         'under different names. Setting DEDUPE_THRESHOLD '
+                         'turns this on too.',
+                    default=False)
+
+parser.add_argument('--fresh', action='store_true',
+                    help='Look every new movie up again, rather than using '
+                         'the metadata an interrupted run saved for the '
+                         'same file.',
+                    default=False)
+
+parser.add_argument('--time-budget', action='store', type=float,
+                    help='Only gather metadata for this many seconds, then '
+                         'write what was found. The remaining movies are '
+                         'added by the next run.',
+                    default=None)
+
+parser.add_argument('--flush-every', action='store', type=int,
+                    help='Write movies in batches of this many while the '
+                         'metadata of the rest is gathered, newest first, so '
+                         'they show up sooner on large runs.',
+                    default=None)
+
+parser.add_argument('--flush-interval', action='store', type=float,
+                    help='Like --flush-every, but write the movies gathered '
+                         'so far every this many seconds.',
+                    default=None)
+
+parser.add_argument('--shard', action='store', choices=["watched", "year"],
+                    help='Keep the first tab of the Google Sheet small by '
+                         'moving movies to other tabs of it: watched movies '
+                         'to a Watched tab, or movies suggested in past years '
+                         'to a tab per year.',
+                    default=None)
+
+parser.add_argument('--changelog', action='store', type=str,
+                    help='Append the movies added, removed, updated and '
+                         'watched in each run to this file, as JSON lines, '
+                         'so other programs only have to read the changes.',
+                    default=None)
+
+parser.add_argument('--serve', action='store', type=int, nargs='?',
+                    const=8000,
+                    help='Once the file is up to date, answer queries about '
+                         'its movies over HTTP on the given port, 8000 by '
+                         'default, from a copy kept in memory. Kept up to '
+                         'date when listening or watching, otherwise through '
+                         '--changelog. See README.md for the queries.',
+                    default=None)
+
+parser.add_argument('--serve-host', action='store', type=str,
+                    help='The address to serve queries on, 127.0.0.1 by '
+                         'default so only this machine can reach it.',
+                    default=None)
+
 parser.add_argument('--attributes', action='store',
                     help='What attributes each movie should have. Things like'
                          'User Score, Genres and Runtime. By default will have'
@@ -67,10 +140,196 @@ parser.add_argument('--exclude-attributes', action='store',
                          'Takes a list of strings.',
                     default=None)
 
+parser.add_argument('--listen', action='store_true',
+                    help='Keep running after the file is up to date and '
+                         'update it as messages are sent, edited or deleted, '
+                         'using the Discord Gateway. Bots need the Message '
+                         'Content intent enabled.',
+                    default=False)
+
+parser.add_argument('--watch', action='store', type=float, nargs='?',
+                    const=300,
+                    help='Keep running after the file is up to date and check '
+                         'for new messages every given amount of seconds, '
+                         '300 by default. Cheaper than running the program '
+                         'again each time since the file and connections are '
+                         'kept.',
+                    default=None)
+
+parser.add_argument('--full-sync-every', action='store', type=int,
+                    help='When watching, how many checks to make before '
+                         'looking through the whole channel again for edited '
+                         'and deleted messages.',
+                    default=None)
+
+parser.add_argument('--debounce', action='store', type=float,
+                    help='When listening or watching, wait until nothing has '
+                         'changed for this many seconds before writing to '
+                         'the file.',
+                    default=None)
+
+parser.add_argument('--metrics-json', action='store', type=str,
+                    help='A file to write run metrics to as JSON. Includes '
+                         'stage timings, API calls per provider and cache '
+                         'hit rates.',
+                    default=None)
+
+parser.add_argument('--metrics-prometheus', action='store', type=str,
+                    help='A file to write run metrics to in the Prometheus '
+                         'text format, for the textfile collector.',
+                    default=None)
+
+parser.add_argument('--profile', action='store', type=str, nargs='?',
+                    const='profile',
+                    help='Profile the run with cProfile and tracemalloc and '
+                         'write the results to the given directory, '
+                         '"profile" by default. Writes a pstats file, '
+                         'collapsed stacks for flamegraphs and the top '
+                         'allocations of each stage.',
+                    default=None)
+
+parser.add_argument('--jobs', action='store', type=str,
+                    help='A JSON file listing many channels and files to '
+                         'update at once, in a single process that shares '
+                         'connections and looked up metadata between them. '
+                         'See README.md for the format.',
+                    default=None)
+
+parser.add_argument('--workers', action='store', type=int,
+                    help='How many jobs from --jobs to run at once.',
+                    default=None)
+
 args = parser.parse_args()
 
 load_dotenv()
 
+
+def write_metrics():
+    if args.metrics_json is None:
+        metrics_json = os.environ.get("METRICS_JSON")
+    else:
+        metrics_json = args.metrics_json
+
+    if args.metrics_prometheus is None:
+        metrics_prometheus = os.environ.get("METRICS_PROMETHEUS")
+    else:
+        metrics_prometheus = args.metrics_prometheus
+
+    if metrics_json or metrics_prometheus:
+        from discordmovies.metrics import metrics
+
+        if metrics_json:
+            metrics.write_json(metrics_json)
+        if metrics_prometheus:
+            metrics.write_prometheus(metrics_prometheus)
+
+
+if args.time_budget is None and "TIME_BUDGET" in os.environ:
+    time_budget = float(os.environ["TIME_BUDGET"])
+else:
+    time_budget = args.time_budget
+
+if args.flush_every is None and "FLUSH_EVERY" in os.environ:
+    flush_every = int(os.environ["FLUSH_EVERY"])
+else:
+    flush_every = args.flush_every
+
+if args.flush_interval is None and "FLUSH_INTERVAL" in os.environ:
+    flush_interval = float(os.environ["FLUSH_INTERVAL"])
+else:
+    flush_interval = args.flush_interval
+
+if args.shard is None and "SHARD" in os.environ:
+    shard = os.environ["SHARD"] or None
+else:
+    shard = args.shard
+
+if args.changelog is None and "CHANGELOG" in os.environ:
+    changelog = os.environ["CHANGELOG"] or None
+else:
+    changelog = args.changelog
+
+if args.serve is None and "SERVE_PORT" in os.environ:
+    serve = int(os.environ["SERVE_PORT"])
+else:
+    serve = args.serve
+
+if args.serve_host is None:
+    serve_host = os.environ.get("SERVE_HOST", "127.0.0.1")
+else:
+    serve_host = args.serve_host
+
+if not args.report:
+    if "REPORT" in os.environ:
+        report = ast.literal_eval(os.environ["REPORT"])
+    else:
+        report = False
+else:
+    report = True
+
+if not args.merge_similar:
+    if "MERGE_SIMILAR" in os.environ:
+        merge_similar = ast.literal_eval(os.environ["MERGE_SIMILAR"])
+    else:
+        merge_similar = "DEDUPE_THRESHOLD" in os.environ
+else:
+    merge_similar = True
+
+if not args.fresh:
+    if "FRESH" in os.environ:
+        fresh = ast.literal_eval(os.environ["FRESH"])
+    else:
+        fresh = False
+else:
+    fresh = True
+
+run_options = discordmovies.RunOptions(
+    report=report,
+    time_budget=time_budget,
+    shard=shard,
+    changelog=changelog,
+    flush_every=flush_every,
+    flush_interval=flush_interval,
+    serve=serve,
+    serve_host=serve_host,
+    merge_similar=merge_similar,
+    fresh=fresh
+)
+
+if args.jobs is None:
+    jobs_config = os.environ.get("JOBS_CONFIG")
+else:
+    jobs_config = args.jobs
+
+if jobs_config:
+    from discordmovies.jobs import JobRunner
+
+    if serve is not None:
+        raise TypeError('Queries can only be served for a single file, not '
+                        'for jobs.')
+
+    # Anything set on the command line or in the environment that isn't
+    # specific to a single channel is used for jobs that don't set it.
+    job_defaults = {"bot": not args.no_bot}
+    if args.token or "DISCORD_AUTH_TOKEN" in os.environ:
+        job_defaults["token"] = args.token or os.environ["DISCORD_AUTH_TOKEN"]
+    if "TMDB_API_KEY" in os.environ:
+        job_defaults["tmdb_api_key"] = os.environ["TMDB_API_KEY"]
+    if args.output or "OUTPUT_TYPE" in os.environ:
+        job_defaults["output"] = args.output or os.environ["OUTPUT_TYPE"]
+    job_defaults.update(run_options.changed())
+
+    if args.workers is None and "WORKERS" in os.environ:
+        workers = int(os.environ["WORKERS"])
+    else:
+        workers = args.workers
+
+    runner = JobRunner.from_file(jobs_config, defaults=job_defaults,
+                                 workers=workers)
+    failures = runner.run()
+    write_metrics()
+    sys.exit(1 if failures else 0)
+
 sheet_outs = ["sheet", "all"]
 csv_outs = ["csv", "all"]
 
@@ -89,7 +348,14 @@ else:
         raise TypeError("Output must be specified either as an argument or in "
                         "environment.")
 
-if not args.token:
+if args.archive is None and "ARCHIVE" in os.environ:
+    archive = os.environ["ARCHIVE"].split(os.pathsep)
+else:
+    archive = args.archive
+
+if archive:
+    token = None
+elif not args.token:
     from dotenv import load_dotenv
 
     load_dotenv()
@@ -191,6 +457,44 @@ if args.exclude_attributes is None:
 else:
     exclude_attributes = ast.literal_eval(args.exclude_attributes)
 
+if not args.listen:
+    if "LISTEN" in os.environ:
+        listen = os.environ["LISTEN"]
+        listen = ast.literal_eval(listen)
+    else:
+        listen = False
+else:
+    listen = True
+
+if args.watch is None:
+    if "WATCH_INTERVAL" in os.environ:
+        watch = float(os.environ["WATCH_INTERVAL"])
+    else:
+        watch = None
+else:
+    watch = args.watch
+
+if args.full_sync_every is None:
+    full_sync_every = int(os.environ.get("FULL_SYNC_EVERY", 12))
+else:
+    full_sync_every = args.full_sync_every
+
+if args.debounce is None:
+    debounce = float(os.environ.get("DEBOUNCE", 0))
+else:
+    debounce = args.debounce
+
+if listen and watch is not None:
+    raise TypeError('Please choose either listening or watching, not both.')
+
+if archive and (listen or watch is not None):
+    raise TypeError('Archives can only be read once, not listened to or '
+                    'watched.')
+
+if (listen or watch is not None) and output == "all":
+    raise TypeError('Listening and watching only support a single output '
+                    'type, please choose either "sheet" or "csv".')
+
 filename = args.filename
 max_messages = args.max_messages
 
@@ -200,20 +504,52 @@ if output in sheet_outs:
 if output in csv_outs:
     output_types.append("csv")
 
-for i in output_types:
-    discordmovies.DiscordMovies(
-        discord_auth_token=token,
-        bot=bot,
-        doc_name=filename,
-        attributes=attributes,
-        exclude_attributes=exclude_attributes
-    ).discord_to_file(
-        channel_id=channel_id,
-        watched_channel_id=watched_channel_id,
-        sheet_id=sheet_id,
-        max_messages=max_messages,
-        tmdb_api_key=tmdb_api_key,
-        filetype=i,
-        remove_watched=remove_watched,
-        reformat_sheet=reformat_sheet
-    )
+profiler = None
+if args.profile:
+    from discordmovies.profiling import Profiler
+
+    profiler = Profiler(directory=args.profile).start()
+
+files = []
+try:
+    for i in output_types:
+        movies = discordmovies.DiscordMovies(
+            discord_auth_token=token,
+            bot=bot,
+            doc_name=filename,
+            attributes=attributes,
+            exclude_attributes=exclude_attributes
+        )
+        options = dict(
+            channel_id=channel_id,
+            watched_channel_id=watched_channel_id,
+            sheet_id=sheet_id,
+            max_messages=max_messages,
+            tmdb_api_key=tmdb_api_key,
+            filetype=i,
+            remove_watched=remove_watched,
+            reformat_sheet=reformat_sheet,
+            options=run_options
+        )
+        if listen:
+            movies.listen(debounce=debounce, **options)
+        elif watch is not None:
+            movies.watch(interval=watch, full_sync_every=full_sync_every,
+                         debounce=debounce, **options)
+        else:
+            if archive:
+                run_options["archive"] = archive
+                options.update(source="archive")
+            files.append((movies, movies.discord_to_file(**options)))
+
+    if serve is not None and files:
+        # The first file written, the Google Sheet when writing both.
+        movies, file = files[0]
+        write_metrics()
+        movies.serve(file=file, host=serve_host, port=serve,
+                     changelog=changelog)
+finally:
+    if profiler is not None:
+        profiler.stop()
+
+write_metrics()
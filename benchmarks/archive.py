@@ -0,0 +1,153 @@
+"""
+Benchmark of reading channel exports instead of the Discord API. First a CSV
+file is created from the stand-in server's Discord and from exports of the
+same channels, and the two are checked to have the same movies. Then a large
+export is parsed as JSON and as JSONL, in one process and in several, next
+to loading it whole with json.load. Peak memory is that of the parsing
+process, traced with tracemalloc.
+
+    python -m benchmarks.archive --movies 200 --messages 100000 --workers 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def rows(path: str) -> list:
+    with open(path, newline="") as f:
+        return sorted(list(csv.reader(f))[1:])
+
+
+def measure(function) -> dict:
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": round(seconds, 4), "peak_bytes": peak,
+            "links": len(result)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.archive",
+        description="Benchmark of reading channel exports.")
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=100000,
+                        help="Size of the export that's parsed.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    results = {"pipeline": {}, "parse": {"messages": args.messages}}
+    failed = False
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0)
+    channels = [dataset.movie_channel_id, dataset.watched_channel_id]
+
+    with StubServer(dataset=dataset, latency={"discord": args.latency}) as \
+            server, tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.inputmodules import archive
+        from discordmovies.inputmodules.metadata.cache import cache
+        from discordmovies.metrics import metrics
+
+        exports = os.path.join(directory, "exports")
+        os.mkdir(exports)
+        for i in channels:
+            dataset.write_archive(os.path.join(exports, f"{i}.json"), i)
+
+        cwd = os.getcwd()
+        try:
+            for name, options in [
+                    ("discord", {}),
+                    ("archive", {"source": "archive",
+                                 "options": discordmovies.RunOptions(
+                                     archive=[exports])})]:
+                os.mkdir(os.path.join(directory, name))
+                os.chdir(os.path.join(directory, name))
+                cache.clear()
+                metrics.reset()
+                server.reset()
+                start = time.perf_counter()
+                discordmovies.DiscordMovies(
+                    discord_auth_token="stub", doc_name="benchmark"
+                ).discord_to_file(
+                    filetype="csv", channel_id=dataset.movie_channel_id,
+                    watched_channel_id=dataset.watched_channel_id,
+                    max_messages=100000, tmdb_api_key="stub", **options)
+                stages = metrics.to_dict()["stages"]
+                results["pipeline"][name] = {
+                    "wall_time": round(time.perf_counter() - start, 4),
+                    # Reading the movie and watched channels.
+                    "read_seconds": round(sum(
+                        stages[i]["seconds"] for i in
+                        ["fill_movie_list", "mark_watched"]), 4),
+                    "discord_calls": server.stats()["totals"].get(
+                        "discord", 0),
+                    "rows": len(rows("benchmark.csv"))}
+        finally:
+            os.chdir(cwd)
+
+        same = rows(os.path.join(directory, "discord", "benchmark.csv")) == \
+            rows(os.path.join(directory, "archive", "benchmark.csv"))
+        results["pipeline"]["same_rows"] = same
+        failed = failed or not same or \
+            results["pipeline"]["archive"]["discord_calls"] != 0
+
+        # A channel of --messages messages, with links and chatter.
+        large = Dataset(movies=int(args.messages * 0.7), anime=0, anilist=0,
+                        duplicates=0.1, chatter=0.3, watched=0)
+        channel = large.movie_channel_id
+        paths = {"json": os.path.join(directory, "large.json"),
+                 "jsonl": os.path.join(directory, "large.jsonl")}
+        large.write_archive(paths["json"], channel)
+        large.write_archive(paths["jsonl"], channel, jsonl=True)
+        results["parse"]["bytes"] = {i: os.path.getsize(j)
+                                     for i, j in paths.items()}
+
+        def load_whole() -> list:
+            with open(paths["json"], encoding="utf-8") as f:
+                return archive.extract(json.load(f)["messages"])
+
+        cases = {"json.load": load_whole}
+        for kind in ["json", "jsonl"]:
+            for workers in sorted({1, args.workers}):
+                source = archive.Archive([paths[kind]], workers=workers)
+                cases[f"{kind}[workers={workers}]"] = \
+                    lambda source=source: source.get_links(channel)
+
+        # Enough chunks for every worker.
+        archive.CHUNK_SIZE = max(1 << 20, results["parse"]["bytes"][
+            "jsonl"] // (args.workers * 2) + 1)
+        archive.PARALLEL_SIZE = 0
+
+        expected = None
+        for name, function in cases.items():
+            results["parse"][name] = measure(function)
+            links = results["parse"][name]["links"]
+            expected = links if expected is None else expected
+            failed = failed or links != expected
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Benchmark of the changelog against the offline stand-in server. A file is
+created, then movies are suggested, deleted, watched and unwatched in
+Discord and the file is brought up to date. The changelog lines of the second
+run are checked against the changes that were made, and reading them is
+compared to what a consumer would otherwise do: read the whole file again
+and compare it to the copy it had.
+
+    python -m benchmarks.changelog --movies 1000 --changes 20
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def read_rows(path: str) -> dict:
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+
+    return {i[rows[0].index("Link")]: i for i in rows[1:]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.changelog",
+        description="Benchmark of the changelog of each run.")
+    parser.add_argument("--movies", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=20,
+                        help="How many movies of each kind of change.")
+    parser.add_argument("--max-messages", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0,
+                      duplicates=0, chatter=0)
+    rng = random.Random(args.seed)
+    movie_channel = dataset.channels[dataset.movie_channel_id]
+    watched_channel = dataset.channels[dataset.watched_channel_id]
+    watched = [i["content"] for i in watched_channel]
+    unwatched = [i for i in dataset.links if i not in watched]
+
+    picked = rng.sample(unwatched, 3 * args.changes)
+    expected = {"added": picked[:args.changes],
+                "removed": picked[args.changes:2 * args.changes],
+                "watched": picked[2 * args.changes:],
+                "unwatched": rng.sample(watched, args.changes)}
+
+    def messages(channel: list, links: list) -> list:
+        return [i for i in channel if i["content"].split()[-1] in links]
+
+    results = {"movies": args.movies, "changes": args.changes}
+    failed = False
+
+    with StubServer(dataset=dataset) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.links import LinkRegistry
+
+        def sync():
+            discordmovies.DiscordMovies(
+                discord_auth_token="stub", doc_name="benchmark"
+            ).discord_to_file(
+                filetype="csv", channel_id=dataset.movie_channel_id,
+                watched_channel_id=dataset.watched_channel_id,
+                max_messages=args.max_messages, tmdb_api_key="stub",
+                options=discordmovies.RunOptions(
+                    changelog="changelog.jsonl"))
+
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            # Suggested later, after the file is created.
+            for i in messages(movie_channel, expected["added"]):
+                server.delete_message(dataset.movie_channel_id, i["id"])
+            sync()
+            with open("changelog.jsonl") as f:
+                first = [json.loads(i) for i in f]
+            results["first_run_added"] = len(first)
+            failed = failed or len(first) != args.movies - args.changes
+
+            before = read_rows("benchmark.csv")
+            for i in expected["added"]:
+                server.post_message(dataset.movie_channel_id,
+                                    f"check this out {i}")
+            for i in messages(movie_channel, expected["removed"]):
+                server.delete_message(dataset.movie_channel_id, i["id"])
+            for i in expected["watched"]:
+                server.post_message(dataset.watched_channel_id, i)
+            for i in messages(watched_channel, expected["unwatched"]):
+                server.delete_message(dataset.watched_channel_id, i["id"])
+
+            offset = os.path.getsize("changelog.jsonl")
+            sync()
+
+            # What a consumer of the changelog reads.
+            start = time.perf_counter()
+            with open("changelog.jsonl") as f:
+                f.seek(offset)
+                events = [json.loads(i) for i in f]
+            changelog_seconds = time.perf_counter() - start
+
+            # What a consumer without it does.
+            start = time.perf_counter()
+            after = read_rows("benchmark.csv")
+            changed = [i for i in set(before) | set(after)
+                       if before.get(i) != after.get(i)]
+            diff_seconds = time.perf_counter() - start
+
+            found = {}
+            for i in events:
+                found.setdefault(i["event"], set()).add(
+                    LinkRegistry.canonical(i["link"]))
+            results["events"] = {i: len(j) for i, j in found.items()}
+            results["correct"] = {
+                i: found.get(i, set()) == {LinkRegistry.canonical(j)
+                                           for j in expected[i]}
+                for i in expected}
+            results["read"] = {
+                "changelog": {"seconds": round(changelog_seconds, 6),
+                              "bytes": os.path.getsize("changelog.jsonl") -
+                              offset, "lines": len(events)},
+                "whole_file": {"seconds": round(diff_seconds, 6),
+                               "bytes": os.path.getsize("benchmark.csv"),
+                               "changed_rows": len(changed)}}
+            failed = failed or not all(results["correct"].values()) or \
+                len(events) != 4 * args.changes
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
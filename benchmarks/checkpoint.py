@@ -0,0 +1,151 @@
+"""
+Benchmark of resuming interrupted runs against the offline stand-in server.
+A run creating a CSV file is interrupted by TMDB failing partway through
+gathering metadata, and the next run is checked to only look up the movies
+the first one didn't get to. Another interrupted run is followed by one
+starting fresh, which is checked to look every movie up again. Then a run
+with a time budget writes what it finds in time and the next run is
+checked to add the rest.
+
+    python -m benchmarks.checkpoint --movies 200 --interrupt-at 0.6
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks.e2e import run
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def rows(path: str) -> list:
+    with open(path, newline="") as f:
+        return list(csv.reader(f))[1:]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.checkpoint",
+        description="Benchmark of resuming interrupted runs.")
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--interrupt-at", type=float, default=0.6,
+                        help="Fraction of the TMDB calls after which it "
+                             "fails.")
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--time-budget", type=float, default=1.0)
+    parser.add_argument("--max-messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0)
+    movies = len(dataset.expected_links(args.max_messages)["imdb"])
+    results = {"movies": movies, "runs": {}}
+    failed = False
+
+    with StubServer(dataset=dataset, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.inputmodules.metadata.cache import cache
+        from discordmovies.inputmodules.metadata.checkpoint import \
+            checkpoints
+
+        checkpoint = checkpoints.get(name="benchmark", output="csv")
+
+        cwd = os.getcwd()
+        try:
+            for name in ["interrupted", "fresh", "budget"]:
+                os.mkdir(os.path.join(directory, name))
+            os.chdir(os.path.join(directory, "interrupted"))
+
+            # Three calls per movie and the configuration.
+            server.outages["tmdb"] = int((3 * movies + 1) * args.interrupt_at)
+            try:
+                run("csv", dataset, server, args.max_messages)
+                raise AssertionError("The run wasn't interrupted.")
+            except ConnectionError:
+                pass
+            totals = server.stats()["totals"]
+            saved = len(checkpoint.entries)
+            results["runs"]["interrupted"] = {"totals": totals,
+                                              "checkpointed": saved}
+
+            server.outages.clear()
+            cache.clear()
+            result = run("csv", dataset, server, args.max_messages)
+            # The configuration is fetched again by the new process the
+            # next run would be, but not here.
+            budget = {"tmdb": 3 * (movies - saved) + 1}
+            over = {i: result["totals"].get(i, 0) for i in budget
+                    if result["totals"].get(i, 0) > budget[i]}
+            written = len(rows("benchmark.csv"))
+            results["runs"]["resumed"] = {
+                "wall_time": result["wall_time"],
+                "totals": result["totals"], "budget": budget,
+                "over_budget": over, "rows": written,
+                "checkpoint_left": os.path.exists(checkpoint.path)}
+            failed = failed or bool(over) or written != movies or \
+                os.path.exists(checkpoint.path)
+
+            os.chdir(os.path.join(directory, "fresh"))
+            cache.clear()
+            server.outages["tmdb"] = int((3 * movies + 1) * args.interrupt_at)
+            try:
+                run("csv", dataset, server, args.max_messages)
+                raise AssertionError("The run wasn't interrupted.")
+            except ConnectionError:
+                pass
+            server.outages.clear()
+            cache.clear()
+            server.reset()
+            discordmovies.DiscordMovies(
+                discord_auth_token="stub", doc_name="benchmark"
+            ).discord_to_file(
+                filetype="csv", channel_id=dataset.movie_channel_id,
+                watched_channel_id=dataset.watched_channel_id,
+                max_messages=args.max_messages, tmdb_api_key="stub",
+                options=discordmovies.RunOptions(fresh=True))
+            looked_up = server.stats()["totals"].get("tmdb", 0)
+            written = len(rows("benchmark.csv"))
+            results["runs"]["fresh"] = {"tmdb_calls": looked_up,
+                                        "rows": written}
+            failed = failed or looked_up < 3 * movies or written != movies
+
+            os.chdir(os.path.join(directory, "budget"))
+            cache.clear()
+            runs = []
+            while True:
+                server.reset()
+                discordmovies.DiscordMovies(
+                    discord_auth_token="stub", doc_name="benchmark"
+                ).discord_to_file(
+                    filetype="csv", channel_id=dataset.movie_channel_id,
+                    watched_channel_id=dataset.watched_channel_id,
+                    max_messages=args.max_messages, tmdb_api_key="stub",
+                    options=discordmovies.RunOptions(
+                        time_budget=args.time_budget))
+                runs.append(len(rows("benchmark.csv")))
+                if runs[-1] >= movies or len(runs) > 1 and \
+                        runs[-1] == runs[-2]:
+                    break
+            links = [i[7] for i in rows("benchmark.csv")]
+            results["runs"]["budget"] = {
+                "time_budget": args.time_budget,
+                "rows_after_each_run": runs,
+                "duplicates": len(links) - len(set(links))}
+            failed = failed or runs[-1] != movies or \
+                len(links) != len(set(links))
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+End-to-end benchmark of DiscordMovies.discord_to_file against the offline
+stand-in server. Two runs are made: one that creates a new file and one that
+updates it without anything new having been suggested. For sheets a third
+run reformats the sheet while updating it. With --report every run also
+writes the report of the file. For each run the wall
+time and the API calls per provider are reported, and the calls are checked
+against a budget so regressions in request counts fail loudly. A last run
+leaves out a column, so the file is rewritten, and checks it still has a
+single header and every movie once.
+
+    python -m benchmarks.e2e --output csv --movies 200
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def discord_pages(messages: int, max_messages: int) -> int:
+    """
+    The amount of requests Discord.get_messages makes for a channel.
+    """
+
+    pages = 0
+    fetched = 0
+    while fetched < max_messages:
+        pages += 1
+        if fetched >= messages:
+            break
+        fetched += 100
+
+    return pages
+
+
+def budgets(dataset: Dataset, max_messages: int, output: str,
+            new: bool, reformat: bool = False,
+            report: bool = False) -> Dict[str, int]:
+    """
+    The maximum amount of calls each provider may receive during a run.
+    """
+
+    links = dataset.expected_links(max_messages)
+    movie_messages = len(dataset.channels[dataset.movie_channel_id])
+    watched_messages = len(dataset.channels[dataset.watched_channel_id])
+
+    result = {
+        # Paging through both channels.
+        "discord": discord_pages(movie_messages, max_messages) +
+        discord_pages(watched_messages, max_messages),
+        # find, movie and videos per movie, and the configuration once.
+        "tmdb": 3 * len(links["imdb"]) + 1 if new and links["imdb"] else 0,
+        "jikan": len(links["mal"]) + len(links["anilist"]) if new else 0,
+        "anilist": len(links["anilist"]) if new else 0,
+        # A check of each new poster.
+        "images": sum(len(i) for i in links.values()) if new else 0,
+        "sheets": 0
+    }
+
+    if output == "sheet":
+        if new:
+            # The sheet is created with its contents and formatting.
+            result["sheets"] = 1
+        else:
+            # Three existence checks, two reads and the append. At most
+            # every row then has its watched column rewritten.
+            rows = sum(len(i) for i in links.values())
+            result["sheets"] = 6 + rows
+            if reformat:
+                # The formatting is applied in place in one request.
+                result["sheets"] += 1
+        if report:
+            # Looking up the report's tab and replacing its contents, the
+            # rows themselves are already known.
+            result["sheets"] += 2
+
+    return result
+
+
+def run(output: str, dataset: Dataset, server: StubServer,
+        max_messages: int, sheet_id: str = None,
+        reformat: bool = False, report: bool = False,
+        exclude_attributes: list = None) -> dict:
+    import discordmovies
+    from discordmovies.metrics import metrics
+
+    server.reset()
+    metrics.reset()
+    start = time.perf_counter()
+    discordmovies.DiscordMovies(
+        discord_auth_token="stub",
+        doc_name="benchmark",
+        exclude_attributes=exclude_attributes
+    ).discord_to_file(
+        filetype=output,
+        channel_id=dataset.movie_channel_id,
+        watched_channel_id=dataset.watched_channel_id,
+        sheet_id=sheet_id,
+        max_messages=max_messages,
+        tmdb_api_key="stub",
+        reformat_sheet=reformat,
+        options=discordmovies.RunOptions(report=report)
+    )
+    wall = time.perf_counter() - start
+
+    return {"wall_time": round(wall, 4), **server.stats(),
+            "stages": metrics.to_dict()["stages"]}
+
+
+def file_rows(output: str, server: StubServer) -> list:
+    """
+    The rows of the file the runs write, header included.
+    """
+
+    if output == "sheet":
+        doc = list(server.sheets.docs.values())[-1]
+        return doc["tabs"][doc["order"][0]]["rows"]
+
+    with open("benchmark.csv", newline="") as f:
+        return list(csv.reader(f))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.e2e",
+        description="End-to-end benchmark of discord_to_file against the "
+                    "offline stand-in server.")
+    parser.add_argument("--output", choices=["csv", "sheet"], default="csv")
+    parser.add_argument("--movies", type=int, default=100)
+    parser.add_argument("--anime", type=int, default=10)
+    parser.add_argument("--anilist", type=int, default=5)
+    parser.add_argument("--max-messages", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", action="store_true",
+                        help="Write the report of the file in every run.")
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=args.anime,
+                      anilist=args.anilist, seed=args.seed)
+
+    results = {"output": args.output, "runs": {}}
+    failed = False
+
+    with StubServer(dataset=dataset, latency=args.latency) as server:
+        # discordmovies reads its endpoints when imported, so this has to
+        # happen first.
+        os.environ.update(server.env())
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                sheet_id = None
+                runs = [("new", True, False), ("no_changes", False, False)]
+                if args.output == "sheet":
+                    runs.append(("reformat", False, True))
+                for name, new, reformat in runs:
+                    result = run(args.output, dataset, server,
+                                 args.max_messages, sheet_id=sheet_id,
+                                 reformat=reformat, report=args.report)
+                    if sheet_id is None and server.sheets.docs:
+                        sheet_id = list(server.sheets.docs)[-1]
+
+                    budget = budgets(dataset, args.max_messages,
+                                     args.output, new, reformat,
+                                     args.report)
+                    over = {i: result["totals"].get(i, 0) for i in budget
+                            if result["totals"].get(i, 0) > budget[i]}
+                    result["budget"] = budget
+                    result["over_budget"] = over
+                    failed = failed or bool(over)
+                    results["runs"][name] = result
+
+                # Leaving out a column rewrites the whole file.
+                run(args.output, dataset, server, args.max_messages,
+                    sheet_id=sheet_id, exclude_attributes=["Trailer"])
+                rows = [[str(j) for j in i] for i in
+                        file_rows(args.output, server)]
+                movies = sum(len(i) for i in dataset.expected_links(
+                    args.max_messages).values())
+                results["rewritten"] = {
+                    "headers": sum(i == rows[0] for i in rows),
+                    "movies": len(rows) - 1,
+                    "trailer_column": "Trailer" in rows[0]}
+                failed = failed or results["rewritten"]["headers"] != 1 or \
+                    len(rows) - 1 != movies or "Trailer" in rows[0]
+            finally:
+                os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Benchmark of writing movies in batches while metadata is gathered, against
+the offline stand-in server. A new file is created with every movie written
+at the end and with batches flushed along the way, and the time until the
+first movies show up in the file is compared. Both files are checked to hold
+the same movies. Then a run with batches is interrupted by TMDB failing, and
+the file is checked to hold all but at most a batch of the movies that were
+looked up, and to be completed by the next run without duplicates. Last,
+some movies share their title with another one written in a different
+batch, and every link is checked to be written once, and to not be added
+again by the next run.
+
+    python -m benchmarks.flush --output sheet --movies 300 --flush-every 20
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.flush",
+        description="Benchmark of writing movies in batches.")
+    parser.add_argument("--output", choices=["csv", "sheet"], default="csv")
+    parser.add_argument("--movies", type=int, default=300)
+    parser.add_argument("--flush-every", type=int, default=20)
+    parser.add_argument("--interrupt-at", type=float, default=0.5,
+                        help="Fraction of the TMDB calls after which it "
+                             "fails.")
+    parser.add_argument("--same-titles", type=int, default=20,
+                        help="Movies that share their title with another "
+                             "one in the last run.")
+    parser.add_argument("--max-messages", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0)
+    movies = len(dataset.expected_links(args.max_messages)["imdb"])
+    results = {"output": args.output, "movies": movies,
+               "flush_every": args.flush_every, "runs": {}}
+    failed = False
+    contents = {}
+
+    with StubServer(dataset=dataset, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.inputmodules.metadata.cache import cache
+        from discordmovies.inputmodules.metadata.checkpoint import \
+            checkpoints
+        from discordmovies.inputmodules.metadata.posters import \
+            cache as posters
+
+        def rows() -> list:
+            if args.output == "sheet":
+                if not server.sheets.docs:
+                    return []
+                doc = list(server.sheets.docs.values())[-1]
+                return [json.dumps(i) for i in
+                        doc["tabs"][doc["order"][0]]["rows"][1:]]
+            if not os.path.exists("benchmark.csv"):
+                return []
+            with open("benchmark.csv", newline="") as f:
+                return [json.dumps(i) for i in list(csv.reader(f))[1:]]
+
+        def links() -> list:
+            if args.output == "sheet":
+                doc = list(server.sheets.docs.values())[-1]
+                table = doc["tabs"][doc["order"][0]]["rows"]
+            else:
+                with open("benchmark.csv", newline="") as f:
+                    table = list(csv.reader(f))
+            column = table[0].index("Link")
+            return [j for i in table[1:] for j in str(i[column]).split("\n")]
+
+        def sync(flush_every: int = None, sheet_id: str = None) -> dict:
+            server.reset()
+            start = time.perf_counter()
+            first = []
+            done = threading.Event()
+
+            def watch():
+                while not done.wait(0.01):
+                    if rows():
+                        first.append(time.perf_counter() - start)
+                        return
+
+            watcher = threading.Thread(target=watch)
+            watcher.start()
+            try:
+                discordmovies.DiscordMovies(
+                    discord_auth_token="stub", doc_name="benchmark"
+                ).discord_to_file(
+                    filetype=args.output,
+                    channel_id=dataset.movie_channel_id,
+                    watched_channel_id=dataset.watched_channel_id,
+                    sheet_id=sheet_id, max_messages=args.max_messages,
+                    tmdb_api_key="stub", options=discordmovies.RunOptions(
+                        flush_every=flush_every))
+            finally:
+                done.set()
+                watcher.join()
+
+            wall = time.perf_counter() - start
+            return {"wall_time": round(wall, 4),
+                    "first_rows_after": round(first[0] if first else wall, 4),
+                    "sheets_calls": server.stats()["totals"].get("sheets", 0)}
+
+        checkpoint = checkpoints.get(name="benchmark", output=args.output)
+
+        cwd = os.getcwd()
+        try:
+            for name, flush_every in [("at_the_end", None),
+                                      ("flushed", args.flush_every)]:
+                os.mkdir(os.path.join(directory, name))
+                os.chdir(os.path.join(directory, name))
+                cache.clear()
+                posters.entries = None
+                server.sheets.docs.clear()
+                results["runs"][name] = sync(flush_every)
+                contents[name] = sorted(rows())
+            results["same_rows"] = contents["at_the_end"] == \
+                contents["flushed"]
+            failed = failed or not results["same_rows"]
+
+            os.mkdir(os.path.join(directory, "interrupted"))
+            os.chdir(os.path.join(directory, "interrupted"))
+            cache.clear()
+            server.sheets.docs.clear()
+            # Three calls per movie and the configuration.
+            server.outages["tmdb"] = int((3 * movies + 1) *
+                                         args.interrupt_at)
+            try:
+                sync(args.flush_every)
+                raise AssertionError("The run wasn't interrupted.")
+            except ConnectionError:
+                pass
+            server.outages.clear()
+            looked_up = len(checkpoint.entries) + len(rows())
+            written = len(rows())
+            sheet_id = list(server.sheets.docs)[-1] if \
+                server.sheets.docs else None
+            cache.clear()
+            sync(args.flush_every, sheet_id=sheet_id)
+            final = rows()
+            results["runs"]["interrupted"] = {
+                "looked_up": looked_up, "written": written,
+                "rows_after_next_run": len(final),
+                "duplicates": len(final) - len(set(final))}
+            failed = failed or written < looked_up - args.flush_every or \
+                len(final) != movies or len(final) != len(set(final))
+
+            # Titles merged in the same batch, or left as their own rows
+            # when the other movie was flushed before. Half a batch is left
+            # to write at the end, after the others were flushed.
+            server.dataset = Dataset(
+                movies=args.movies + args.flush_every // 2, anime=0,
+                anilist=0, same_titles=args.same_titles)
+            expected = server.dataset.expected_links(args.max_messages)
+            os.mkdir(os.path.join(directory, "same_titles"))
+            os.chdir(os.path.join(directory, "same_titles"))
+            cache.clear()
+            posters.entries = None
+            server.sheets.docs.clear()
+            sync(args.flush_every)
+            written = links()
+            sheet_id = list(server.sheets.docs)[-1] if \
+                server.sheets.docs else None
+            rows_written = len(rows())
+            sync(args.flush_every, sheet_id=sheet_id)
+            results["runs"]["same_titles"] = {
+                "same_titles": server.dataset.same_titles,
+                "rows": rows_written,
+                "links": len(written),
+                "missing_links": len(expected["imdb"] - set(written)),
+                "duplicate_links": len(written) - len(set(written)),
+                "rows_added_by_next_run": len(rows()) - rows_written}
+            failed = failed or set(written) != expected["imdb"] or \
+                len(written) != len(set(written)) or \
+                len(rows()) != rows_written
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Benchmark of the real-time listening mode against the fake gateway of the
+offline stand-in server. After the usual catch-up run, messages are posted,
+edited and deleted through the fake gateway, and the time until each change
+shows up in the file is measured. The connection is also dropped and
+restarted to check that sessions are resumed without missing events.
+
+    python -m benchmarks.gateway --output csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Union
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def wait_for(condition: Callable[[], bool],
+             timeout: float) -> Union[float, None]:
+    """
+    Poll until condition is true. Returns how long that took, or None if it
+    never happened.
+    """
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if condition():
+                return round(time.perf_counter() - start, 4)
+        except (OSError, LookupError, ValueError):
+            # The file may be halfway through being rewritten.
+            pass
+        time.sleep(0.002)
+
+    return None
+
+
+class Rows:
+    """
+    Reads the rows of the file being listened to, be it a CSV file or a sheet
+    on the stand-in server.
+    """
+
+    def __init__(self, output: str, server: StubServer, name: str):
+        self.output = output
+        self.server = server
+        self.name = name
+
+    def __call__(self) -> List[list]:
+        if self.output == "csv":
+            with open(f"{self.name}.csv", newline="") as f:
+                return list(csv.reader(f))
+
+        sheet_id = list(self.server.sheets.docs)[-1]
+        return self.server.sheets.values_get(sheet_id, "A:Z").get(
+            "values", [])
+
+    def row(self, link: str) -> Union[dict, None]:
+        rows = self()
+        link_index = rows[0].index("Link")
+        for i in rows[1:]:
+            if link_index < len(i) and link in i[link_index]:
+                return dict(zip(rows[0], i))
+
+        return None
+
+    def watched(self, link: str) -> bool:
+        row = self.row(link)
+        return row is not None and str(row["Watched"]).lower() == "true"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.gateway",
+        description="Benchmark of listening mode against the offline "
+                    "stand-in server.")
+    parser.add_argument("--output", choices=["csv", "sheet"], default="csv")
+    parser.add_argument("--movies", type=int, default=50)
+    parser.add_argument("--spare", type=int, default=10,
+                        help="Links that are not suggested during the "
+                             "catch-up run, used for new messages.")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=15,
+                        help="Seconds to wait for each change.")
+    args = parser.parse_args()
+
+    # Every IMDB number up to the total amount of links resolves, so give
+    # the anime range room to leave some movies unsuggested.
+    dataset = Dataset(movies=args.movies, anime=args.spare, anilist=0)
+    spare = [f"https://www.imdb.com/title/tt{i:07d}/" for i in
+             range(args.movies + 1, len(dataset.links) + 1)]
+    movies, watched = dataset.movie_channel_id, dataset.watched_channel_id
+
+    results = {"output": args.output, "changes": {}}
+
+    with StubServer(dataset=dataset, latency=args.latency,
+                    heartbeat_interval=1) as server:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.attributes import DiscordAttributes
+        from discordmovies.listener import Listener
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            movie_app = discordmovies.DiscordMovies(discord_auth_token="stub",
+                                                    doc_name="benchmark")
+            listener = Listener(
+                attributes=movie_app.attributes, keys=movie_app.keys,
+                discord_attr=DiscordAttributes(channel_id=movies,
+                                               watched_channel_id=watched,
+                                               max_messages=1000))
+            thread = None
+            try:
+                start = time.perf_counter()
+                listener.connect()
+                file = movie_app.discord_to_file(
+                    filetype=args.output, channel_id=movies,
+                    watched_channel_id=watched, max_messages=1000,
+                    tmdb_api_key="stub")
+                results["catch_up"] = round(time.perf_counter() - start, 4)
+
+                thread = threading.Thread(target=listener.run,
+                                          args=([file],), daemon=True)
+                thread.start()
+                rows = Rows(args.output, server, "benchmark")
+
+                def change(name: str, action: Callable,
+                           condition: Callable[[], bool]):
+                    action()
+                    results["changes"][name] = wait_for(condition,
+                                                        args.timeout)
+
+                message = {}
+                change("create",
+                       lambda: message.update(server.post_message(
+                           movies, f"new one {spare[0]}")),
+                       lambda: rows.row(spare[0]) is not None)
+                change("watched",
+                       lambda: server.post_message(watched, spare[0]),
+                       lambda: rows.watched(spare[0]))
+                change("edit",
+                       lambda: server.edit_message(movies, message["id"],
+                                                   f"actually {spare[1]}"),
+                       lambda: rows.row(spare[0]) is None and
+                       rows.row(spare[1]) is not None)
+                change("delete",
+                       lambda: server.delete_message(movies, message["id"]),
+                       lambda: rows.row(spare[1]) is None)
+
+                def drop_and_post():
+                    server.gateway.drop()
+                    server.post_message(movies, spare[2])
+
+                change("resume_after_drop", drop_and_post,
+                       lambda: rows.row(spare[2]) is not None)
+
+                def reconnect_and_post():
+                    server.gateway.reconnect()
+                    server.post_message(movies, spare[3])
+
+                change("resume_after_reconnect", reconnect_and_post,
+                       lambda: rows.row(spare[3]) is not None)
+            finally:
+                listener.stop()
+                if thread is not None:
+                    thread.join(5)
+                os.chdir(cwd)
+
+        results["gateway_connections"] = server.stats()["calls"].get(
+            "discord", {}).get("gateway.connect", 0)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if None in results["changes"].values() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
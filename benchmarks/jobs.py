@@ -0,0 +1,93 @@
+"""
+Benchmark of running many channels in one process with --jobs, against the
+offline stand-in server. Each job gets its own channel, and the channels
+suggest overlapping sets of titles the way servers with shared members do.
+The same jobs are run once as separate processes one after the other, the
+way a crontab with an entry per channel would, and once with --jobs. Wall
+time and API calls per provider are reported for both.
+
+    python -m benchmarks.jobs --jobs 8 --latency 0.02
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.startup import ROOT
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.jobs",
+        description="Benchmark of --jobs against separate runs per channel.")
+    parser.add_argument("--output", choices=["csv", "sheet"], default="csv")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--movies", type=int, default=100)
+    parser.add_argument("--per-channel", type=int, default=40,
+                        help="Titles suggested in each channel.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0)
+    channels = []
+    for i in range(args.jobs):
+        channel_id = str(100 + i)
+        dataset.channels[channel_id] = dataset.build_messages(
+            [f"check this out {j}" for j in
+             dataset.random.sample(dataset.links, args.per_channel)], 0)
+        channels.append(channel_id)
+
+    results = {"output": args.output, "jobs": args.jobs,
+               "distinct_titles": len({j["content"] for i in channels
+                                       for j in dataset.channels[i]})}
+
+    with StubServer(dataset=dataset, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, **server.env(), "PYTHONPATH": ROOT,
+               "TMDB_API_KEY": "stub", "DISCORD_AUTH_TOKEN": "stub"}
+        script = os.path.join(ROOT, "DiscordMovies.py")
+
+        server.reset()
+        start = time.perf_counter()
+        for i in channels:
+            subprocess.run([sys.executable, script, "--output", args.output,
+                            "--channel-id", i, "--filename", f"separate{i}"],
+                           env=env, cwd=directory, check=True,
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+        results["separate"] = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "calls": server.stats()["totals"]
+        }
+
+        config = os.path.join(directory, "jobs.json")
+        with open(config, "w") as f:
+            json.dump({"defaults": {"output": args.output},
+                       "jobs": [{"channel_id": i, "filename": f"runner{i}"}
+                                for i in channels]}, f)
+
+        server.reset()
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, "--jobs", config,
+                        "--workers", str(args.workers)],
+                       env=env, cwd=directory, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        results["runner"] = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "calls": server.stats()["totals"]
+        }
+
+    print(json.dumps(results, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
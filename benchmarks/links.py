@@ -0,0 +1,126 @@
+"""
+Checks of how links are compared, and a benchmark of comparing them. Every
+path through LinkRegistry.canonical is checked to give the expected form,
+and a registry holding one form of a link is checked to match cells with the
+other forms in them, or not to. Then links from the synthetic dataset are
+added to a registry and matched against cells, and the time taken is
+written out as JSON:
+
+    python -m benchmarks.links --links 100000
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.synthetic import Dataset
+from discordmovies.links import LinkRegistry
+
+# A link, the canonical form it should have and a cell holding another form
+# of it, for each path through LinkRegistry.canonical.
+CASES = {
+    "supported_site": (
+        "https://m.imdb.com/title/tt0000001/?ref_=nv_sr_1",
+        "www.imdb.com/title/tt0000001",
+        "Some Note\nhttp://imdb.com/title/tt0000001"),
+    "slug_after_id": (
+        "https://myanimelist.net/anime/1/Cowboy_Bebop",
+        "myanimelist.net/anime/1",
+        "https://www.myanimelist.net/anime/1/"),
+    "supported_site_without_id": (
+        "https://www.imdb.com/chart/top/",
+        "www.imdb.com/chart/top",
+        "https://imdb.com/chart/top"),
+    "tracking_parameters": (
+        "https://example.com/watch?v=1&utm_source=discord&si=abc",
+        "example.com/watch?v=1",
+        "https://Example.com/watch/?v=1"),
+    "port": (
+        "http://localhost:8080/movies/1",
+        "localhost:8080/movies/1",
+        "https://localhost:8080/movies/1/"),
+    "without_scheme": (
+        "www.imdb.com/title/tt0000002/",
+        "www.imdb.com/title/tt0000002",
+        "https://www.imdb.com/title/tt0000002"),
+    "not_a_url": (
+        "  Some Note ",
+        "Some Note",
+        "Some Note"),
+    "sentence_with_dot": (
+        "Watch it. Soon",
+        "Watch it. Soon",
+        "Watch it. Soon"),
+    "invalid_port": (
+        "imdb.com:port/title/tt0000003",
+        "imdb.com:port/title/tt0000003",
+        "imdb.com:port/title/tt0000003")
+}
+
+# A registry holding the first link, and a cell that must not match it.
+MISMATCHES = {
+    "note_case": ("Some Note", "some note"),
+    "other_title": ("https://www.imdb.com/title/tt0000001/",
+                    "https://www.imdb.com/title/tt0000010/"),
+    "other_query": ("https://example.com/watch?v=1",
+                    "https://example.com/watch?v=2"),
+    "other_port": ("http://localhost:8080/movies/1",
+                   "http://localhost:8081/movies/1")
+}
+
+
+def check() -> dict:
+    failures = []
+    for name, (link, canonical, cell) in CASES.items():
+        if LinkRegistry.canonical(link) != canonical:
+            failures.append(f"canonical {name}: "
+                            f"{LinkRegistry.canonical(link)!r}")
+        if not LinkRegistry([link]).matches(cell):
+            failures.append(f"matches {name}")
+
+    for name, (link, cell) in MISMATCHES.items():
+        if LinkRegistry([link]).matches(cell):
+            failures.append(f"doesn't match {name}")
+
+    return {"cases": len(CASES) + len(MISMATCHES), "failures": failures}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.links",
+        description="Checks and a benchmark of comparing links.")
+    parser.add_argument("--links", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {"checks": check()}
+
+    dataset = Dataset(movies=args.links, anime=0, anilist=0, duplicates=0,
+                      chatter=0)
+    links = dataset.links
+    # The same links as they'd be pasted from the mobile site, with
+    # tracking parameters, two to a cell like merged duplicates.
+    cells = ["\n".join(i.replace("www.", "m.") + "?utm_source=x"
+                       for i in links[j:j + 2])
+             for j in range(0, len(links), 2)]
+
+    start = time.perf_counter()
+    registry = LinkRegistry(links)
+    added = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = sum(registry.matches(i) for i in cells)
+    matching = time.perf_counter() - start
+
+    results["registry"] = {"links": len(links), "add": round(added, 4),
+                           "cells": len(cells), "matched": matched,
+                           "match": round(matching, 4)}
+
+    print(json.dumps(results, indent=2))
+
+    failed = results["checks"]["failures"] or matched != len(cells)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Micro-benchmarks for the MovieList hot paths and the other code that scales
+with the number of movies. Every case is run on synthetic data at each of the
+requested sizes, and the wall time and peak traced memory are written out as
+JSON lines so runs can be compared:
+
+    python -m benchmarks.movielist --sizes 1000 10000 > before.jsonl
+    python -m benchmarks.movielist --sizes 1000 10000 --compare before.jsonl
+
+Time is measured without tracemalloc running since it slows Python down
+considerably, memory is measured in a second, traced run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import signal
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from benchmarks import synthetic
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+
+class CaseTimeout(Exception):
+    pass
+
+
+def case_merge_title(size: int) -> Callable:
+    movies = synthetic.movie_list(size)
+    return lambda: movies.merge_duplicates()
+
+
+def case_merge_similar(size: int) -> Callable:
+    movies = synthetic.fuzzy_movie_list(size)
+    return lambda: movies.merge_similar()
+
+
+def case_merge_link(size: int) -> Callable:
+    movies = synthetic.movie_list(size)
+    return lambda: movies.merge_duplicates(ignore=["Link"], attribute="Link")
+
+
+def case_remove_by_attribute_value(size: int) -> Callable:
+    movies = synthetic.movie_list(size, duplicates=0)
+    # Pretend a tenth of the movies are already present in the file.
+    present = [movies[i]["Link"] for i in range(0, size, 10)]
+    return lambda: movies.remove_by_attribute_value(attribute="Link",
+                                                    value=present)
+
+
+def case_mark_watched(size: int) -> Callable:
+    movies = synthetic.movie_list(size, duplicates=0)
+    watched = [movies[i]["Link"] for i in range(0, size, 4)]
+    return lambda: movies.mark_watched(watched_links=watched)
+
+
+def case_search(size: int) -> Callable:
+    movies = synthetic.movie_list(size, duplicates=0)
+    # Searches after the first use the index it builds.
+    movies.search(value="Movie", attribute="Title")
+    return lambda: movies.search(value="Movie 12345", attribute="Title")
+
+
+def case_search_first(size: int) -> Callable:
+    movies = synthetic.movie_list(size, duplicates=0)
+    return lambda: movies.search(value="Movie 12345", attribute="Title")
+
+
+def case_columns(size: int) -> Callable:
+    movies = synthetic.movie_list(size, duplicates=0)
+    return lambda: movies.columns()
+
+
+def case_columns_select(size: int) -> Callable:
+    columns = synthetic.movie_list(size, duplicates=0).columns()
+    return lambda: columns.select(
+        ~columns.watched & (columns.runtime < 120) & (columns.score > 7) &
+        columns.genre("Horror"), sort="score", descending=True)
+
+
+def case_filter_python(size: int) -> Callable:
+    """
+    The query of case_columns_select done by parsing the text of every
+    movie, the way filtering a MovieList works without the columns.
+    """
+
+    movies = synthetic.movie_list(size, duplicates=0)
+
+    def select():
+        return sorted((i for i in movies if i["Watched"] != "True" and
+                       float(i["Runtime"]) < 120 and
+                       float(i["User Score"]) > 7 and
+                       "Horror" in i["Genres"].split(", ")),
+                      key=lambda i: -float(i["User Score"]))
+
+    return select
+
+
+def case_get_movies_list(size: int) -> Callable:
+    movies = synthetic.movie_list(size, duplicates=0)
+    return lambda: movies.get_movies_list(format_images=True)
+
+
+def case_extract_links(size: int) -> Callable:
+    from discordmovies.inputmodules.discord import Discord
+
+    pages = synthetic.discord_pages(size)
+    return lambda: Discord.extract_links(messages=pages)
+
+
+def case_csv_write_new(size: int) -> Callable:
+    from discordmovies.attributes import DiscordMoviesAttributes
+    from discordmovies.outputmodules.csvhelper import CsvHelper
+
+    directory = tempfile.mkdtemp()
+    attributes = DiscordMoviesAttributes(
+        name=os.path.join(directory, "benchmark"),
+        movie_list=synthetic.movie_list(size, duplicates=0))
+    helper = CsvHelper(attributes)
+    return lambda: helper.write_new()
+
+
+def case_csv_write_existing(size: int) -> Callable:
+    from discordmovies.attributes import DiscordMoviesAttributes
+    from discordmovies.outputmodules.csvhelper import CsvHelper
+
+    directory = tempfile.mkdtemp()
+    movies = synthetic.movie_list(size, duplicates=0)
+    links = [i["Link"] for i in movies]
+    # Every movie is already in the file, a quarter of them watched and a
+    # tenth no longer suggested.
+    attributes = DiscordMoviesAttributes(
+        name=os.path.join(directory, "benchmark"), movie_list=movies,
+        links=[j for i, j in enumerate(links) if i % 10],
+        watched_links=links[::4])
+    helper = CsvHelper(attributes)
+    helper.write_new()
+    attributes["movie_list"] = synthetic.movie_list(0)
+    return lambda: helper.write_existing(overwrite=False)
+
+
+def case_report(size: int) -> Callable:
+    from discordmovies.report import Report
+
+    values = synthetic.movie_list(size, duplicates=0).get_movies_list(
+        format_images=False)
+    return lambda: Report.from_values(values).rows()
+
+
+def case_check_duplicates(size: int) -> Callable:
+    from discordmovies.utils import Utils
+
+    movies = synthetic.movie_list(size)
+    titles = [i.get_list(["Title"]) for i in movies]
+    return lambda: Utils.check_duplicates(titles)
+
+
+CASES: Dict[str, Callable[[int], Callable]] = {
+    "merge_duplicates[Title]": case_merge_title,
+    "merge_duplicates[Link]": case_merge_link,
+    "merge_similar": case_merge_similar,
+    "remove_by_attribute_value": case_remove_by_attribute_value,
+    "mark_watched": case_mark_watched,
+    "search": case_search,
+    "search[first]": case_search_first,
+    "columns": case_columns,
+    "columns.select": case_columns_select,
+    "filter[python]": case_filter_python,
+    "get_movies_list": case_get_movies_list,
+    "Discord.extract_links": case_extract_links,
+    "CsvHelper.write_new": case_csv_write_new,
+    "CsvHelper.write_existing": case_csv_write_existing,
+    "Utils.check_duplicates": case_check_duplicates,
+    "Report.from_values": case_report
+}
+
+
+def alarm(seconds: float):
+    def handler(signum, frame):
+        raise CaseTimeout
+
+    signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+
+
+def measure(case: Callable[[int], Callable], size: int, memory: bool,
+            timeout: float) -> dict:
+    """
+    Run a case once untraced for the time, and optionally once more with
+    tracemalloc for the peak memory. Setup is not measured.
+    """
+
+    result = {}
+    try:
+        function = case(size)
+        alarm(timeout)
+        start = time.perf_counter()
+        function()
+        result["seconds"] = round(time.perf_counter() - start, 6)
+        alarm(0)
+
+        if memory:
+            function = case(size)
+            tracemalloc.start()
+            alarm(timeout)
+            function()
+            alarm(0)
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    except CaseTimeout:
+        result["timeout"] = timeout
+    finally:
+        alarm(0)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    return result
+
+
+def compare(results: List[dict], baseline_path: str):
+    """
+    Print how each result compares to the same case and size in a previous
+    run.
+    """
+
+    baseline = {}
+    with open(baseline_path) as f:
+        for i in f:
+            record = json.loads(i)
+            baseline[(record["case"], record["size"])] = record
+
+    for i in results:
+        previous = baseline.get((i["case"], i["size"]))
+        if not previous or "seconds" not in previous or "seconds" not in i:
+            continue
+        line = f"{i['case']:<28} {i['size']:>8} " \
+               f"time x{i['seconds'] / max(previous['seconds'], 1e-9):.2f}"
+        if "peak_bytes" in i and "peak_bytes" in previous:
+            line += f"  memory x" \
+                    f"{i['peak_bytes'] / max(previous['peak_bytes'], 1):.2f}"
+        print(line, file=sys.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.movielist",
+        description="Micro-benchmarks for MovieList and friends.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000],
+                        help=f"Amount of movies to benchmark with. The full "
+                             f"set is {SIZES}, the larger sizes take a long "
+                             f"time with the quadratic methods.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES),
+                        default=list(CASES))
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the tracemalloc run.")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="Seconds after which a case is abandoned.")
+    parser.add_argument("--output", type=str, default=None,
+                        help="File to write results to, stdout by default.")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="A previous results file to compare against.")
+    args = parser.parse_args()
+
+    run = {
+        "run": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version()
+    }
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    results = []
+    try:
+        for size in args.sizes:
+            for name in args.cases:
+                record = {**run, "case": name, "size": size,
+                          **measure(CASES[name], size,
+                                    memory=not args.no_memory,
+                                    timeout=args.timeout)}
+                results.append(record)
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.compare:
+        compare(results, args.compare)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
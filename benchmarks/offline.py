@@ -0,0 +1,96 @@
+"""
+Benchmark of the offline metadata datasets against the offline stand-in
+server. A new CSV file is created once with every title looked up online and
+once with the IMDb datasets and the anime offline database set up, with a
+fraction of the movies missing from the IMDb datasets. The wall time and API
+calls per provider of both runs are reported, and the run with the datasets
+is checked to only go online for posters and the missing movies.
+
+    python -m benchmarks.offline --movies 200 --missing 0.1 --latency 0.02
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks.e2e import run
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.offline",
+        description="Benchmark of filling metadata from local datasets.")
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--anime", type=int, default=20)
+    parser.add_argument("--anilist", type=int, default=10)
+    parser.add_argument("--missing", type=float, default=0.1,
+                        help="Fraction of movies left out of the IMDb "
+                             "datasets.")
+    parser.add_argument("--max-messages", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=args.anime,
+                      anilist=args.anilist)
+    results = {"movies": args.movies, "missing": args.missing, "runs": {}}
+    failed = False
+
+    with StubServer(dataset=dataset, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        from discordmovies.inputmodules.metadata.cache import cache
+        from discordmovies.inputmodules.metadata.offline import datasets
+
+        anime_database = os.path.join(directory,
+                                      "anime-offline-database.json")
+        dataset.write_imdb_datasets(directory, missing=args.missing)
+        dataset.write_anime_offline_database(anime_database)
+
+        with open(os.path.join(directory, "title.basics.tsv")) as f:
+            # Less the header.
+            offline_movies = sum(1 for _ in f) - 1
+
+        cwd = os.getcwd()
+        try:
+            for name, imdb_directory, anime in [
+                    ("online", None, None),
+                    ("offline", directory, anime_database)]:
+                # Each run creates its own file.
+                os.mkdir(os.path.join(directory, name))
+                os.chdir(os.path.join(directory, name))
+                cache.clear()
+                datasets.imdb_directory = imdb_directory
+                datasets.anime_database = anime
+                datasets.files.clear()
+                results["runs"][name] = run("csv", dataset, server,
+                                            args.max_messages)
+        finally:
+            os.chdir(cwd)
+            datasets.imdb_directory = datasets.anime_database = None
+            datasets.files.clear()
+
+    links = dataset.expected_links(args.max_messages)
+    online_movies = len(links["imdb"]) - offline_movies
+    # A find per movie for its poster, the full three requests for the
+    # movies that aren't in the datasets, and the configuration once.
+    budget = {"tmdb": offline_movies + 3 * online_movies + 1,
+              "jikan": 0, "anilist": 0}
+    totals = results["runs"]["offline"]["totals"]
+    over = {i: totals.get(i, 0) for i in budget
+            if totals.get(i, 0) > budget[i]}
+    results["runs"]["offline"]["budget"] = budget
+    results["runs"]["offline"]["over_budget"] = over
+    failed = failed or bool(over)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Benchmark of poster validation against the offline stand-in server. The
+posters of a set of synthetic titles, a fraction of which no longer load,
+are checked one at a time and then concurrently. A second run shows the
+cache at work. The poster size picked for the sheet's row height is
+reported next to the one used before.
+
+    python -m benchmarks.posters --movies 200 --dead 0.1 --latency 0.05
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.posters",
+        description="Benchmark of checking poster URLs.")
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--dead", type=float, default=0.1,
+                        help="Fraction of posters that don't load.")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0,
+                      dead_posters=args.dead)
+    results = {"movies": args.movies, "dead": args.dead}
+    failed = False
+
+    with StubServer(dataset=dataset, latency={"images": args.latency}) as \
+            server, tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        from discordmovies.inputmodules.metadata import posters
+        from discordmovies.movies import Movie
+
+        sizes = dataset.tmdb_configuration()["images"]["poster_sizes"]
+        results["poster_size"] = {"before": sizes[4],
+                                  "after": posters.pick_size(sizes)}
+
+        base = f"{server.url}/images/tmdb/t/p/{posters.pick_size(sizes)}"
+
+        def movies() -> list:
+            return [Movie(values={"Poster": f"{base}/poster{i}.jpg",
+                                  "Link": f"https://www.imdb.com/title/"
+                                          f"tt{i:07d}/"})
+                    for i in range(args.movies)]
+
+        for name, workers in [("sequential", 1), ("concurrent", 8),
+                              ("cached", 8)]:
+            if name != "cached":
+                posters.cache = posters.PosterCache(
+                    path=os.path.join(directory, f"{name}.json"))
+            checked = movies()
+            server.reset()
+            start = time.perf_counter()
+            posters.validate_posters(checked, workers=workers)
+            seconds = round(time.perf_counter() - start, 4)
+
+            broken = [i for i in checked
+                      if not dataset.poster_loads(i["Poster"])]
+            replaced = sum("/original/" in i["Poster"] for i in checked)
+            results[name] = {
+                "seconds": seconds,
+                "requests": server.stats()["totals"].get("images", 0),
+                "replaced": replaced,
+                "still_broken": len(broken)
+            }
+            failed = failed or bool(broken)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
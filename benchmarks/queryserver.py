@@ -0,0 +1,197 @@
+"""
+Benchmark of serving queries about the movies against the offline stand-in
+server. A Google Sheet is created, then unwatched movies are asked for over
+HTTP from the query server and, as bots otherwise do, by reading the sheet
+and filtering it. Asking again with the ETag of the last response is checked
+to get a 304. Then movies are suggested and watched, another run brings the
+sheet up to date with a changelog, and the server is checked to have picked
+up the changes without reading the sheet again.
+
+    python -m benchmarks.queryserver --movies 1000 --queries 50
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def get(url: str, etag: str = None) -> tuple:
+    request = urllib.request.Request(
+        url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            content = response.read()
+            return response.status, response.headers["ETag"], content
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["ETag"], e.read()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.queryserver",
+        description="Benchmark of serving queries about the movies.")
+    parser.add_argument("--movies", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=20,
+                        help="How many movies to suggest and to watch.")
+    parser.add_argument("--max-messages", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0,
+                      duplicates=0, chatter=0)
+    rng = random.Random(args.seed)
+    watched = [i["content"] for i in
+               dataset.channels[dataset.watched_channel_id]]
+    unwatched = [i for i in dataset.links if i not in watched]
+    picked = rng.sample(unwatched, 2 * args.changes)
+
+    results = {"movies": args.movies, "queries": args.queries}
+    failed = False
+
+    with StubServer(dataset=dataset, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.links import LinkRegistry
+        from discordmovies.parsers import is_watched
+
+        def sync(sheet_id: str = None):
+            return discordmovies.DiscordMovies(
+                discord_auth_token="stub", doc_name="benchmark"
+            ).discord_to_file(
+                filetype="sheet", channel_id=dataset.movie_channel_id,
+                watched_channel_id=dataset.watched_channel_id,
+                sheet_id=sheet_id, max_messages=args.max_messages,
+                tmdb_api_key="stub", options=discordmovies.RunOptions(
+                    changelog="changelog.jsonl"))
+
+        def read_unwatched(file) -> set:
+            values = file.get_values(force_recalc=True)
+            column = values[0].index("Watched")
+            link = values[0].index("Link")
+            return {LinkRegistry.canonical(i[link]) for i in values[1:]
+                    if not is_watched(i[column])}
+
+        def served_unwatched(url: str) -> set:
+            movies = json.loads(get(f"{url}/movies?watched=false")[2])
+            return {LinkRegistry.canonical(i["Link"])
+                    for i in movies["movies"]}
+
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            # Suggested later, after the sheet is created.
+            for i in dataset.channels[dataset.movie_channel_id]:
+                if i["content"].split()[-1] in picked[:args.changes]:
+                    server.delete_message(dataset.movie_channel_id, i["id"])
+            file = sync()
+            sheet_id = list(server.sheets.docs)[-1]
+
+            server.reset()
+            start = time.perf_counter()
+            query = discordmovies.DiscordMovies(
+                discord_auth_token="stub", doc_name="benchmark")
+            served = query.serve(file=file, port=0,
+                                 changelog="changelog.jsonl",
+                                 background=True)
+            results["load"] = {
+                "seconds": round(time.perf_counter() - start, 4),
+                "sheets_calls": server.stats()["totals"].get("sheets", 0)}
+
+            try:
+                server.reset()
+                start = time.perf_counter()
+                for _ in range(args.queries):
+                    from_sheet = read_unwatched(file)
+                sheet_seconds = time.perf_counter() - start
+                sheet_calls = server.stats()["totals"].get("sheets", 0)
+
+                server.reset()
+                start = time.perf_counter()
+                for _ in range(args.queries):
+                    from_server = served_unwatched(served.url)
+                served_seconds = time.perf_counter() - start
+                served_calls = server.stats()["totals"].get("sheets", 0)
+
+                status, etag, content = get(
+                    f"{served.url}/movies?watched=false")
+                revalidated = get(f"{served.url}/movies?watched=false",
+                                  etag=etag)
+                results["unwatched"] = {
+                    "same_movies": from_sheet == from_server,
+                    "movies": len(from_server),
+                    "read_sheet": {
+                        "seconds_per_query": round(
+                            sheet_seconds / args.queries, 6),
+                        "sheets_calls": sheet_calls},
+                    "served": {
+                        "seconds_per_query": round(
+                            served_seconds / args.queries, 6),
+                        "sheets_calls": served_calls},
+                    "revalidated": {"status": revalidated[0],
+                                    "bytes": len(revalidated[2]),
+                                    "full_bytes": len(content)}}
+                failed = failed or from_sheet != from_server or \
+                    served_calls != 0 or revalidated[0] != 304
+
+                # Who suggested a movie.
+                movie = json.loads(get(f"{served.url}/movies?limit=1")[2])[
+                    "movies"][0]
+                title = urllib.request.quote(movie["Title"][:6])
+                found = json.loads(get(
+                    f"{served.url}/movies?title={title}")[2])["movies"]
+                results["title_search"] = any(
+                    i["User"] == movie["User"] and i["Link"] == movie["Link"]
+                    for i in found)
+                failed = failed or not results["title_search"]
+
+                for i in picked[:args.changes]:
+                    server.post_message(dataset.movie_channel_id,
+                                        f"check this out {i}")
+                for i in picked[args.changes:]:
+                    server.post_message(dataset.watched_channel_id, i)
+                sync(sheet_id=sheet_id)
+
+                server.reset()
+                start = time.perf_counter()
+                status, new_etag, _ = get(
+                    f"{served.url}/movies?watched=false", etag=etag)
+                reload_seconds = time.perf_counter() - start
+                from_server = served_unwatched(served.url)
+                reload_calls = server.stats()["totals"].get("sheets", 0)
+                from_sheet = read_unwatched(file)
+                count = json.loads(get(f"{served.url}/health")[2])["movies"]
+                rows = len(file.get_values(force_recalc=True)) - 1
+                results["after_sync"] = {
+                    "status": status, "etag_changed": new_etag != etag,
+                    "reload_seconds": round(reload_seconds, 6),
+                    "sheets_calls": reload_calls,
+                    "same_movies": from_sheet == from_server,
+                    "movies": count, "rows": rows}
+                failed = failed or status != 200 or new_etag == etag or \
+                    from_sheet != from_server or reload_calls != 0 or \
+                    count != rows
+            finally:
+                served.stop()
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Benchmark of the Sheets quota scheduler against the offline stand-in server.
+The stand-in is given a write quota, scaled down from the real one's minute
+so the benchmark runs in seconds, and a run's worth of single cell updates
+is sent through DocsHandler three ways: without retrying, the way requests
+were sent before the scheduler, retrying with backoff only, and paced to the
+quota. Wall time, rate limited responses and time spent waiting are
+reported for each. Last, a batchUpdate removing a row is applied but
+answered with a 500, and is checked not to be sent again, which would
+remove another row.
+
+    python -m benchmarks.quota --requests 120 --quota 30 --window 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.stubserver import StubServer, TokenBucket
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.quota",
+        description="Benchmark of pacing and retrying Sheets requests.")
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--quota", type=int, default=30,
+                        help="Requests allowed per window.")
+    parser.add_argument("--window", type=float, default=5.0,
+                        help="Seconds the quota is counted over.")
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = {"requests": args.requests, "quota": args.quota,
+               "window": args.window}
+    failed = False
+
+    with StubServer(latency={"sheets": args.latency}) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+        cwd = os.getcwd()
+        os.chdir(directory)
+
+        from discordmovies.metrics import metrics
+        from discordmovies.outputmodules.googleutils import quota
+        from discordmovies.outputmodules.googleutils import DocsHandler
+
+        try:
+            handler = DocsHandler()
+            handler.setup_docs()
+            handler.create_sheet(title="quota")
+
+            modes = [
+                ("no_retries", {"read": 0, "write": 0}, 0),
+                ("backoff_only", {"read": 0, "write": 0}, 8),
+                ("paced", {"read": args.quota, "write": args.quota}, 8)
+            ]
+            for name, limits, retries in modes:
+                quota.scheduler = quota.QuotaScheduler(
+                    window=args.window, max_retries=retries, base_delay=0.25,
+                    max_delay=args.window)
+                quota.scheduler.limits = limits
+
+                server.limiters["sheets"] = TokenBucket(
+                    rate=args.quota / args.window, burst=args.quota)
+                server.reset()
+                metrics.reset()
+                start = time.perf_counter()
+                sent = 0
+                error = None
+                try:
+                    for i in range(args.requests):
+                        handler.update_value([[str(i)]], (0, i + 1),
+                                             (0, i + 1))
+                        sent += 1
+                except Exception as e:
+                    error = type(e).__name__
+
+                results[name] = {
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "completed": sent,
+                    "error": error,
+                    "rate_limited": server.stats()["calls"].get(
+                        "sheets", {}).get("429", 0),
+                    "waited_seconds": round(metrics.to_dict()[
+                        "sleep_seconds"].get("sheets", 0), 4)
+                }
+                if name != "no_retries":
+                    failed = failed or sent != args.requests
+
+                # Let the quota refill before the next mode.
+                time.sleep(args.window)
+
+            quota.scheduler = quota.QuotaScheduler(
+                reads_per_minute=0, writes_per_minute=0, base_delay=0.01)
+            server.limiters.pop("sheets")
+            handler.append_sheet([[str(i)] for i in range(10)], quiet=True)
+            server.reset()
+            doc = server.sheets.docs[handler.spreadsheet_id]
+            rows = doc["tabs"][doc["order"][0]]["rows"]
+            before = len(rows)
+            server.lost_responses["spreadsheets.batchUpdate"] = 1
+            error = None
+            try:
+                handler.remove_rows([2])
+            except Exception as e:
+                error = type(e).__name__
+            removed = before - len(doc["tabs"][doc["order"][0]]["rows"])
+            results["lost_batch_update"] = {
+                "error": error, "rows_removed": removed,
+                "sent": server.stats()["calls"]["sheets"].get(
+                    "spreadsheets.batchUpdate", 0)}
+            failed = failed or removed != 1
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Benchmark of sharding sheets against the offline stand-in server. A sheet is
+created without sharding, with watched movies moved to their own tab and
+with movies split into a tab per year, then each is brought up to date again
+with nothing new suggested. The size of the first tab and the time taken to
+read it are reported next to the Sheets calls of both runs, and the sharded
+sheets are checked to hold the same movies as the one that isn't, once each.
+
+Then a watched movie is deleted from the movie channel and another one from
+the watched channel, and the sharded sheets are checked to have dropped the
+first from every tab and moved the second back to the first tab. Last, the
+sheets are rewritten with a column less, and every tab is checked to have
+the new columns.
+
+    python -m benchmarks.shard --movies 1000 --watched 0.5
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.shard",
+        description="Benchmark of moving movies to other tabs of a sheet.")
+    parser.add_argument("--movies", type=int, default=1000)
+    parser.add_argument("--watched", type=float, default=0.5,
+                        help="Fraction of movies that have been watched.")
+    parser.add_argument("--max-messages", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=0, anilist=0,
+                      watched=args.watched)
+    results = {"movies": args.movies, "watched": args.watched, "runs": {}}
+    failed = False
+    expected = None
+
+    with StubServer(dataset=dataset, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.inputmodules.metadata.cache import cache
+        from discordmovies.metrics import metrics
+
+        def sync(shard: str, sheet_id: str = None,
+                 exclude_attributes: list = None):
+            discordmovies.DiscordMovies(
+                discord_auth_token="stub", doc_name="benchmark",
+                exclude_attributes=exclude_attributes
+            ).discord_to_file(
+                filetype="sheet", channel_id=dataset.movie_channel_id,
+                watched_channel_id=dataset.watched_channel_id,
+                sheet_id=sheet_id, max_messages=args.max_messages,
+                tmdb_api_key="stub",
+                options=discordmovies.RunOptions(shard=shard))
+
+        def tabs(sheet_id: str) -> dict:
+            doc = server.sheets.docs[sheet_id]
+            return {i: doc["tabs"][i]["rows"] for i in doc["order"]}
+
+        sheet_ids = {}
+        cwd = os.getcwd()
+        try:
+            for shard in [None, "watched", "year"]:
+                name = shard or "none"
+                os.mkdir(os.path.join(directory, name))
+                os.chdir(os.path.join(directory, name))
+                cache.clear()
+                sheet_id = None
+                result = {}
+
+                for run in ["new", "no_changes"]:
+                    metrics.reset()
+                    server.reset()
+                    start = time.perf_counter()
+                    sync(shard, sheet_id=sheet_id)
+                    wall = time.perf_counter() - start
+                    if sheet_id is None:
+                        sheet_id = list(server.sheets.docs)[-1]
+
+                    doc = server.sheets.docs[sheet_id]
+                    first = doc["tabs"][doc["order"][0]]["rows"]
+                    result[run] = {
+                        "wall_time": round(wall, 4),
+                        "read_seconds": metrics.to_dict()["stages"][
+                            "read_file"]["seconds"],
+                        "sheets_calls": server.stats()["totals"].get(
+                            "sheets", 0),
+                        "first_tab_rows": len(first) - 1,
+                        "first_tab_bytes": len(json.dumps(first)),
+                        "tabs": {i: len(doc["tabs"][i]["rows"]) - 1
+                                 for i in doc["order"][1:]}}
+
+                # Every movie once, in whichever tab.
+                rows = sorted(json.dumps(j) for i in doc["order"]
+                              for j in doc["tabs"][i]["rows"][1:])
+                expected = rows if expected is None else expected
+                result["same_movies"] = rows == expected
+                failed = failed or rows != expected or \
+                    result["no_changes"]["tabs"] != result["new"]["tabs"]
+                results["runs"][name] = result
+                sheet_ids[shard] = sheet_id
+
+            # A watched movie is deleted, another one isn't watched anymore.
+            removed, unwatched = dataset.watched_links[:2]
+            for channel, link in [(dataset.movie_channel_id, removed),
+                                  (dataset.watched_channel_id, unwatched)]:
+                for i in list(dataset.channels[channel]):
+                    if i["content"].split()[-1] == link:
+                        server.delete_message(channel, i["id"])
+            listed = set(dataset.links) - {removed}
+
+            for shard in ["watched", "year"]:
+                result = results["runs"][shard]
+                server.reset()
+                sync(shard, sheet_id=sheet_ids[shard])
+                after = tabs(sheet_ids[shard])
+                header = next(iter(after.values()))[0]
+                link, watched = header.index("Link"), header.index("Watched")
+                where = {}
+                for title, rows in after.items():
+                    for i in rows[1:]:
+                        where.setdefault(i[link], []).append(
+                            (title, str(i[watched]).upper()))
+                first = next(iter(after))
+                result["discord_changes"] = {
+                    "sheets_calls": server.stats()["totals"].get(
+                        "sheets", 0),
+                    "removed_left": len(where.get(removed, [])),
+                    "unwatched_in": where.get(unwatched),
+                    "every_movie_once": set(where) == listed and all(
+                        len(i) == 1 for i in where.values())}
+                failed = failed or removed in where or \
+                    not result["discord_changes"]["every_movie_once"] or \
+                    shard == "watched" and \
+                    where.get(unwatched) != [(first, "FALSE")]
+
+                # The columns change, so every tab is rewritten.
+                cache.clear()
+                server.reset()
+                sync(shard, sheet_id=sheet_ids[shard],
+                     exclude_attributes=["Trailer"])
+                after = tabs(sheet_ids[shard])
+                header = next(iter(after.values()))[0]
+                link = header.index("Link")
+                links = [i[link] for j in after.values() for i in j[1:]]
+                result["overwrite"] = {
+                    "sheets_calls": server.stats()["totals"].get(
+                        "sheets", 0),
+                    "trailer_column": "Trailer" in header,
+                    "same_columns": all(i[0] == header
+                                        for i in after.values() if i),
+                    "every_movie_once": set(links) == listed and
+                    len(links) == len(set(links)),
+                    "tabs": {i: len(j) - 1 for i, j in after.items()}}
+                failed = failed or "Trailer" in header or \
+                    not result["overwrite"]["same_columns"] or \
+                    not result["overwrite"]["every_movie_once"]
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Measures how much Python overhead a short run has. Each measurement is made
+in a fresh interpreter:
+
+- importing the discordmovies package, and which heavy dependencies that
+  pulls in,
+- running DiscordMovies.py --help,
+- a full CSV run against the offline stand-in server where nothing new has
+  been suggested, the common case for a cron job.
+
+    python -m benchmarks.startup --max-seconds 1
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ["requests", "tqdm", "googleapiclient", "google_auth_oauthlib",
+         "google.oauth2"]
+
+
+def timed(command: list, repeat: int, **kwargs) -> float:
+    """
+    Best wall time of running a command, in seconds.
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, **kwargs)
+        best = min(best, time.perf_counter() - start)
+
+    return round(best, 4)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.startup",
+        description="Measure CLI startup and short run overhead.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Fail if the run with nothing new takes longer "
+                             "than this.")
+    args = parser.parse_args()
+
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    results = {}
+
+    results["python"] = timed([sys.executable, "-c", "pass"], args.repeat)
+    results["import"] = timed([sys.executable, "-c", "import discordmovies"],
+                              args.repeat, env=env)
+
+    probe = "import sys, discordmovies; print([i for i in %r if i in " \
+            "sys.modules])" % HEAVY
+    results["heavy_modules_on_import"] = json.loads(subprocess.run(
+        [sys.executable, "-c", probe], env=env, check=True,
+        capture_output=True, text=True).stdout.replace("'", '"'))
+
+    results["help"] = timed([sys.executable,
+                             os.path.join(ROOT, "DiscordMovies.py"),
+                             "--help"], args.repeat, env=env)
+
+    dataset = Dataset(movies=50, anime=0, anilist=0)
+    with StubServer(dataset=dataset) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        env.update(server.env())
+        command = [sys.executable, os.path.join(ROOT, "DiscordMovies.py"),
+                   "--output", "csv", "--token", "stub",
+                   "--channel-id", dataset.movie_channel_id,
+                   "--watched-channel-id", dataset.watched_channel_id,
+                   "--filename", "startup"]
+        # The first run creates the file, every run after that finds
+        # nothing new.
+        subprocess.run(command, env={**env, "TMDB_API_KEY": "stub"},
+                       cwd=directory, check=True, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        results["no_changes_run"] = timed(
+            command, args.repeat, env={**env, "TMDB_API_KEY": "stub"},
+            cwd=directory)
+
+    print(json.dumps(results, indent=2))
+
+    if args.max_seconds is not None and \
+            results["no_changes_run"] > args.max_seconds:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
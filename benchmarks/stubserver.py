@@ -0,0 +1,921 @@
+"""
+An offline stand-in for every API discordmovies talks to: Discord, TMDB,
+Jikan, AniList and Google Sheets. Responses are generated from a synthetic
+Dataset, latency and 429 rate limiting can be configured per provider, and
+every request is counted so benchmarks can assert call budgets.
+
+A fake Discord Gateway is served too, messages posted, edited or deleted
+through the StubServer methods or the /_gateway endpoints are sent to
+connected clients as events.
+
+Run it on its own with:
+
+    python -m benchmarks.stubserver --port 8765
+
+and point discordmovies at it with the environment variables printed on
+startup.
+"""
+
+import argparse
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlparse
+
+from benchmarks.synthetic import Dataset
+from discordmovies.inputmodules.websocket import WebSocket, WebSocketClosed
+
+PROVIDERS = ["discord", "tmdb", "jikan", "anilist", "sheets", "images"]
+
+
+class TokenBucket:
+    """
+    A simple token bucket. Requests that find it empty get a 429.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """
+        Take a token. Returns 0 if one was available, otherwise the amount of
+        seconds until one will be.
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class Spreadsheets:
+    """
+    A small in-memory model of the parts of the Sheets API discordmovies uses.
+    Values are parsed the way USER_ENTERED input is, and read back the way
+    the FORMULA render option returns them.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def parse_input(value):
+        if not isinstance(value, str):
+            return value
+        if value.startswith("'"):
+            return value[1:]
+        if value.upper() in ["TRUE", "FALSE"]:
+            return value.upper() == "TRUE"
+        date = re.fullmatch(r"(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}):(\d{2})"
+                            r"(?::(\d{2}(?:\.\d+)?))?)?"
+                            r"(?:Z|[+-]\d{2}:?\d{2})?", value.strip())
+        try:
+            # Days since 1899-12-30, with the time of day and without the
+            # zone.
+            days = datetime.strptime(date.group(1), "%Y-%m-%d") - \
+                datetime(1899, 12, 30)
+        except (AttributeError, ValueError):
+            days = None
+        if days is not None:
+            if date.group(2) is None:
+                return days.days
+            days += timedelta(hours=int(date.group(2)),
+                              minutes=int(date.group(3)),
+                              seconds=float(date.group(4) or 0))
+            return days.days + (days.seconds + days.microseconds / 1e6) / \
+                86400
+        if not re.fullmatch(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?",
+                            value.strip()):
+            return value
+        number = float(value)
+        if number.is_integer() and "." not in value:
+            return int(number)
+        return number
+
+    @staticmethod
+    def column_index(letters: str) -> int:
+        index = 0
+        for i in letters:
+            index = index * 26 + ord(i.upper()) - ord("A") + 1
+        return index - 1
+
+    def parse_range(self, doc: dict,
+                    a1: str) -> Tuple[dict, int, Union[int, None]]:
+        """
+        Split an A1 range into the tab it refers to, the first row and the
+        first column. Returns None for the row if the range is whole columns.
+        """
+
+        a1 = unquote(a1)
+        if "!" in a1:
+            title, a1 = a1.rsplit("!", 1)
+            tab = doc["tabs"][title.strip("'")]
+        else:
+            tab = doc["tabs"][doc["order"][0]]
+
+        match = re.match(r"([A-Za-z]+)(\d*)", a1)
+        column = self.column_index(match.group(1))
+        row = int(match.group(2)) - 1 if match.group(2) else None
+
+        return tab, row, column
+
+    @staticmethod
+    def write(tab: dict, row: int, column: int, values: List[list]) -> int:
+        cells = 0
+        rows = tab["rows"]
+        for i, values_row in enumerate(values):
+            while len(rows) <= row + i:
+                rows.append([])
+            target = rows[row + i]
+            while len(target) < column + len(values_row):
+                target.append("")
+            for j, value in enumerate(values_row):
+                target[column + j] = Spreadsheets.parse_input(value)
+                cells += 1
+
+        return cells
+
+    @staticmethod
+    def add_tab(doc: dict, title: str, sheet_id: int = None) -> dict:
+        if sheet_id is None:
+            sheet_id = max([i["sheetId"] for i in doc["tabs"].values()] + [-1]
+                           ) + 1
+        tab = {"sheetId": sheet_id, "title": title, "rows": [],
+               "rowCount": 1000, "frozenRowCount": 0, "formats": []}
+        doc["tabs"][title] = tab
+        doc["order"].append(title)
+
+        return tab
+
+    def tab_by_id(self, doc: dict, sheet_id: int = None) -> dict:
+        for i in doc["tabs"].values():
+            if i["sheetId"] == (sheet_id or 0):
+                return i
+        return doc["tabs"][doc["order"][0]]
+
+    @staticmethod
+    def cell_input(cell: dict):
+        """
+        A cell given as CellData, in the form write() takes.
+        """
+
+        value = cell.get("userEnteredValue", {"stringValue": ""})
+        # Strings are taken as they are, unlike USER_ENTERED input, so keep
+        # write() from parsing them.
+        if "stringValue" in value:
+            return "'" + value["stringValue"]
+
+        return list(value.values())[0]
+
+    def create(self, body: dict) -> dict:
+        spreadsheet_id = uuid.uuid4().hex
+        doc = {"title": body.get("properties", {}).get("title", "Untitled"),
+               "tabs": {}, "order": []}
+
+        sheets = body.get("sheets") or [{"properties": {"title": "Sheet1"}}]
+        for i in sheets:
+            properties = i.get("properties", {})
+            tab = self.add_tab(doc, properties.get("title", "Sheet1"),
+                               properties.get("sheetId"))
+            grid = properties.get("gridProperties", {})
+            tab["frozenRowCount"] = grid.get("frozenRowCount", 0)
+            tab["rowCount"] = grid.get("rowCount", tab["rowCount"])
+            for data in i.get("data", []):
+                values = []
+                for row in data.get("rowData", []):
+                    values.append([self.cell_input(j)
+                                   for j in row.get("values", [])])
+                self.write(tab, data.get("startRow", 0),
+                           data.get("startColumn", 0), values)
+                if data.get("rowMetadata"):
+                    tab["formats"].append({"rowMetadata": len(
+                        data["rowMetadata"])})
+
+        with self.lock:
+            self.docs[spreadsheet_id] = doc
+
+        return {"spreadsheetId": spreadsheet_id,
+                "properties": {"title": doc["title"]}}
+
+    def get(self, spreadsheet_id: str) -> Union[dict, None]:
+        doc = self.docs.get(spreadsheet_id)
+        if doc is None:
+            return None
+
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": doc["title"]},
+            "sheets": [{"properties": {
+                "sheetId": doc["tabs"][j]["sheetId"],
+                "title": j,
+                "index": i,
+                "gridProperties": {
+                    "rowCount": max(doc["tabs"][j]["rowCount"],
+                                    len(doc["tabs"][j]["rows"])),
+                    "columnCount": 26,
+                    "frozenRowCount": doc["tabs"][j]["frozenRowCount"]
+                }}} for i, j in enumerate(doc["order"])]
+        }
+
+    def values_get(self, spreadsheet_id: str, a1: str) -> dict:
+        doc = self.docs[spreadsheet_id]
+        tab, row, column = self.parse_range(doc, a1)
+        rows = tab["rows"][row or 0:]
+        rows = [i[column:] for i in rows]
+
+        # Like the real API, trailing empty rows and cells are not returned.
+        trimmed = []
+        for i in rows:
+            i = list(i)
+            while i and i[-1] == "":
+                i.pop()
+            trimmed.append(i)
+        while trimmed and not trimmed[-1]:
+            trimmed.pop()
+
+        result = {"range": a1, "majorDimension": "ROWS"}
+        if trimmed:
+            result["values"] = trimmed
+
+        return result
+
+    def values_batch_update(self, spreadsheet_id: str, body: dict) -> dict:
+        doc = self.docs[spreadsheet_id]
+        cells = 0
+        with self.lock:
+            for i in body.get("data", []):
+                tab, row, column = self.parse_range(doc, i["range"])
+                cells += self.write(tab, row or 0, column, i["values"])
+
+        return {"spreadsheetId": spreadsheet_id, "totalUpdatedCells": cells}
+
+    def values_update(self, spreadsheet_id: str, a1: str,
+                      body: dict) -> dict:
+        doc = self.docs[spreadsheet_id]
+        with self.lock:
+            tab, row, column = self.parse_range(doc, a1)
+            cells = self.write(tab, row or 0, column, body.get("values", []))
+
+        return {"spreadsheetId": spreadsheet_id, "updatedCells": cells}
+
+    def values_append(self, spreadsheet_id: str, a1: str,
+                      body: dict) -> dict:
+        doc = self.docs[spreadsheet_id]
+        with self.lock:
+            tab, _, column = self.parse_range(doc, a1)
+            row = len(tab["rows"])
+            while row > 0 and not any(i != "" for i in tab["rows"][row - 1]):
+                row -= 1
+            del tab["rows"][row:]
+            values = body.get("values", [])
+            cells = self.write(tab, row, column, values)
+
+        updates = {"updatedRows": len(values), "updatedCells": cells}
+        if values:
+            # Like the real API, say which rows were written. Only the rows
+            # matter to discordmovies, so the columns are left wide.
+            updates["updatedRange"] = f"{tab['title']}!A{row + 1}:" \
+                                      f"Z{row + len(values)}"
+
+        return {"spreadsheetId": spreadsheet_id, "updates": updates}
+
+    def batch_update(self, spreadsheet_id: str, body: dict) -> dict:
+        doc = self.docs[spreadsheet_id]
+        replies = []
+        with self.lock:
+            for i in body.get("requests", []):
+                (kind, request), = i.items()
+                replies.append(self.apply(doc, kind, request))
+
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+    def apply(self, doc: dict, kind: str, request: dict) -> dict:
+        """
+        Apply a single batchUpdate request. Formatting requests are recorded
+        but otherwise have no effect on the values.
+        """
+
+        if kind == "deleteDimension":
+            span = request["range"]
+            tab = self.tab_by_id(doc, span.get("sheetId"))
+            if span["dimension"] == "ROWS":
+                del tab["rows"][span["startIndex"]:span["endIndex"]]
+        elif kind == "updateCells" and "userEnteredValue" in request.get(
+                "fields", ""):
+            tab = self.tab_by_id(doc, request.get("range", {}).get("sheetId"))
+            tab["rows"] = []
+            self.write(tab, 0, 0, [[self.cell_input(j) for j in
+                                    i.get("values", [])]
+                                   for i in request.get("rows", [])])
+        elif kind == "updateSheetProperties":
+            properties = request["properties"]
+            tab = self.tab_by_id(doc, properties.get("sheetId"))
+            grid = properties.get("gridProperties", {})
+            if "frozenRowCount" in grid:
+                tab["frozenRowCount"] = grid["frozenRowCount"]
+            if "rowCount" in grid:
+                tab["rowCount"] = grid["rowCount"]
+        elif kind == "addSheet":
+            properties = request.get("properties", {})
+            tab = self.add_tab(doc, properties["title"],
+                               properties.get("sheetId"))
+            return {"addSheet": {"properties": {
+                "sheetId": tab["sheetId"], "title": tab["title"]}}}
+        elif kind == "appendDimension":
+            tab = self.tab_by_id(doc, request.get("sheetId"))
+            if request["dimension"] == "ROWS":
+                tab["rowCount"] += request["length"]
+        elif kind == "copyPaste":
+            source = request["source"]
+            destination = request["destination"]
+            source_tab = self.tab_by_id(doc, source.get("sheetId"))
+            destination_tab = self.tab_by_id(doc, destination.get("sheetId"))
+            rows = source_tab["rows"][source.get("startRowIndex", 0):
+                                      source.get("endRowIndex")]
+            self.write(destination_tab,
+                       destination.get("startRowIndex", 0), 0,
+                       [list(j) for j in rows])
+        else:
+            tab = self.tab_by_id(doc, request.get("range", {}).get(
+                "sheetId"))
+            tab["formats"].append({kind: request})
+
+        return {}
+
+
+class FakeGateway:
+    """
+    A stand-in for the Discord Gateway, speaking enough of the protocol for
+    discordmovies: hello, heartbeats, identify and resume. Every event is
+    sent to all identified clients, and kept so that clients resuming after a
+    dropped connection get the ones they missed.
+    """
+
+    def __init__(self, heartbeat_interval: float = 41.25):
+        self.heartbeat_interval = heartbeat_interval
+        self.sequence = 0
+        self.history = []
+        self.sessions = set()
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def serve(self, handler: BaseHTTPRequestHandler, url: str):
+        """
+        Take over a connection that asked to be upgraded to a websocket, and
+        handle it until the client goes away.
+        """
+
+        handler.send_response(101, "Switching Protocols")
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", WebSocket.accept_key(
+            handler.headers["Sec-WebSocket-Key"]))
+        handler.end_headers()
+        handler.close_connection = True
+
+        connection = WebSocket(handler.connection, client=False)
+        try:
+            self.send(connection, {"op": 10, "d": {
+                "heartbeat_interval": int(self.heartbeat_interval * 1000)}})
+
+            while True:
+                message = connection.recv()
+                if message is None:
+                    break
+                payload = json.loads(message)
+
+                if payload["op"] == 1:
+                    self.send(connection, {"op": 11, "d": None})
+                elif payload["op"] == 2:
+                    session_id = uuid.uuid4().hex
+                    with self.lock:
+                        self.sessions.add(session_id)
+                        self.clients.append(connection)
+                        self.send(connection, {
+                            "op": 0, "t": "READY", "s": self.sequence,
+                            "d": {"v": 9, "session_id": session_id,
+                                  "resume_gateway_url": url,
+                                  "user": {"id": "1", "username": "stub"}}})
+                elif payload["op"] == 6:
+                    if payload["d"]["session_id"] not in self.sessions:
+                        self.send(connection, {"op": 9, "d": False})
+                        continue
+                    with self.lock:
+                        self.clients.append(connection)
+                        for i, j in self.history:
+                            if i > (payload["d"]["seq"] or 0):
+                                self.send(connection, j)
+                        self.send(connection, {"op": 0, "t": "RESUMED",
+                                               "s": self.sequence, "d": {}})
+        except (OSError, WebSocketClosed):
+            pass
+        finally:
+            with self.lock:
+                if connection in self.clients:
+                    self.clients.remove(connection)
+            connection.close()
+
+    @staticmethod
+    def send(connection: WebSocket, payload: dict):
+        try:
+            connection.send(json.dumps(payload))
+        except (OSError, WebSocketClosed):
+            pass
+
+    def dispatch(self, event: str, data: dict):
+        """
+        Send an event to every connected client.
+        """
+
+        with self.lock:
+            self.sequence += 1
+            payload = {"op": 0, "t": event, "s": self.sequence, "d": data}
+            self.history.append((self.sequence, payload))
+            for i in self.clients:
+                self.send(i, payload)
+
+    def reconnect(self):
+        """
+        Ask every client to reconnect and resume, like Discord does before
+        restarting a gateway server.
+        """
+
+        with self.lock:
+            for i in self.clients:
+                self.send(i, {"op": 7, "d": None})
+
+    def drop(self):
+        """
+        Cut every connection without a close frame, like a network failure.
+        """
+
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for i in clients:
+            i.closed = True
+            try:
+                i.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class StubServer:
+    """
+    Serves fake versions of the Discord, TMDB, Jikan, AniList and Sheets APIs
+    from a Dataset, along with the poster images they link to. Each provider
+    lives under its own path prefix so a single port is enough, see env()
+    for the matching environment variables.
+
+    latency is either a number of seconds applied to every request, or a
+    dictionary of provider names to seconds. rate_limits is a dictionary of
+    provider names to requests per second, anything over that gets a 429.
+    """
+
+    def __init__(self, dataset: Dataset = None, host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: Union[float, Dict[str, float]] = 0.0,
+                 rate_limits: Dict[str, float] = None,
+                 heartbeat_interval: float = 41.25):
+        self.dataset = dataset if dataset is not None else Dataset()
+        self.sheets = Spreadsheets()
+        self.gateway = FakeGateway(heartbeat_interval=heartbeat_interval)
+
+        if not isinstance(latency, dict):
+            latency = {i: latency for i in PROVIDERS}
+        self.latency = latency
+
+        self.limiters = {i: TokenBucket(j) for i, j in
+                         (rate_limits or {}).items()}
+
+        self.calls = defaultdict(lambda: defaultdict(int))
+        self.rate_limited = defaultdict(int)
+        # Provider names to the amount of calls after which they fail with a
+        # 500, to interrupt runs.
+        self.outages: Dict[str, int] = {}
+        # Endpoints to the amount of requests that are applied but answered
+        # with a 500 anyway, as when the response is lost.
+        self.lost_responses: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def gateway_url(self) -> str:
+        return self.url.replace("http://", "ws://", 1) + "/gateway"
+
+    def env(self) -> Dict[str, str]:
+        """
+        Environment variables that make discordmovies use this server.
+        """
+
+        return {
+            "DISCORD_API_URL": f"{self.url}/discord/api/v9",
+            "TMDB_API_URL": f"{self.url}/tmdb/3",
+            "JIKAN_API_URL": f"{self.url}/jikan/v4",
+            "ANILIST_API_URL": f"{self.url}/anilist",
+            "GOOGLE_SHEETS_API_URL": f"{self.url}/sheets/",
+            # The stand-in has no quota unless a rate limit is set for
+            # "sheets", so don't pace requests to the real one's.
+            "SHEETS_READS_PER_MINUTE": "0",
+            "SHEETS_WRITES_PER_MINUTE": "0",
+            # Sheets needs credentials that look valid, they are never
+            # checked by the stand-in.
+            "GOOGLE_USER_CREDENTIALS": json.dumps({
+                "token": "stub", "refresh_token": "stub",
+                "client_id": "stub", "client_secret": "stub",
+                "expiry": "2999-01-01T00:00:00Z"})
+        }
+
+    def start(self) -> "StubServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def stats(self) -> dict:
+        """
+        Calls made so far, per provider and endpoint, plus the amount of
+        requests that were answered with a 429.
+        """
+
+        with self.lock:
+            calls = {i: dict(j) for i, j in self.calls.items()}
+            return {
+                "calls": calls,
+                "totals": {i: sum(j.values()) for i, j in calls.items()},
+                "rate_limited": dict(self.rate_limited)
+            }
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.rate_limited.clear()
+
+    def post_message(self, channel_id: str, content: str,
+                     username: str = None) -> dict:
+        """
+        Post a message to a channel and send it to gateway clients.
+        """
+
+        message = self.dataset.add_message(str(channel_id), content,
+                                           username=username)
+        self.gateway.dispatch("MESSAGE_CREATE", message)
+        return message
+
+    def edit_message(self, channel_id: str, message_id: str,
+                     content: str) -> Union[dict, None]:
+        message = self.dataset.edit_message(str(channel_id), message_id,
+                                            content)
+        if message is not None:
+            self.gateway.dispatch("MESSAGE_UPDATE", message)
+        return message
+
+    def delete_message(self, channel_id: str, message_id: str) -> bool:
+        deleted = self.dataset.delete_message(str(channel_id), message_id)
+        if deleted:
+            self.gateway.dispatch("MESSAGE_DELETE", {
+                "id": message_id, "channel_id": str(channel_id)})
+        return deleted
+
+    def control_gateway(self, action: str, body: dict) -> tuple:
+        """
+        Lets other processes drive the gateway with POST requests to
+        /_gateway/message, /_gateway/edit, /_gateway/delete,
+        /_gateway/reconnect and /_gateway/drop.
+        """
+
+        if action == "message":
+            return 200, self.post_message(body["channel_id"], body["content"],
+                                          username=body.get("username"))
+        if action == "edit":
+            message = self.edit_message(body["channel_id"], body["id"],
+                                        body["content"])
+            return (200, message) if message else (404, {})
+        if action == "delete":
+            deleted = self.delete_message(body["channel_id"], body["id"])
+            return (200 if deleted else 404), {}
+        if action == "reconnect":
+            self.gateway.reconnect()
+            return 200, {}
+        if action == "drop":
+            self.gateway.drop()
+            return 200, {}
+
+        return 404, {"message": "Unknown gateway action"}
+
+    def count(self, provider: str, endpoint: str):
+        with self.lock:
+            self.calls[provider][endpoint] += 1
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this every
+            # keep-alive response waits on a delayed ACK.
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.dispatch(self, "GET")
+
+            def do_POST(self):
+                server.dispatch(self, "POST")
+
+            def do_PUT(self):
+                server.dispatch(self, "PUT")
+
+            def do_HEAD(self):
+                server.dispatch(self, "HEAD")
+
+        return Handler
+
+    @staticmethod
+    def respond(handler: BaseHTTPRequestHandler, status: int,
+                body: Union[dict, list, None] = None,
+                headers: Dict[str, str] = None,
+                content_type: str = "application/json"):
+        content = json.dumps(body).encode() if body is not None else b""
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(content)))
+        for i, j in (headers or {}).items():
+            handler.send_header(i, j)
+        handler.end_headers()
+        if handler.command != "HEAD":
+            handler.wfile.write(content)
+
+    def dispatch(self, handler: BaseHTTPRequestHandler, method: str):
+        parsed = urlparse(handler.path)
+        query = {i: j[0] if len(j) == 1 else j
+                 for i, j in parse_qs(parsed.query).items()}
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw else {}
+
+        parts = parsed.path.strip("/").split("/", 1)
+        provider, path = parts[0], parts[1] if len(parts) > 1 else ""
+
+        if provider == "_stats":
+            return self.respond(handler, 200, self.stats())
+        if provider == "_reset":
+            self.reset()
+            return self.respond(handler, 200, {})
+        if provider == "_gateway":
+            return self.respond(handler, *self.control_gateway(path, body))
+        if provider == "gateway":
+            self.count("discord", "gateway.connect")
+            return self.gateway.serve(handler, self.gateway_url)
+        if provider not in PROVIDERS:
+            return self.respond(handler, 404, {"message": "Unknown provider"})
+
+        delay = self.latency.get(provider, 0)
+        if delay:
+            time.sleep(delay)
+
+        if provider in self.limiters:
+            wait = self.limiters[provider].take()
+            if wait:
+                with self.lock:
+                    self.rate_limited[provider] += 1
+                self.count(provider, "429")
+                return self.respond(
+                    handler, 429,
+                    {"message": "You are being rate limited.",
+                     "retry_after": wait, "global": False},
+                    headers={"Retry-After": str(max(1, round(wait)))})
+
+        if provider in self.outages and \
+                sum(self.calls[provider].values()) >= self.outages[provider]:
+            self.count(provider, "500")
+            return self.respond(handler, 500,
+                                {"message": "Internal Server Error"})
+
+        route = getattr(self, f"route_{provider}")
+        endpoint, status, result = route(method, path, query, body)
+        self.count(provider, endpoint)
+        with self.lock:
+            lost = self.lost_responses.get(endpoint, 0) > 0
+            if lost:
+                self.lost_responses[endpoint] -= 1
+        if lost:
+            self.count(provider, "500")
+            return self.respond(handler, 500,
+                                {"message": "Internal Server Error"})
+        if provider == "images":
+            return self.respond(handler, status, content_type="image/jpeg")
+        self.respond(handler, status, result)
+
+    def route_discord(self, method: str, path: str, query: dict,
+                      body: dict) -> tuple:
+        if path == "api/v9/users/@me":
+            return "users.me", 200, {"id": "1", "username": "stub"}
+        if path in ["api/v9/gateway", "api/v9/gateway/bot"]:
+            return path[7:].replace("/", "."), 200, {"url": self.gateway_url}
+
+        match = re.match(r"api/v9/channels/(\d+)/messages", path)
+        if match:
+            messages = self.dataset.get_messages(
+                match.group(1), limit=int(query.get("limit", 50)),
+                before=query.get("before"), after=query.get("after"))
+            if messages is None:
+                return "channels.messages", 403, {"message": "Missing Access",
+                                                  "code": 50001}
+            return "channels.messages", 200, messages
+
+        return "unknown", 404, {"message": "404: Not Found", "code": 0}
+
+    def route_tmdb(self, method: str, path: str, query: dict,
+                   body: dict) -> tuple:
+        not_found = {"success": False, "status_code": 34,
+                     "status_message": "The resource you requested could "
+                                       "not be found."}
+
+        match = re.match(r"3/find/(tt\d+)$", path)
+        if match:
+            tmdb_id = self.dataset.tmdb_id(match.group(1))
+            if tmdb_id is None:
+                return "find", 200, {"movie_results": []}
+            movie = self.dataset.tmdb_movie(tmdb_id)
+            return "find", 200, {"movie_results": [{
+                i: movie[i] for i in ["id", "title", "original_title",
+                                      "poster_path", "release_date",
+                                      "vote_average"]}]}
+
+        if path == "3/configuration":
+            configuration = self.dataset.tmdb_configuration()
+            configuration["images"]["secure_base_url"] = \
+                f"{self.url}/images/tmdb/t/p/"
+            return "configuration", 200, configuration
+
+        match = re.match(r"3/movie/(\d+)/videos$", path)
+        if match:
+            return "videos", 200, self.dataset.tmdb_videos(
+                int(match.group(1)))
+
+        match = re.match(r"3/movie/(\d+)$", path)
+        if match:
+            return "movie", 200, self.dataset.tmdb_movie(int(match.group(1)))
+
+        return "unknown", 404, not_found
+
+    def route_jikan(self, method: str, path: str, query: dict,
+                    body: dict) -> tuple:
+        match = re.match(r"v4/anime/(\d+)", path)
+        if match:
+            anime = self.dataset.jikan_anime(int(match.group(1)))
+            anime["images"]["jpg"]["image_url"] = anime["images"]["jpg"][
+                "image_url"].replace("https://cdn.myanimelist.net",
+                                     f"{self.url}/images/mal")
+            return "anime", 200, {"data": anime}
+
+        return "unknown", 404, {"status": 404, "message": "Not Found"}
+
+    def route_images(self, method: str, path: str, query: dict,
+                     body: dict) -> tuple:
+        status = 200 if self.dataset.poster_loads(path) else 404
+        return method.lower(), status, None
+
+    def route_anilist(self, method: str, path: str, query: dict,
+                      body: dict) -> tuple:
+        anilist_id = body.get("variables", {}).get("id")
+        if anilist_id is None:
+            return "graphql", 400, {"errors": [{"message": "Bad request"}]}
+
+        return "graphql", 200, {"data": {"Media": {
+            "idMal": self.dataset.anilist_mal_id(int(anilist_id))}}}
+
+    def route_sheets(self, method: str, path: str, query: dict,
+                     body: dict) -> tuple:
+        not_found = {"error": {"code": 404,
+                               "message": "Requested entity was not found.",
+                               "status": "NOT_FOUND"}}
+
+        if path == "v4/spreadsheets" and method == "POST":
+            return "spreadsheets.create", 200, self.sheets.create(body)
+
+        match = re.match(r"v4/spreadsheets/([^/:]+)(.*)$", path)
+        if not match:
+            return "unknown", 404, not_found
+
+        spreadsheet_id, rest = match.groups()
+        if spreadsheet_id not in self.sheets.docs:
+            return "spreadsheets.get", 404, not_found
+
+        if rest == "" and method == "GET":
+            return "spreadsheets.get", 200, self.sheets.get(spreadsheet_id)
+        if rest == ":batchUpdate":
+            return "spreadsheets.batchUpdate", 200, \
+                self.sheets.batch_update(spreadsheet_id, body)
+        if rest == "/values:batchUpdate":
+            return "values.batchUpdate", 200, \
+                self.sheets.values_batch_update(spreadsheet_id, body)
+        if rest == "/values:batchGet":
+            ranges = query.get("ranges", [])
+            if isinstance(ranges, str):
+                ranges = [ranges]
+            return "values.batchGet", 200, {
+                "spreadsheetId": spreadsheet_id,
+                "valueRanges": [self.sheets.values_get(spreadsheet_id, i)
+                                for i in ranges]}
+
+        match = re.match(r"/values/(.+?)(:append)?$", rest)
+        if match:
+            a1, append = match.groups()
+            if append:
+                return "values.append", 200, self.sheets.values_append(
+                    spreadsheet_id, a1, body)
+            if method == "PUT":
+                return "values.update", 200, self.sheets.values_update(
+                    spreadsheet_id, a1, body)
+            return "values.get", 200, self.sheets.values_get(spreadsheet_id,
+                                                             a1)
+
+        return "unknown", 404, not_found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="stubserver",
+        description="Offline stand-in for the APIs used by discordmovies.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--movies", type=int, default=100,
+                        help="Number of unique IMDB links.")
+    parser.add_argument("--anime", type=int, default=10,
+                        help="Number of unique MAL links.")
+    parser.add_argument("--anilist", type=int, default=5,
+                        help="Number of unique Anilist links.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every response.")
+    parser.add_argument("--rate-limit", action="append", default=[],
+                        metavar="PROVIDER=RPS",
+                        help="Answer with 429 when a provider gets more than "
+                             "RPS requests per second. Can be repeated.")
+    args = parser.parse_args()
+
+    rate_limits = {}
+    for i in args.rate_limit:
+        provider, rps = i.split("=")
+        rate_limits[provider] = float(rps)
+
+    dataset = Dataset(movies=args.movies, anime=args.anime,
+                      anilist=args.anilist, seed=args.seed)
+    server = StubServer(dataset=dataset, host=args.host, port=args.port,
+                        latency=args.latency, rate_limits=rate_limits)
+
+    for i, j in server.env().items():
+        print(f"export {i}='{j}'")
+    print(f"# movie channel: {dataset.movie_channel_id}, watched channel: "
+          f"{dataset.watched_channel_id}")
+    print(f"# stats: {server.url}/_stats")
+    print(f"# post a message: curl -d '{{\"channel_id\": \""
+          f"{dataset.movie_channel_id}\", \"content\": \"...\"}}' "
+          f"{server.url}/_gateway/message")
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+import json
+import os
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Union
+
+
+class Dataset:
+    """
+    A deterministic, synthetic set of Discord messages and the metadata the
+    various providers would return for the links inside them. Used by the
+    stand-in server and the benchmarks so that runs can be compared with each
+    other.
+    """
+
+    GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Drama",
+              "Fantasy", "Horror", "Mystery", "Romance", "Science Fiction",
+              "Thriller"]
+
+    USERS = ["alice", "bob", "carol", "dave", "erin", "frank", "grace",
+             "heidi", "ivan", "judy"]
+
+    def __init__(self, movies: int = 100, anime: int = 10,
+                 anilist: int = 5, duplicates: float = 0.1,
+                 chatter: float = 0.2, watched: float = 0.25,
+                 movie_channel_id: str = "1", watched_channel_id: str = "2",
+                 seed: int = 0, dead_posters: float = 0.0,
+                 same_titles: int = 0):
+
+        self.movie_channel_id = str(movie_channel_id)
+        # The last same_titles movies get the metadata of the first ones,
+        # like a film listed under two IMDB IDs, so they're merged by title.
+        self.same_titles = min(same_titles, movies // 2)
+        self.movies = movies
+        self.dead_posters = dead_posters
+        self.watched_channel_id = str(watched_channel_id)
+        self.random = random.Random(seed)
+
+        imdb_links = [f"https://www.imdb.com/title/tt{i:07d}/"
+                      for i in range(1, movies + 1)]
+        mal_links = [f"https://myanimelist.net/anime/{i}/"
+                     for i in range(1, anime + 1)]
+        # Anilist links resolve to MAL IDs, give them their own range so they
+        # don't collide with the MAL links above.
+        anilist_links = [f"https://anilist.co/anime/{i}/"
+                         for i in range(10001, 10001 + anilist)]
+
+        self.links = imdb_links + mal_links + anilist_links
+        self.random.shuffle(self.links)
+
+        suggestions = list(self.links)
+        suggestions += self.random.sample(
+            self.links, int(len(self.links) * duplicates))
+        self.random.shuffle(suggestions)
+
+        contents = [f"check this out {i}" for i in suggestions]
+        contents += ["what time is movie night?"] * int(
+            len(suggestions) * chatter)
+        self.random.shuffle(contents)
+
+        self.watched_links = self.random.sample(
+            self.links, int(len(self.links) * watched))
+
+        self.channels = {
+            self.movie_channel_id: self.build_messages(contents, 0),
+            self.watched_channel_id: self.build_messages(
+                self.watched_links, len(contents))
+        }
+        self.next_id = 1000000 + len(contents) + len(self.watched_links)
+
+    def build_messages(self, contents: List[str],
+                       id_offset: int) -> List[dict]:
+        """
+        Turn message contents into Discord message objects, newest first, the
+        same order Discord returns them in.
+        """
+
+        start = datetime(2020, 1, 1)
+        messages = []
+        for i, content in enumerate(contents):
+            messages.append({
+                "id": str(1000000 + id_offset + i),
+                "content": content,
+                "author": {"username": self.random.choice(self.USERS)},
+                "timestamp": (start + timedelta(hours=i)).isoformat() +
+                "+00:00"
+            })
+        messages.reverse()
+
+        return messages
+
+    def get_messages(self, channel_id: str, limit: int = 100,
+                     before: str = None,
+                     after: str = None) -> Union[List[dict], None]:
+        """
+        Page through a channel the way the Discord API does. Returns None if
+        the channel does not exist.
+        """
+
+        if channel_id not in self.channels:
+            return None
+
+        messages = self.channels[channel_id]
+        if before is not None:
+            messages = [i for i in messages if int(i["id"]) < int(before)]
+        if after is not None:
+            messages = [i for i in messages if int(i["id"]) > int(after)]
+            # When paging forwards Discord returns the messages closest to the
+            # ID, still newest first.
+            return messages[-limit:]
+
+        return messages[:limit]
+
+    def add_message(self, channel_id: str, content: str,
+                    username: str = None) -> dict:
+        """
+        Post a new message to a channel. Returns the message, with its
+        channel_id set the way gateway events have it.
+        """
+
+        message = {
+            "id": str(self.next_id),
+            "channel_id": channel_id,
+            "content": content,
+            "author": {"username": username or self.random.choice(
+                self.USERS)},
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        self.next_id += 1
+        self.channels[channel_id].insert(0, message)
+
+        return message
+
+    def edit_message(self, channel_id: str, message_id: str,
+                     content: str) -> Union[dict, None]:
+        for i in self.channels[channel_id]:
+            if i["id"] == message_id:
+                i["content"] = content
+                return {**i, "channel_id": channel_id,
+                        "edited_timestamp": datetime.now(
+                            timezone.utc).isoformat()}
+
+        return None
+
+    def delete_message(self, channel_id: str, message_id: str) -> bool:
+        messages = self.channels[channel_id]
+        for k, i in enumerate(messages):
+            if i["id"] == message_id:
+                del messages[k]
+                return True
+
+        return False
+
+    def window(self, channel_id: str, max_messages: int) -> List[dict]:
+        """
+        The messages a client limited to max_messages would see.
+        """
+
+        pages = -(-max_messages // 100)
+        return self.channels[channel_id][:pages * 100]
+
+    def tmdb_id(self, imdb_id: str) -> Union[int, None]:
+        number = int(imdb_id[2:])
+        if number > len(self.links):
+            return None
+        return 500000 + number
+
+    def tmdb_movie(self, tmdb_id: int) -> dict:
+        number = tmdb_id - 500000
+        twin = number
+        if number > self.movies - self.same_titles:
+            twin = number - (self.movies - self.same_titles)
+        rng = random.Random(500000 + twin)
+        return {
+            "id": tmdb_id,
+            "imdb_id": f"tt{number:07d}",
+            "title": f"Synthetic Movie {twin}",
+            "original_title": f"Synthetic Movie {twin}",
+            "genres": [{"id": i, "name": j} for i, j in enumerate(
+                rng.sample(self.GENRES, rng.randint(1, 3)))],
+            "runtime": rng.randint(75, 190),
+            "vote_average": round(rng.uniform(3, 9.5), 1),
+            "release_date": f"{rng.randint(1950, 2023)}-01-01",
+            "poster_path": f"/poster{number}.jpg"
+        }
+
+    @staticmethod
+    def tmdb_videos(tmdb_id: int) -> dict:
+        return {"id": tmdb_id,
+                "results": [{"site": "YouTube", "key": f"trailer{tmdb_id}"}]}
+
+    @staticmethod
+    def tmdb_configuration() -> dict:
+        return {"images": {
+            "base_url": "http://image.tmdb.org/t/p/",
+            "secure_base_url": "https://image.tmdb.org/t/p/",
+            "poster_sizes": ["w92", "w154", "w185", "w342", "w500", "w780",
+                             "original"]
+        }}
+
+    def jikan_anime(self, mal_id: int) -> dict:
+        rng = random.Random(mal_id)
+        return {
+            "mal_id": mal_id,
+            "title": f"Synthetic Anime {mal_id}",
+            "title_english": f"Synthetic Anime {mal_id}" if mal_id % 3
+            else None,
+            "title_japanese": f"アニメ {mal_id}",
+            "title_synonyms": [],
+            "images": {"jpg": {
+                "image_url": f"https://cdn.myanimelist.net/images/anime/"
+                             f"{mal_id}.jpg"}},
+            "genres": [{"mal_id": i, "name": j} for i, j in enumerate(
+                rng.sample(self.GENRES, rng.randint(1, 3)))],
+            "duration": f"{rng.randint(20, 120)} min",
+            "trailer": {"url": f"https://youtu.be/anime{mal_id}"},
+            "score": round(rng.uniform(5, 9.5), 2),
+            "aired": {"prop": {"from": {"year": rng.randint(1980, 2023)}}}
+        }
+
+    def write_archive(self, path: str, channel_id: str,
+                      jsonl: bool = False):
+        """
+        Write an export of a channel the way DiscordChatExporter does, oldest
+        message first, or as JSONL with a message per line after a header.
+        """
+
+        messages = [{
+            "id": i["id"], "type": "Default", "timestamp": i["timestamp"],
+            "content": i["content"],
+            "author": {"id": str(self.USERS.index(
+                i["author"]["username"])),
+                "name": i["author"]["username"], "discriminator": "0000",
+                "nickname": i["author"]["username"].title(), "isBot": False},
+            "attachments": [], "embeds": [], "reactions": [], "mentions": []
+        } for i in reversed(self.channels[channel_id])]
+        header = {"guild": {"id": "1", "name": "Movie Night"},
+                  "channel": {"id": channel_id, "type": "GuildTextChat",
+                              "name": f"channel-{channel_id}"}}
+
+        with open(path, "w", encoding="utf-8") as f:
+            if jsonl:
+                f.write(json.dumps(header) + "\n")
+                for i in messages:
+                    f.write(json.dumps(i) + "\n")
+            else:
+                json.dump({**header, "messages": messages,
+                           "messageCount": len(messages)}, f, indent=2)
+
+    def write_imdb_datasets(self, directory: str, missing: float = 0.1):
+        """
+        Write title.basics.tsv and title.ratings.tsv the way IMDb publishes
+        them, for the movies the stand-in's TMDB knows. A fraction of the
+        movies, missing, is left out so they have to be looked up online.
+        """
+
+        basics = ["tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\t"
+                  "startYear\tendYear\truntimeMinutes\tgenres"]
+        ratings = ["tconst\taverageRating\tnumVotes"]
+
+        rng = random.Random("imdb-datasets")
+        for i in self.links:
+            match = re.search(r"/title/(tt\d+)", i)
+            if match is None or rng.random() < missing:
+                continue
+            movie = self.tmdb_movie(self.tmdb_id(match.group(1)))
+            genres = ",".join(j["name"] for j in movie["genres"])
+            basics.append("\t".join([
+                movie["imdb_id"], "movie", movie["title"],
+                movie["original_title"], "0", movie["release_date"][:4],
+                "\\N", str(movie["runtime"]), genres]))
+            ratings.append(f"{movie['imdb_id']}\t{movie['vote_average']}"
+                           f"\t{rng.randint(5, 100000)}")
+
+        # Both files are sorted by ID, like IMDb's.
+        for name, lines in [("title.basics", basics),
+                            ("title.ratings", ratings)]:
+            with open(os.path.join(directory, f"{name}.tsv"), "w",
+                      encoding="utf-8") as f:
+                f.write("\n".join([lines[0]] + sorted(lines[1:])) + "\n")
+
+    def write_anime_offline_database(self, path: str):
+        """
+        Write an anime offline database JSON file with the anime the
+        stand-in's Jikan knows, listed under their MyAnimeList and AniList
+        links.
+        """
+
+        entries = []
+        mal_ids = {int(re.search(r"/anime/(\d+)", i).group(1))
+                   for i in self.links if "myanimelist.net" in i}
+        anilist_ids = [int(re.search(r"/anime/(\d+)", i).group(1))
+                       for i in self.links if "anilist.co" in i]
+        anilist = {self.anilist_mal_id(i): i for i in anilist_ids}
+
+        for mal_id in sorted(mal_ids | set(anilist)):
+            anime = self.jikan_anime(mal_id)
+            sources = [f"https://myanimelist.net/anime/{mal_id}"]
+            if mal_id in anilist:
+                sources.append(f"https://anilist.co/anime/{anilist[mal_id]}")
+            entries.append({
+                "sources": sources,
+                "title": anime["title"],
+                "type": "TV",
+                "episodes": 12,
+                "animeSeason": {"season": "SPRING",
+                                "year": anime["aired"]["prop"]["from"][
+                                    "year"]},
+                "picture": anime["images"]["jpg"]["image_url"],
+                "synonyms": [anime["title_japanese"]],
+                "tags": [i["name"].lower() for i in anime["genres"]],
+                "duration": {"value": int(anime["duration"].split()[0]) * 60,
+                             "unit": "SECONDS"},
+                "score": {"arithmeticMean": anime["score"]}
+            })
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"data": entries}, f)
+
+    def poster_loads(self, path: str) -> bool:
+        """
+        Whether a poster image exists. A fraction of posters, dead_posters,
+        only exist as the original TMDB size or the large MAL version.
+        """
+
+        number = re.search(r"(\d+)l?\.(jpg|webp)$", path)
+        if number is None:
+            return False
+        if random.Random(f"poster{number.group(1)}").random() >= \
+                self.dead_posters:
+            return True
+
+        return "/original/" in path or path.endswith("l.jpg")
+
+    @staticmethod
+    def anilist_mal_id(anilist_id: int) -> int:
+        return anilist_id + 20000
+
+    def expected_links(self, max_messages: int) -> Dict[str, set]:
+        """
+        The unique links per provider that a run limited to max_messages would
+        pick up from the movie channel.
+        """
+
+        found = {"imdb": set(), "mal": set(), "anilist": set()}
+        for i in self.window(self.movie_channel_id, max_messages):
+            for j in re.findall(r'https?://[^\s<>"]+', i["content"]):
+                if "imdb.com" in j:
+                    found["imdb"].add(j)
+                elif "myanimelist.net" in j:
+                    found["mal"].add(j)
+                elif "anilist.co" in j:
+                    found["anilist"].add(j)
+
+        return found
+
+
+def movie_list(size: int, duplicates: float = 0.1, seed: int = 0):
+    """
+    Build a MovieList of the given size with every attribute filled in, the
+    way it looks after metadata has been gathered. A fraction of the entries
+    are duplicates of others so that merging has work to do.
+    """
+
+    from discordmovies.movies import Movie, MovieList
+
+    rng = random.Random(seed)
+    unique = max(1, int(size * (1 - duplicates)))
+
+    movie_list = MovieList()
+    for i in range(size):
+        number = i if i < unique else rng.randrange(unique)
+        movie_rng = random.Random(number)
+        movie_list.append(Movie(values={
+            "Poster": f"https://image.tmdb.org/t/p/w154/poster{number}.jpg",
+            "Title": f"Synthetic Movie {number}",
+            "Genres": ", ".join(movie_rng.sample(Dataset.GENRES, 2)),
+            "Runtime": str(movie_rng.randint(75, 190)),
+            "Trailer": f"https://youtu.be/trailer{number}",
+            "User Score": str(round(movie_rng.uniform(3, 9.5), 1)),
+            "ID": f"IMDB: tt{number:07d}",
+            "Link": f"https://www.imdb.com/title/tt{number:07d}/",
+            "Date Suggested": f"2020-01-01T00:00:{i % 60:02d}+00:00",
+            "User": rng.choice(Dataset.USERS),
+            "Watched": "False",
+            "Release Date": str(movie_rng.randint(1950, 2023))
+        }))
+
+    return movie_list
+
+
+def fuzzy_movie_list(size: int, variants: float = 0.2, seed: int = 0):
+    """
+    Build a MovieList of titles made of random words, the way it looks after
+    metadata has been gathered. A fraction of the entries are the same title
+    from MAL, spelled slightly differently, so fuzzy merging has work to do.
+    Titles are numbered sequels of each other now and then.
+    """
+
+    from discordmovies.movies import Movie, MovieList
+
+    rng = random.Random(seed)
+    syllables = ["ka", "to", "ri", "mon", "sha", "dow", "ver", "lan", "tis",
+                 "el", "qu", "ar", "nox", "bel", "fi", "ra", "sun", "vo"]
+    words = ["".join(rng.sample(syllables, rng.randint(2, 3)))
+             for _ in range(3000)]
+
+    def spell(title: str) -> str:
+        kind = rng.randrange(4)
+        if kind == 0:
+            return title.upper()
+        if kind == 1:
+            return title.replace(" ", ": ", 1)
+        if kind == 2:
+            return "The " + title
+        return title.replace("a", "á", 1) + "!"
+
+    unique = max(1, int(size * (1 - variants)))
+    originals = []
+    varied = None
+    movie_list = MovieList()
+    for i in range(size):
+        if i < unique:
+            title = " ".join(rng.sample(words, rng.randint(1, 4))).title()
+            if rng.random() < 0.05:
+                title += f" {rng.randint(2, 5)}"
+            year = str(rng.randint(1950, 2023))
+            originals.append((title, year))
+            content_id = f"IMDB: tt{i:07d}"
+            link = f"https://www.imdb.com/title/tt{i:07d}/"
+        else:
+            if varied is None:
+                varied = iter(rng.sample(originals, min(len(originals),
+                                                        size - unique)))
+            title, year = next(varied)
+            title = spell(title)
+            content_id = f"MAL: {i}"
+            link = f"https://myanimelist.net/anime/{i}/"
+        movie_list.append(Movie(values={
+            "Poster": f"https://image.tmdb.org/t/p/w154/poster{i}.jpg",
+            "Title": title,
+            "Genres": ", ".join(rng.sample(Dataset.GENRES, 2)),
+            "Runtime": str(rng.randint(75, 190)),
+            "Trailer": f"https://youtu.be/trailer{i}",
+            "User Score": str(round(rng.uniform(3, 9.5), 1)),
+            "ID": content_id,
+            "Link": link,
+            "Date Suggested": f"2020-01-01T00:00:{i % 60:02d}+00:00",
+            "User": rng.choice(Dataset.USERS),
+            "Watched": "False",
+            "Release Date": year
+        }))
+
+    return movie_list
+
+
+def discord_pages(size: int, seed: int = 0) -> List[List[dict]]:
+    """
+    Pages of Discord messages as returned by Discord.get_messages, one link
+    per message.
+    """
+
+    dataset = Dataset(movies=0, anime=0, anilist=0, seed=seed)
+    contents = [f"watch https://www.imdb.com/title/tt{i:07d}/ tonight"
+                for i in range(size)]
+    messages = dataset.build_messages(contents, 0)
+
+    return [messages[i:i + 100] for i in range(0, len(messages), 100)]
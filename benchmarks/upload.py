@@ -0,0 +1,117 @@
+"""
+Benchmark of chunked Google Sheets uploads against the offline stand-in
+server. A large first sync is uploaded to a new sheet once in a single
+request and once in chunks, then a second batch is appended. Finally an
+upload is interrupted by rate limiting part way through and resumed the way
+the next run would, and the sheet is checked to hold every row in order.
+
+    python -m benchmarks.upload --rows 5000 --latency 0.05
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+from benchmarks.stubserver import StubServer, TokenBucket
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.upload",
+        description="Benchmark of chunked, resumable Sheets uploads.")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--chunk-rows", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rows = synthetic.movie_list(args.rows * 2, duplicates=0).get_movies_list()
+    first, second = rows[:args.rows + 1], rows[args.rows + 1:]
+    results = {"rows": args.rows}
+    failed = False
+
+    with StubServer(latency={"sheets": args.latency}) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        os.environ.update(server.env())
+        cwd = os.getcwd()
+        os.chdir(directory)
+
+        from discordmovies.outputmodules.googleutils import sheetsutils
+        from discordmovies.outputmodules.googleutils import DocsHandler
+
+        def sheet_rows(handler: DocsHandler) -> list:
+            return server.sheets.values_get(handler.spreadsheet_id,
+                                            "A:Z").get("values", [])
+
+        try:
+            chunk_bytes = sheetsutils.CHUNK_BYTES
+            for name, chunk_rows in [("single_request", 10 ** 9),
+                                     ("chunked", args.chunk_rows)]:
+                sheetsutils.CHUNK_ROWS = chunk_rows
+                sheetsutils.CHUNK_BYTES = chunk_bytes if chunk_rows < \
+                    10 ** 9 else 10 ** 12
+                handler = DocsHandler()
+                handler.setup_docs()
+                handler.create_sheet(title=name)
+
+                server.reset()
+                start = time.perf_counter()
+                handler.fill_sheet(inputs=first)
+                fill = round(time.perf_counter() - start, 4)
+
+                server.reset()
+                start = time.perf_counter()
+                handler.append_sheet(values=second, quiet=True)
+                append = round(time.perf_counter() - start, 4)
+
+                written = sheet_rows(handler)
+                correct = len(written) == len(rows)
+                failed = failed or not correct
+                results[name] = {"fill_seconds": fill,
+                                 "append_seconds": append,
+                                 "append_calls": server.stats()["calls"].get(
+                                     "sheets", {}),
+                                 "all_rows_written": correct}
+
+            # Allow about half of the chunks through, then give up.
+            handler = DocsHandler()
+            handler.setup_docs()
+            handler.create_sheet(title="interrupted")
+            server.limiters["sheets"] = TokenBucket(rate=0.001, burst=(
+                args.rows // args.chunk_rows) // 2)
+            try:
+                handler.fill_sheet(inputs=first)
+                interrupted = False
+            except Exception:
+                interrupted = True
+            del server.limiters["sheets"]
+
+            progress = os.path.exists(handler.progress_path())
+            server.reset()
+            resumed = DocsHandler(spreadsheet_id=handler.spreadsheet_id)
+            resumed.setup_docs()
+            resumed.resume_upload()
+            correct = sheet_rows(handler) == written[:len(first)]
+            failed = failed or not (interrupted and progress and correct)
+            results["interrupted"] = {
+                "interrupted": interrupted,
+                "progress_recorded": progress,
+                "chunks_resent": server.stats()["calls"].get(
+                    "sheets", {}).get("values.update", 0),
+                "rows_match": correct,
+                "progress_cleared": not os.path.exists(
+                    handler.progress_path())
+            }
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Benchmark of watch mode against the offline stand-in server. After the
+catch-up run the watcher is left polling. The API calls made by idle cycles
+and by a burst of suggestions are counted, and the time until a full sync
+notices a deleted message is measured. For comparison the calls made by
+running discord_to_file again, which is what a cron job does every time, are
+counted too.
+
+    python -m benchmarks.watch --output sheet
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.gateway import Rows, wait_for
+from benchmarks.stubserver import StubServer
+from benchmarks.synthetic import Dataset
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="benchmarks.watch",
+        description="Benchmark of watch mode against the offline stand-in "
+                    "server.")
+    parser.add_argument("--output", choices=["csv", "sheet"], default="csv")
+    parser.add_argument("--movies", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=5,
+                        help="Suggestions sent at once.")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    dataset = Dataset(movies=args.movies, anime=args.burst + 1, anilist=0)
+    spare = [f"https://www.imdb.com/title/tt{i:07d}/" for i in
+             range(args.movies + 1, len(dataset.links) + 1)]
+    movies, watched = dataset.movie_channel_id, dataset.watched_channel_id
+
+    results = {"output": args.output}
+    failed = False
+
+    with StubServer(dataset=dataset) as server:
+        os.environ.update(server.env())
+
+        import discordmovies
+        from discordmovies.attributes import DiscordAttributes
+        from discordmovies.watch import Watcher
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            movie_app = discordmovies.DiscordMovies(discord_auth_token="stub",
+                                                    doc_name="benchmark")
+            watcher = Watcher(
+                attributes=movie_app.attributes, keys=movie_app.keys,
+                discord_attr=DiscordAttributes(channel_id=movies,
+                                               watched_channel_id=watched,
+                                               max_messages=1000),
+                interval=args.interval, full_sync_every=4)
+            thread = None
+            try:
+                watcher.connect()
+                file = movie_app.discord_to_file(
+                    filetype=args.output, channel_id=movies,
+                    watched_channel_id=watched, max_messages=1000,
+                    tmdb_api_key="stub")
+                sheet_id = list(server.sheets.docs)[-1] \
+                    if server.sheets.docs else None
+
+                server.reset()
+                thread = threading.Thread(target=watcher.run, args=([file],),
+                                          daemon=True)
+                thread.start()
+                rows = Rows(args.output, server, "benchmark")
+
+                # Three cycles without anything happening.
+                time.sleep(args.interval * 3.5)
+                results["idle_cycles"] = server.stats()["totals"]
+
+                server.reset()
+                for i in spare[:args.burst]:
+                    server.dataset.add_message(movies, f"how about {i}")
+                delay = wait_for(lambda: all(rows.row(i) is not None
+                                             for i in spare[:args.burst]),
+                                 args.timeout)
+                time.sleep(args.interval)
+                results["burst"] = {
+                    "suggestions": args.burst,
+                    "seconds": delay,
+                    "calls": server.stats()["calls"]
+                }
+                failed = failed or delay is None
+
+                server.reset()
+                message = server.dataset.channels[movies][0]
+                server.dataset.delete_message(movies, message["id"])
+                link = spare[args.burst - 1]
+                delay = wait_for(lambda: rows.row(link) is None,
+                                 args.interval * 4 + args.timeout)
+                results["delete_seen_after"] = delay
+                failed = failed or delay is None
+
+                watcher.stop()
+                thread.join(5)
+
+                # What a cron job would pay for each of those idle cycles.
+                server.reset()
+                start = time.perf_counter()
+                discordmovies.DiscordMovies(
+                    discord_auth_token="stub", doc_name="benchmark"
+                ).discord_to_file(filetype=args.output, channel_id=movies,
+                                  watched_channel_id=watched,
+                                  sheet_id=sheet_id, max_messages=1000,
+                                  tmdb_api_key="stub")
+                results["discord_to_file_run"] = {
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "calls": server.stats()["totals"]
+                }
+            finally:
+                watcher.stop()
+                if thread is not None:
+                    thread.join(5)
+                os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
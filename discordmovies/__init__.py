@@ -1 +1,15 @@
-from .discordmovies import *
+import importlib
+
+# Submodules are only imported when something from them is first used, so
+# that importing the package stays cheap for the CLI and short cron runs.
+__all__ = ["DiscordMovies", "RunOptions"]
+
+
+def __getattr__(name: str):
+    module = importlib.import_module(".discordmovies", __name__)
+
+    try:
+        return getattr(module, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute "
+                             f"{name!r}") from None
@@ -1,5 +1,6 @@
+from discordmovies.links import LinkRegistry
 from discordmovies.movies import MovieList
-from typing import List, Union
+from typing import Dict, Iterable, List, Union
 
 
 class DiscordMoviesAttributes(dict):
@@ -11,29 +12,24 @@ class DiscordMoviesAttributes(dict):
 
     def __init__(self, name: str = "discordmovies",
                  movie_list: MovieList = None,
-                 links: List[str] = None,
-                 watched_links: List[str] = None,
+                 links: Iterable[str] = None,
+                 watched_links: Iterable[str] = None,
                  attributes: List[str] = None,
                  exclude_attributes: List[str] = None,
                  bot: bool = None):
 
         super().__init__()
 
-        if links is None:
-            self["links"] = []
-
-        if watched_links is None:
-            self["watched_links"] = []
-
         if movie_list is None:
             self["movie_list"] = MovieList(
                 categories=attributes, exclude_categories=exclude_attributes)
         else:
             self["movie_list"] = movie_list
 
-        self["links"] = links
+        # The links suggested in the movie and watched channels.
+        self["links"] = LinkRegistry(links)
         self["name"] = name
-        self["watched_links"] = watched_links
+        self["watched_links"] = LinkRegistry(watched_links)
         self["bot"] = bot
 
 
@@ -68,3 +64,81 @@ class DiscordAttributes(dict):
         self["channel_id"] = channel_id
         self["watched_channel_id"] = watched_channel_id
         self["max_messages"] = max_messages
+
+
+class RunOptions(dict):
+    """
+    Optional settings of a run, on top of which channels and file it is
+    for. They are kept together so they can be passed through
+    discord_to_file, listen, watch and jobs as one object, and are shared
+    with the other modules through the "options" attribute.
+
+    With report, statistics about the movies are written alongside the file,
+    see FileHelper.write_report.
+
+    With time_budget, metadata is only gathered for that many seconds from
+    the start of the run. Movies that weren't reached by then are left out
+    of the file and added by the next run, see MovieList.fill_all_metadata.
+    Metadata is saved as it's found until the movies are written, so a run
+    that's interrupted is picked up by the next one writing the same file,
+    see MetadataCheckpoint. With fresh, what an earlier run saved is thrown
+    away instead.
+
+    With source "archive", messages are read from the exports of the
+    channels in archive, files or folders, rather than from Discord, see
+    Archive.
+
+    With shard, movies are moved out of the first tab of a Google Sheet into
+    other tabs of it, watched movies with "watched" and movies of past years
+    with "year", see SheetsHelper.shard_sheet. CSV files aren't sharded.
+
+    With changelog, the movies added, removed, updated and watched are
+    appended to that file as JSON lines, see Changelog.
+
+    With flush_every or flush_interval, movies are written in batches of
+    that many movies, or every that many seconds, while metadata is
+    gathered, newest first, rather than all at the end. Files that are
+    rewritten because their columns changed are still written at once.
+
+    With serve, queries about the movies are answered over HTTP on that port
+    of serve_host while listening or watching, see DiscordMovies.serve.
+    Movies being served in the same process are brought up to date with the
+    changes of each run.
+
+    With merge_similar, titles that only look alike, such as the same film
+    linked from IMDB and MAL, are merged too, see MovieList.merge_similar.
+    """
+
+    def __init__(self, report: bool = False,
+                 time_budget: float = None,
+                 archive: List[str] = None,
+                 shard: str = None,
+                 changelog: str = None,
+                 flush_every: int = None,
+                 flush_interval: float = None,
+                 serve: int = None,
+                 serve_host: str = "127.0.0.1",
+                 merge_similar: bool = False,
+                 fresh: bool = False):
+
+        super().__init__()
+
+        self["report"] = report
+        self["time_budget"] = time_budget
+        self["archive"] = archive
+        self["shard"] = shard
+        self["changelog"] = changelog
+        self["flush_every"] = flush_every
+        self["flush_interval"] = flush_interval
+        self["serve"] = serve
+        self["serve_host"] = serve_host
+        self["merge_similar"] = merge_similar
+        self["fresh"] = fresh
+
+    def changed(self) -> Dict[str, object]:
+        """
+        The options that aren't set to their default.
+        """
+
+        defaults = RunOptions()
+        return {i: j for i, j in self.items() if j != defaults[i]}
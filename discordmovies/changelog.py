@@ -0,0 +1,143 @@
+import datetime
+import json
+import threading
+from typing import Dict, Iterable, List
+from discordmovies.links import LinkRegistry, as_registry
+from discordmovies.movies import MovieList
+from discordmovies.parsers import is_watched
+
+# Jobs writing to the same changelog may append to it at the same time.
+write_lock = threading.Lock()
+
+
+def rows_by_column(values: List[List[str]]) -> List[Dict[str, str]]:
+    """
+    The rows of a file, the first of which is the header, as dictionaries
+    by column.
+    """
+
+    header = values[0] if values else []
+
+    return [dict(zip(header, i)) for i in values[1:]]
+
+
+class Changelog:
+    """
+    The changes made to a file in a run, appended to a JSONL file so other
+    programs, like a bot announcing new suggestions, can follow along without
+    reading and comparing the whole file after every run.
+
+    Every line is a change to a movie: "added", "removed" or "updated" for
+    its row, "watched" or "unwatched" for its watched column. Lines hold the
+    time of the run, the name of the file, the change, the movie's link and
+    its row by column, as written or, for removed movies, as last written.
+    """
+
+    def __init__(self, path: str, name: str, output: str):
+        self.path = path
+        self.name = name
+        self.output = output
+        self.time = datetime.datetime.now(
+            datetime.timezone.utc).isoformat()
+        self.events: List[dict] = []
+
+    def add(self, event: str, movie: Dict[str, str]):
+        self.events.append({"time": self.time, "file": self.name,
+                            "output": self.output, "event": event,
+                            "link": movie.get("Link", ""), "movie": movie})
+
+    def add_movies(self, movie_list: MovieList, event: str = "added"):
+        categories = movie_list.get_categories()
+        for i in movie_list.get_movies_list(attributes_key=False,
+                                            format_images=False):
+            self.add(event, dict(zip(categories, i)))
+
+    def add_watched(self, movie: Dict[str, str], watched: bool):
+        self.add("watched" if watched else "unwatched",
+                 {**movie, "Watched": str(watched)})
+
+    def compare(self, previous: List[List[str]], movie_list: MovieList,
+                links: Iterable[str], watched_links: Iterable[str],
+                overwrite: bool = False):
+        """
+        Work out the changes of a run of discord_to_file from what it
+        already knows: the rows of the file before it was written, header
+        included, the movies that were written, and the links that are still
+        suggested and watched.
+
+        Rows of links that aren't suggested anymore are removed. If the file
+        was overwritten, the other rows that were written again are updated
+        and the rest removed, otherwise their watched column follows
+        watched_links when there are any.
+        """
+
+        links = LinkRegistry(links)
+        watched_links = LinkRegistry(watched_links)
+        categories = movie_list.get_categories()
+        track_watched = "Watched" in categories and bool(watched_links)
+
+        written_links = LinkRegistry(j for i in movie_list
+                                     for j in LinkRegistry.split(i["Link"]))
+        previous_links = LinkRegistry()
+
+        for i in rows_by_column(previous):
+            link = str(i.get("Link", ""))
+            previous_links.extend(LinkRegistry.split(link))
+            if overwrite and written_links.matches(link):
+                continue
+            if overwrite or not links.matches(link):
+                self.add("removed", i)
+            elif track_watched:
+                watched = watched_links.matches(link)
+                if watched != is_watched(i.get("Watched", "")):
+                    self.add_watched(i, watched)
+
+        # Movies that were already in an overwritten file were updated.
+        rewritten = [overwrite and previous_links.matches(i["Link"])
+                     for i in movie_list]
+        self.add_movies(MovieList(categories=categories, items=[
+            i for i, j in zip(movie_list, rewritten) if not j]))
+        self.add_movies(MovieList(categories=categories, items=[
+            i for i, j in zip(movie_list, rewritten) if j]), event="updated")
+
+    def add_changes(self, previous: List[List[str]], movie_list: MovieList,
+                    removed: Iterable[str], watched: Iterable[str],
+                    unwatched: Iterable[str]):
+        """
+        Record changes as the listener applies them to a file, given the rows
+        of the file before, header included. Only rows that actually change
+        are recorded.
+        """
+
+        removed = as_registry(removed)
+        watched = as_registry(watched)
+        unwatched = as_registry(unwatched)
+
+        for i in rows_by_column(previous):
+            link = str(i.get("Link", ""))
+            if removed.matches(link):
+                self.add("removed", i)
+            elif watched.matches(link) and not is_watched(i.get("Watched")):
+                self.add_watched(i, True)
+            elif unwatched.matches(link) and is_watched(i.get("Watched")):
+                self.add_watched(i, False)
+
+        self.add_movies(movie_list)
+
+    def write(self):
+        """
+        Append the changes to the changelog, if there are any. Changelogs
+        without a path are only kept in memory, to be passed on, see
+        MovieStore.apply.
+        """
+
+        if not self.events or self.path is None:
+            return
+
+        lines = "".join(json.dumps(i) + "\n" for i in self.events)
+        with write_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+        print(f"{len(self.events)} changes written to {self.path}.")
+        self.events = []
@@ -0,0 +1,127 @@
+from typing import Dict
+import numpy as np
+from discordmovies.movies import MovieList
+from discordmovies.parsers import first_line, is_watched, parse_genres, \
+    parse_runtime, parse_score, parse_year
+
+# The attributes select can sort by.
+SORTABLE = ["runtime", "score", "year"]
+
+
+class MovieColumns:
+    """
+    A typed, columnar copy of a MovieList, so it can be filtered and sorted
+    with NumPy instead of parsing every movie's text again for each query.
+
+    runtime (in minutes), score and year are float arrays, with NaN where
+    they aren't known so any comparison with them is False. watched is a
+    boolean array. Users are stored as codes into user_names, genres as a
+    boolean matrix with a column per name in genre_names, since movies can
+    have several.
+
+    Filters are combined as NumPy masks and passed to select:
+
+        columns = movie_list.columns()
+        columns.select(~columns.watched & (columns.runtime < 120) &
+                       (columns.score > 7) & columns.genre("Horror"),
+                       sort="score", descending=True)
+
+    This is a snapshot, build it again after the list changes.
+    """
+
+    def __init__(self, movie_list: MovieList):
+        self.movies = list(movie_list)
+        self.categories = movie_list.get_categories()
+
+        # Values repeat a lot, so each distinct one is only parsed once.
+        cache: Dict[tuple, object] = {}
+
+        def parse(function, attribute: str) -> list:
+            parsed = []
+            for i in self.movies:
+                key = (function, i.info.get(attribute, ""))
+                if key not in cache:
+                    cache[key] = function(key[1])
+                parsed.append(cache[key])
+            return parsed
+
+        self.runtime = np.array(parse(parse_runtime, "Runtime"), dtype=float)
+        self.score = np.array(parse(parse_score, "User Score"), dtype=float)
+        self.year = np.array(parse(parse_year, "Release Date"), dtype=float)
+        self.watched = np.array(
+            [is_watched(i.info.get("Watched", "")) for i in self.movies],
+            dtype=bool)
+
+        users = [first_line(i.info.get("User", "")) for i in self.movies]
+        self.user_names, codes = np.unique(np.array(users, dtype=str),
+                                           return_inverse=True)
+        self.user_names = self.user_names.tolist()
+        self.user_codes = codes.reshape(-1).astype(np.int32)
+
+        genres = parse(parse_genres, "Genres")
+        self.genre_names = sorted({j for i in genres for j in i})
+        indexes = {j: i for i, j in enumerate(self.genre_names)}
+        self.genres = np.zeros((len(self.movies), len(self.genre_names)),
+                               dtype=bool)
+        rows = [i for i, j in enumerate(genres) for _ in j]
+        columns = [indexes[j] for i in genres for j in i]
+        self.genres[rows, columns] = True
+
+    def __len__(self) -> int:
+        return len(self.movies)
+
+    def genre(self, *names: str) -> np.ndarray:
+        """
+        A mask of the movies with any of the given genres.
+        """
+
+        columns = [self.genre_names.index(i) for i in names
+                   if i in self.genre_names]
+        return self.genres[:, columns].any(axis=1)
+
+    def user(self, *names: str) -> np.ndarray:
+        """
+        A mask of the movies suggested by any of the given users.
+        """
+
+        codes = [self.user_names.index(i) for i in names
+                 if i in self.user_names]
+        return np.isin(self.user_codes, codes)
+
+    def indexes(self, mask: np.ndarray = None, sort: str = None,
+                descending: bool = False, limit: int = None) -> np.ndarray:
+        """
+        The indexes of the movies in mask, all of them if it isn't given,
+        optionally sorted by one of SORTABLE and cut to the first limit.
+        Movies with an unknown value come last when sorting, and otherwise
+        keep the list's order.
+        """
+
+        indexes = np.arange(len(self.movies)) if mask is None else \
+            np.flatnonzero(mask)
+
+        if sort is not None:
+            if sort not in SORTABLE:
+                raise ValueError(f"Can only sort by {', '.join(SORTABLE)}.")
+            values = getattr(self, sort)[indexes]
+            # NaN sorts last either way.
+            order = np.argsort(-values if descending else values,
+                               kind="stable")
+            indexes = indexes[order]
+
+        if limit is not None:
+            indexes = indexes[:limit]
+
+        return indexes
+
+    def select(self, mask: np.ndarray = None, sort: str = None,
+               descending: bool = False, limit: int = None) -> MovieList:
+        """
+        A MovieList of the movies in mask, see indexes.
+        """
+
+        indexes = self.indexes(mask=mask, sort=sort, descending=descending,
+                               limit=limit)
+
+        return MovieList(categories=self.categories,
+                         items=[self.movies[i] for i in indexes])
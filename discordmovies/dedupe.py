@@ -0,0 +1,260 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from math import ceil
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+from discordmovies.parsers import parse_year
+
+# How alike the titles of two movies from around the same year have to be
+# for them to be merged, from 0 to 1. At 1 titles are only merged if they're
+# the same once normalized, or known aliases of each other.
+THRESHOLD = float(os.environ.get("DEDUPE_THRESHOLD", 0.85))
+
+ARTICLES = ["the", "a", "an"]
+ROMAN_NUMERALS = {"ii": "2", "iii": "3", "iv": "4", "v": "5", "vi": "6",
+                  "vii": "7", "viii": "8", "ix": "9", "x": "10"}
+
+
+def normalize(title: str) -> str:
+    """
+    The form titles are compared in: lowercase without accents,
+    punctuation or a leading article, and with Roman numerals as digits.
+    """
+
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(i for i in title if not unicodedata.combining(i)).lower()
+    title = re.sub(r"['’`]", "", title).replace("&", " and ")
+    words = re.findall(r"[^\W_]+", title)
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    words = [str(int(i)) if i.isdecimal() else ROMAN_NUMERALS.get(i, i)
+             for i in words]
+
+    return " ".join(words)
+
+
+def numbers(title: str) -> FrozenSet[str]:
+    """
+    The numbers in a normalized title, so sequels aren't taken for the
+    original.
+    """
+
+    return frozenset(i for i in title.split() if i.isdecimal())
+
+
+def trigrams(title: str) -> Set[str]:
+    padded = f"  {title} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AliasRegistry:
+    """
+    Titles known to name the same work, such as a film's English and
+    original titles. Metadata providers record the titles they return on
+    each movie, see Movie.aliases, and MovieList.merge_similar collects those
+    of its movies into a registry, so movies can be matched even if their
+    titles look nothing alike.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parents: Dict[str, str] = {}
+
+    def find(self, title: str) -> str:
+        root = title
+        while self.parents.get(root, root) != root:
+            root = self.parents[root]
+        while title != root:
+            self.parents[title], title = root, self.parents[title]
+
+        return root
+
+    def add(self, titles: Iterable[str]):
+        """
+        Record that all of the given titles name the same work.
+        """
+
+        titles = [normalize(i) for i in titles if i]
+        titles = [i for i in titles if i]
+        with self.lock:
+            for i in titles[1:]:
+                self.parents[self.find(i)] = self.find(titles[0])
+
+    def canonical(self, title: str) -> str:
+        """
+        The same string for a normalized title and all of its aliases.
+        """
+
+        with self.lock:
+            return self.find(title)
+
+
+class Clusters:
+    """
+    Union-find over movies that also tracks each cluster's IDs per
+    provider, so two movies with different IDs from the same provider,
+    which can't be the same title, are never merged.
+    """
+
+    def __init__(self, ids: List[Dict[str, Set[str]]]):
+        self.parents = list(range(len(ids)))
+        self.ids = ids
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while item != root:
+            self.parents[item], item = root, self.parents[item]
+
+        return root
+
+    def conflict(self, a: int, b: int) -> bool:
+        ids_a, ids_b = self.ids[self.find(a)], self.ids[self.find(b)]
+        return any(ids_b.get(i) and not ids_b[i] & j
+                   for i, j in ids_a.items())
+
+    def union(self, a: int, b: int) -> bool:
+        """
+        Merge the clusters of a and b, unless their IDs conflict. Returns
+        whether they are now in the same cluster.
+        """
+
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return True
+        if self.conflict(a, b):
+            return False
+
+        if a > b:
+            a, b = b, a
+        self.parents[b] = a
+        for i, j in self.ids[b].items():
+            self.ids[a].setdefault(i, set()).update(j)
+
+        return True
+
+    def groups(self) -> List[List[int]]:
+        groups = defaultdict(list)
+        for i in range(len(self.parents)):
+            groups[self.find(i)].append(i)
+
+        return [i for i in groups.values() if len(i) > 1]
+
+
+def parse_ids(ids: str) -> Dict[str, Set[str]]:
+    """
+    The IDs in an ID cell, such as "IMDB: tt0000001", per provider.
+    """
+
+    result = {}
+    for i in ids.split("\n"):
+        if ": " in i:
+            provider, content_id = i.split(": ", 1)
+            result.setdefault(provider, set()).add(content_id.strip())
+
+    return result
+
+
+def find_duplicates(movies: List[Tuple[str, str, str]],
+                    threshold: float = None,
+                    aliases: AliasRegistry = None) -> List[List[int]]:
+    """
+    Find movies that are likely the same title. movies are tuples of the
+    title, release year and ID cell of each movie. Returns the groups of
+    indexes of movies to merge, groups with a single movie are left out.
+    aliases are the titles known to name the same work.
+
+    Titles that are the same once normalized, or aliases of each other,
+    match if their years are at most one apart or one of them is unknown.
+    Other titles match if they have the same numbers in them, their years
+    are at most one apart, and the Jaccard similarity of their trigrams is
+    at least threshold. Rather than comparing every pair, candidates are
+    looked up in an index of each title's rarest trigrams, which is enough
+    to find every pair above the threshold.
+    """
+
+    threshold = THRESHOLD if threshold is None else threshold
+    aliases = AliasRegistry() if aliases is None else aliases
+    clusters = Clusters([parse_ids(i[2]) for i in movies])
+
+    # Movies with the same normalized title and year are compared once.
+    buckets: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+    for k, (title, year, _) in enumerate(movies):
+        buckets[(normalize(title), parse_year(year))].append(k)
+
+    # A bucket may hold several titles that can't be merged, such as two
+    # films with the same name from the same year. Each movie joins the
+    # first of them it can.
+    representatives: List[List[int]] = []
+    for i in buckets.values():
+        found = [i[0]]
+        for j in i[1:]:
+            if not any(clusters.union(k, j) for k in found):
+                found.append(j)
+        representatives.append(found)
+
+    keys = list(buckets)
+    grams = [trigrams(i[0]) for i in keys]
+    sizes = [len(i) for i in grams]
+    key_numbers = [numbers(i[0]) for i in keys]
+    frequency = defaultdict(int)
+    for i in grams:
+        for j in i:
+            frequency[j] += 1
+
+    by_alias: Dict[str, List[int]] = defaultdict(list)
+    # Titles are indexed from smallest to largest, so the start of each list
+    # can be skipped once its titles are too small to match any more.
+    by_gram: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+    skipped: Dict[Tuple[int, str], int] = defaultdict(int)
+
+    def match(a: int, b: int):
+        for i in representatives[b]:
+            any(clusters.union(j, i) for j in representatives[a])
+
+    for k in sorted(range(len(keys)), key=lambda i: sizes[i]):
+        title, year = keys[k]
+
+        # Aliases and titles that are the same apart from punctuation.
+        alias = aliases.canonical(title)
+        for i in by_alias[alias]:
+            other = keys[i][1]
+            if year is None or other is None or abs(year - other) <= 1:
+                match(i, k)
+        by_alias[alias].append(k)
+
+        if year is None or not title:
+            continue
+
+        size = sizes[k]
+        smallest = threshold * size
+        ordered = sorted(grams[k], key=lambda i: (frequency[i], i))
+        prefix = ordered[:size - ceil(smallest) + 1]
+
+        candidates = set()
+        for i in prefix:
+            for j in [(year - 1, i), (year, i), (year + 1, i)]:
+                indexed = by_gram.get(j)
+                if not indexed:
+                    continue
+                start = skipped[j]
+                while start < len(indexed) and sizes[indexed[start]] < \
+                        smallest:
+                    start += 1
+                skipped[j] = start
+                candidates.update(indexed[start:])
+
+        for i in candidates:
+            if key_numbers[i] != key_numbers[k]:
+                continue
+            shared = len(grams[k] & grams[i])
+            if shared / (size + sizes[i] - shared) >= threshold:
+                match(i, k)
+
+        for i in prefix:
+            by_gram[(year, i)].append(k)
+
+    return clusters.groups()
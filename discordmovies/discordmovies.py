@@ -1,9 +1,13 @@
+import time
 from typing import Union
 from discordmovies.attributes import DiscordMoviesAttributes, Keys, \
-    DiscordAttributes
+    DiscordAttributes, RunOptions
 from typing import List
 from discordmovies.outputmodules.filehelper import FileHelper
 from discordmovies.inputmodules.input import Input
+from discordmovies.links import LinkRegistry
+from discordmovies.metrics import metrics
+from discordmovies.movies import Movie, MovieList
 
 
 class DiscordMovies:
@@ -34,18 +38,32 @@ class DiscordMovies:
                         tmdb_api_key: str = None,
                         remove_watched: bool = False,
                         reformat_sheet: bool = False,
-                        source: str = "discord"):
+                        source: str = "discord",
+                        options: RunOptions = None) -> FileHelper:
         """
         Extract all movies from a Discord channel and save them to a Google
-        Sheet or CSV.
+        Sheet or CSV. Returns the file that was written to. options are the
+        optional settings of the run, see RunOptions.
         """
 
-        file = FileHelper(filetype=filetype, attributes=self.attributes,
-                          sheet_id=sheet_id, reformat_sheet=reformat_sheet)
+        start = time.monotonic()
+        options = RunOptions() if options is None else options
+        changelog = options["changelog"]
+
+        with metrics.stage("open_file"):
+            file = FileHelper(filetype=filetype, attributes=self.attributes,
+                              sheet_id=sheet_id, reformat_sheet=reformat_sheet,
+                              shard=options["shard"])
 
         self.keys["tmdb"] = tmdb_api_key
 
-        current_content = file.get_values()
+        with metrics.stage("read_file"):
+            current_content = file.get_values()
+            archived_links = file.get_archived_links()
+        store = self.attributes.get("movie_store")
+        # What the file held before, for working out what changed.
+        previous = [list(i) for i in current_content] \
+            if changelog or store is not None else None
         # These next few if statements are checking the formatting of the
         # file. Basically if the header is not what's expected, the whole
         # sheet is overwritten.
@@ -56,6 +74,8 @@ class DiscordMovies:
                       "settings. Sheet will be completely rewritten.")
 
                 current_content = []
+                # Movies moved to other tabs are written again too.
+                archived_links = LinkRegistry()
                 overwrite = True
 
             else:
@@ -70,19 +90,244 @@ class DiscordMovies:
 
         self.attributes["remove_watched"] = remove_watched
         self.attributes["source"] = source
+        self.attributes["options"] = options
+        self.attributes["deadline"] = None \
+            if options["time_budget"] is None else \
+            start + options["time_budget"]
+
+        from discordmovies.inputmodules.metadata.checkpoint import \
+            checkpoints
+
+        checkpoint = checkpoints.get(name=self.attributes["name"],
+                                     output=filetype)
+        if options["fresh"]:
+            checkpoint.clear()
+        self.attributes["checkpoint"] = checkpoint
 
         inputs = Input(
             current_content=current_content,
             attributes=self.attributes,
             keys=self.keys,
             discord_attr=discord_attr,
+            archived_links=archived_links
         )
 
-        if file.exists():
-            if not self.attributes["movie_list"]:
-                inputs.setup_movie_list()
-            file.write_existing(overwrite=overwrite)
-        else:
-            if not self.attributes["movie_list"]:
-                inputs.setup_movie_list()
-            file.write_new()
+        exists = file.exists()
+
+        # Movies written while metadata is gathered.
+        flushed: List[Movie] = []
+
+        def flush(movies: List[Movie]):
+            from discordmovies.inputmodules.metadata.posters import \
+                validate_posters
+
+            batch = MovieList(
+                categories=self.attributes["movie_list"].get_categories(),
+                items=movies)
+            with metrics.stage("flush_movies"):
+                validate_posters(batch)
+                file.append_movies(movie_list=batch)
+            flushed.extend(movies)
+            # A run that stops after this doesn't need them anymore.
+            checkpoint.discard(j for i in movies
+                               for j in LinkRegistry.split(i["Link"]))
+
+        if not self.attributes["movie_list"]:
+            inputs.setup_movie_list(
+                flush=flush if (options["flush_every"] or
+                                options["flush_interval"] is not None)
+                and not overwrite else None)
+
+        # Only the movies that weren't flushed are left to write.
+        movie_list = self.attributes["movie_list"]
+        if flushed:
+            written = {id(i) for i in flushed}
+            self.attributes["movie_list"] = MovieList(
+                categories=movie_list.get_categories(),
+                items=[i for i in movie_list if id(i) not in written])
+
+        try:
+            with metrics.stage("write"):
+                if exists or flushed:
+                    file.write_existing(overwrite=overwrite)
+                else:
+                    file.write_new()
+        finally:
+            self.attributes["movie_list"] = movie_list
+
+        if changelog or store is not None:
+            from discordmovies.changelog import Changelog
+
+            log = Changelog(path=changelog, name=self.attributes["name"],
+                            output=filetype)
+            log.compare(previous=previous,
+                        movie_list=self.attributes["movie_list"],
+                        links=self.attributes["links"],
+                        watched_links=self.attributes["watched_links"],
+                        overwrite=overwrite)
+            if store is not None:
+                store.apply(log.events)
+            log.write()
+
+        # Metadata saved in case the run was interrupted isn't needed anymore.
+        checkpoint.discard(j for i in self.attributes["movie_list"]
+                           for j in LinkRegistry.split(i["Link"]))
+
+        if options["report"]:
+            with metrics.stage("report"):
+                file.write_report()
+
+        return file
+
+    def listen(self, filetype: str,
+               channel_id: Union[str, int],
+               watched_channel_id: Union[str, int] = None,
+               sheet_id: Union[str, int] = None,
+               max_messages: int = 100,
+               tmdb_api_key: str = None,
+               remove_watched: bool = False,
+               reformat_sheet: bool = False,
+               debounce: float = 0.0,
+               options: RunOptions = None):
+        """
+        Bring a Google Sheet or CSV up to date like discord_to_file, then keep
+        it up to date as messages are sent, edited and deleted, using the
+        Discord Gateway. Runs until interrupted.
+
+        Changes are written once no new ones have arrived for debounce
+        seconds.
+
+        With serve in options, queries about the movies are answered over
+        HTTP on that port of serve_host meanwhile, see serve.
+        """
+
+        from discordmovies.listener import Listener
+
+        listener = Listener(
+            attributes=self.attributes,
+            keys=self.keys,
+            discord_attr=DiscordAttributes(
+                channel_id=channel_id,
+                watched_channel_id=watched_channel_id,
+                max_messages=max_messages),
+            remove_watched=remove_watched,
+            debounce=debounce)
+
+        print("Listening for new messages.")
+        self.follow(listener=listener, filetype=filetype,
+                    channel_id=channel_id,
+                    watched_channel_id=watched_channel_id, sheet_id=sheet_id,
+                    max_messages=max_messages, tmdb_api_key=tmdb_api_key,
+                    remove_watched=remove_watched,
+                    reformat_sheet=reformat_sheet, options=options)
+
+    def watch(self, filetype: str,
+              channel_id: Union[str, int],
+              watched_channel_id: Union[str, int] = None,
+              sheet_id: Union[str, int] = None,
+              max_messages: int = 100,
+              tmdb_api_key: str = None,
+              remove_watched: bool = False,
+              reformat_sheet: bool = False,
+              interval: float = 300,
+              full_sync_every: int = 12,
+              debounce: float = 0.0,
+              options: RunOptions = None):
+        """
+        Bring a Google Sheet or CSV up to date like discord_to_file, then keep
+        checking Discord for new messages every interval seconds. Edits and
+        deletes are picked up every full_sync_every checks. Runs until
+        interrupted.
+
+        Unlike running discord_to_file repeatedly, the file, credentials and
+        connections are only set up once, and only new messages are fetched.
+
+        With serve in options, queries about the movies are answered over
+        HTTP on that port of serve_host meanwhile, see serve.
+        """
+
+        from discordmovies.watch import Watcher
+
+        watcher = Watcher(
+            attributes=self.attributes,
+            keys=self.keys,
+            discord_attr=DiscordAttributes(
+                channel_id=channel_id,
+                watched_channel_id=watched_channel_id,
+                max_messages=max_messages),
+            remove_watched=remove_watched,
+            interval=interval,
+            full_sync_every=full_sync_every,
+            debounce=debounce)
+
+        print(f"Checking for new messages every {interval} seconds.")
+        self.follow(listener=watcher, filetype=filetype,
+                    channel_id=channel_id,
+                    watched_channel_id=watched_channel_id, sheet_id=sheet_id,
+                    max_messages=max_messages, tmdb_api_key=tmdb_api_key,
+                    remove_watched=remove_watched,
+                    reformat_sheet=reformat_sheet, options=options)
+
+    def follow(self, listener: "Listener", filetype: str,
+               options: RunOptions = None, **kwargs):
+        """
+        Used by listen and watch. Starts the listener, catches up with
+        discord_to_file, then hands the file over to the listener, serving
+        queries about it if serve is set in options.
+        """
+
+        options = RunOptions() if options is None else options
+        self.keys["tmdb"] = kwargs.get("tmdb_api_key")
+        listener.connect()
+        server = None
+        try:
+            file = self.discord_to_file(filetype=filetype, options=options,
+                                        **kwargs)
+            if options["serve"] is not None:
+                server = self.serve(file=file, host=options["serve_host"],
+                                    port=options["serve"], background=True)
+                # The listener passes its changes on to it.
+                self.attributes["movie_store"] = server.store
+            listener.run(files=[file])
+        finally:
+            listener.stop()
+            if server is not None:
+                server.stop()
+
+    def serve(self, file: FileHelper, host: str = "127.0.0.1",
+              port: int = 8000, changelog: str = None,
+              background: bool = False) -> "QueryServer":
+        """
+        Answer queries about the movies of a file over HTTP, from a copy of
+        them kept in memory, see QueryServer. The file is read once, sharded
+        tabs included.
+
+        With changelog, the copy is kept up to date with the changes other
+        processes write to it for this file, see Changelog. With background,
+        the started server is returned, otherwise requests are served until
+        interrupted.
+        """
+
+        from discordmovies.queryserver import MovieStore, QueryServer
+
+        store = MovieStore()
+        if changelog:
+            # Followed from before the file is read, so no change is missed.
+            store.follow(changelog, name=self.attributes["name"],
+                         output=file.filetype)
+        with metrics.stage("load_store"):
+            store.load(file.get_values(force_recalc=True) +
+                       file.get_archived_values())
+
+        server = QueryServer(store=store, host=host, port=port)
+        print(f"Serving queries about {len(store.movie_list)} movies on "
+              f"{server.url}.")
+        if background:
+            return server.start()
+
+        try:
+            server.serve_forever()
+        finally:
+            server.stop()
+
+        return server
@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import List
+from discordmovies.metrics import metrics
+from discordmovies.ratelimit import RateLimiter
+
+
+class HttpClient:
+    """
+    Sends requests to a single provider, recording every call in the shared
+    metrics. All outbound HTTP traffic apart from Google Sheets goes through
+    here. Connections are kept alive between requests, which matters for long
+    running processes such as watch mode.
+
+    Each provider module keeps a single client, so connections and rate
+    limiters are shared by everything running in the process, including
+    concurrent jobs.
+    """
+
+    def __init__(self, provider: str, limiters: List[RateLimiter] = None):
+        self.provider = provider
+        # Every limit the provider enforces, for example one per second and
+        # one per minute.
+        self.limiters = limiters or []
+        self.session = None
+        self.lock = threading.Lock()
+
+    def get_session(self) -> "requests.Session":
+        # requests takes a while to import, so only do it once it's needed.
+        import requests
+
+        with self.lock:
+            if self.session is None:
+                # Leave room for a connection per worker when running jobs.
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4,
+                                                        pool_maxsize=32)
+                self.session = requests.Session()
+                self.session.mount("https://", adapter)
+                self.session.mount("http://", adapter)
+
+            return self.session
+
+    def request(self, method: str, endpoint: str, url: str,
+                **kwargs) -> "requests.Response":
+        """
+        Send a request. endpoint is a short name used to group calls in the
+        metrics, for example "find" or "channels.messages".
+        """
+
+        import requests
+
+        session = self.get_session()
+
+        if self.limiters:
+            wait = max(i.reserve() for i in self.limiters)
+            if wait:
+                self.sleep(wait)
+
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.record_request(self.provider, endpoint, "error",
+                                   time.perf_counter() - start)
+            raise
+
+        metrics.record_request(self.provider, endpoint, response.status_code,
+                               time.perf_counter() - start)
+
+        return response
+
+    def get(self, endpoint: str, url: str,
+            **kwargs) -> "requests.Response":
+        return self.request("GET", endpoint, url, **kwargs)
+
+    def post(self, endpoint: str, url: str,
+             **kwargs) -> "requests.Response":
+        return self.request("POST", endpoint, url, **kwargs)
+
+    def sleep(self, seconds: float):
+        """
+        Wait because of the provider's rate limits.
+        """
+
+        metrics.record_sleep(self.provider, seconds)
+        time.sleep(seconds)
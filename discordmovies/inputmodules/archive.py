@@ -0,0 +1,277 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+from discordmovies.inputmodules.discord import Discord
+
+# How much of an archive is read at a time.
+READ_SIZE = 1 << 20
+
+# JSONL archives are split into chunks of this size, each parsed by a
+# separate process. JSON archives can't be split, they are parsed a file per
+# process instead, such as the parts DiscordChatExporter's --partition writes.
+CHUNK_SIZE = 32 << 20
+
+# Archives smaller than this altogether are parsed in this process, starting
+# others takes longer than parsing them.
+PARALLEL_SIZE = 16 << 20
+
+EXTENSIONS = (".json", ".jsonl")
+
+
+class JsonStream:
+    """
+    Reads JSON values one at a time from a file, so the messages of an
+    archive can be gone through without loading all of it.
+    """
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.f.read(READ_SIZE)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self) -> str:
+        """
+        The next character that isn't whitespace, "" at the end of the file.
+        """
+
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                break
+            self.fill()
+
+        return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} in the "
+                             f"archive, found {character!r}.")
+        self.pos += 1
+
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # A number may continue in the part that hasn't been read yet.
+            if end == len(self.buffer) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+
+            return value
+
+    def items(self, streamed: str) -> Iterator[Tuple[str, object]]:
+        """
+        The keys of the object that starts here and their values. The value
+        of the key streamed, an array, is given as an iterator over its
+        elements instead, which has to be used up before the next key is
+        read.
+        """
+
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key == streamed:
+                yield key, self.elements()
+            else:
+                yield key, self.value()
+            if self.expect(",}") == "}":
+                return
+
+    def elements(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def message_channel(message: dict) -> str:
+    return str(message.get("channel_id") or message.get("channelId") or "")
+
+
+def read_header(path: str) -> dict:
+    """
+    What an archive says about itself before its messages, like
+    DiscordChatExporter's "guild" and "channel". For JSONL archives, which
+    hold a message per line, this is the first line if it isn't a message,
+    otherwise the channel is taken from the first message.
+    """
+
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            line = json.loads(f.readline() or "{}")
+            if "content" in line:
+                return {"channel": {"id": message_channel(line)}}
+            return line
+
+        header = {}
+        for key, value in JsonStream(f).items(streamed="messages"):
+            if key == "messages":
+                break
+            header[key] = value
+
+    return header
+
+
+def extract(messages: Iterator[dict]) -> List[Tuple[int, Dict[str, str]]]:
+    """
+    The links in archived messages, each with the ID of its message so they
+    can be ordered the way Discord returns them, newest first.
+    """
+
+    links = []
+    for i in messages:
+        if "content" not in i:
+            # A header.
+            continue
+        author = i.get("author") or {}
+        message = {"content": str(i["content"] or ""),
+                   "timestamp": i.get("timestamp"),
+                   "author": {"username": author.get("username") or
+                              author.get("name") or ""}}
+        number = str(i.get("id", ""))
+        number = int(number) if number.isdigit() else 0
+        links.extend((number, j) for j in Discord.extract_links([[message]]))
+
+    return links
+
+
+def parse_json(path: str) -> List[Tuple[int, Dict[str, str]]]:
+    with open(path, encoding="utf-8") as f:
+        for key, value in JsonStream(f).items(streamed="messages"):
+            if key == "messages":
+                return extract(value)
+
+    return []
+
+
+def parse_jsonl(path: str, start: int,
+                end: int) -> List[Tuple[int, Dict[str, str]]]:
+    """
+    The links of the lines of a JSONL archive that start between the byte
+    offsets start and end.
+    """
+
+    def lines() -> Iterator[dict]:
+        with open(path, "rb") as f:
+            if start:
+                # Finish the line before start, it belongs to the previous
+                # chunk.
+                f.seek(start - 1)
+                f.readline()
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield json.loads(line)
+
+    return extract(lines())
+
+
+class Archive:
+    """
+    Reads suggestions from exports of Discord channels instead of the
+    Discord API, for importing years of history at once. Exports are JSON
+    files as written by DiscordChatExporter, or JSONL files with a message
+    per line in the form either DiscordChatExporter or the Discord API use.
+    Neither is loaded into memory whole, and large exports are parsed by
+    several processes at once.
+
+    Archives are matched to channels by the channel ID in them. A channel
+    may be split over several files.
+    """
+
+    def __init__(self, paths: List[str], workers: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.channels: Dict[str, List[str]] = {}
+
+        for i in self.find_files(paths):
+            channel = str((read_header(i).get("channel") or {}).get("id", ""))
+            self.channels.setdefault(channel, []).append(i)
+
+    @staticmethod
+    def find_files(paths: List[str]) -> List[str]:
+        files = []
+        for i in paths:
+            if os.path.isdir(i):
+                files += sorted(os.path.join(i, j) for j in os.listdir(i)
+                                if j.endswith(EXTENSIONS))
+            else:
+                files.append(i)
+
+        return files
+
+    def tasks(self, files: List[str]) -> List[tuple]:
+        """
+        The parts the files of a channel are parsed in, as functions and
+        their arguments.
+        """
+
+        tasks = []
+        for i in files:
+            if i.endswith(".jsonl"):
+                size = os.path.getsize(i)
+                tasks += [(parse_jsonl, i, j, min(j + CHUNK_SIZE, size))
+                          for j in range(0, size, CHUNK_SIZE)]
+            else:
+                tasks.append((parse_json, i))
+
+        return tasks
+
+    def get_links(self, channel_id: str) -> List[Dict[str, str]]:
+        """
+        Get all links from the archives of a Discord channel, newest first
+        like Discord.get_links. Unlike it, this isn't limited to
+        max_messages, the whole archive is read.
+        """
+
+        files = self.channels.get(str(channel_id))
+        if not files:
+            raise ValueError(f"None of the archives are of channel "
+                             f"{channel_id}. They have the channels "
+                             f"{', '.join(sorted(self.channels))}.")
+
+        tasks = self.tasks(files)
+        size = sum(os.path.getsize(i) for i in files)
+        if len(tasks) == 1 or size < PARALLEL_SIZE or self.workers == 1:
+            results = [i[0](*i[1:]) for i in tasks]
+        else:
+            with ProcessPoolExecutor(
+                    max_workers=min(self.workers, len(tasks))) as executor:
+                futures = [executor.submit(*i) for i in tasks]
+                results = [i.result() for i in futures]
+
+        links = [j for i in results for j in i]
+        links.sort(key=lambda i: i[0], reverse=True)
+
+        return [i[1] for i in links]
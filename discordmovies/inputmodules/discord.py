@@ -1,8 +1,18 @@
-import requests
 import json
+import os
 from typing import Union, List, Dict
 import re
 from discordmovies.exceptions import DiscordPermissionError
+from discordmovies.httpclient import HttpClient
+from discordmovies.ratelimit import RateLimiter
+
+# The base URL can be overridden to point at a local stand-in server, see
+# benchmarks/stubserver.py.
+DISCORD_API_URL = os.environ.get("DISCORD_API_URL",
+                                 "https://discord.com/api/v9")
+
+# Shared by every Discord instance, bots may send 50 requests a second.
+client = HttpClient("discord", limiters=[RateLimiter(rate=50, burst=50)])
 
 
 class Discord:
@@ -12,6 +22,7 @@ class Discord:
 
     def __init__(self, auth: str, bot: bool, max_messages: int = 100):
         self.bot = bot
+        self.client = client
 
         if bot:
             self.headers = {
@@ -21,7 +32,9 @@ class Discord:
             self.headers = {
                 "authorization": auth,
             }
-        self.check_token()
+        # The token isn't checked up front, that would cost a request before
+        # any work is done. An invalid token is caught by check_status on the
+        # first real request instead.
         self.max_messages = max_messages
 
     def check_token(self) -> bool:
@@ -29,8 +42,17 @@ class Discord:
         Check if a discord token is valid.
         """
 
-        r = requests.get(f"https://discordapp.com/api/v9/users/@me",
-                         headers=self.headers)
+        r = self.client.get("users.me", f"{DISCORD_API_URL}/users/@me",
+                            headers=self.headers)
+        self.check_status(r)
+        return True
+
+    @staticmethod
+    def check_status(r) -> bool:
+        """
+        Raise an error if Discord rejected the token used for a request.
+        """
+
         if r.status_code == 401:
             raise ValueError("The discord token appears to be invalid. If you "
                              "are using a user token make sure --no-bot "
@@ -50,15 +72,18 @@ class Discord:
         # of them we need to send a couple requests.
         while no_messages < self.max_messages:
             if before:
-                r = requests.get(f"https://discord.com/api/v9/channels/"
-                                 f"{channel_id}/messages?limit=100&before"
-                                 f"={before}",
-                                 headers=self.headers)
+                r = self.client.get("channels.messages",
+                                    f"{DISCORD_API_URL}/channels/"
+                                    f"{channel_id}/messages?limit=100&before"
+                                    f"={before}",
+                                    headers=self.headers)
             else:
-                r = requests.get(f"https://discord.com/api/v9/channels/"
-                                 f"{channel_id}/messages?limit=100",
-                                 headers=self.headers)
+                r = self.client.get("channels.messages",
+                                    f"{DISCORD_API_URL}/channels/"
+                                    f"{channel_id}/messages?limit=100",
+                                    headers=self.headers)
 
+            self.check_status(r)
             no_messages += 100
             result = json.loads(r.content)
 
@@ -88,6 +113,42 @@ class Discord:
 
         return messages
 
+    def get_new_messages(self, channel_id: Union[int, str],
+                         after: str) -> List[List[dict]]:
+        """
+        Get all messages sent to a Discord channel after the message with the
+        given ID, in the same form as get_messages. Unlike get_messages this
+        isn't limited by max_messages.
+        """
+
+        messages = []
+        while True:
+            r = self.client.get("channels.messages",
+                                f"{DISCORD_API_URL}/channels/{channel_id}"
+                                f"/messages?limit=100&after={after}",
+                                headers=self.headers)
+
+            self.check_status(r)
+            result = json.loads(r.content)
+            if isinstance(result, dict):
+                if result.get("message") == "Missing Access":
+                    raise DiscordPermissionError("Bot seems to be missing "
+                                                 "permissions to read the "
+                                                 "channel!")
+                raise KeyError(result)
+
+            if result:
+                messages.append(result)
+                # Pages are still newest first, so the next page starts after
+                # the first message.
+                after = result[0]["id"]
+            if len(result) < 100:
+                break
+
+        self.check_integrity(messages=messages)
+
+        return messages
+
     def get_links(self, channel_id: str) -> List[Dict[str, str]]:
         """
         Get all links from a Discord channel.
@@ -0,0 +1,229 @@
+import json
+import random
+import sys
+import threading
+import time
+import traceback
+from typing import Callable
+from discordmovies.inputmodules.discord import Discord, DISCORD_API_URL, \
+    client
+from discordmovies.inputmodules.websocket import WebSocket, WebSocketClosed
+
+# Gateway intents needed to receive messages from server channels, along with
+# their content. Message content is a privileged intent and has to be enabled
+# for the bot in the Discord developer portal.
+GUILD_MESSAGES = 1 << 9
+MESSAGE_CONTENT = 1 << 15
+
+# Close codes after which reconnecting won't help, the token or intents have
+# to be fixed first.
+FATAL_CLOSE_CODES = {
+    4004: "The discord token appears to be invalid.",
+    4013: "The gateway intents are invalid.",
+    4014: "The bot is not allowed the Message Content intent, enable it in "
+          "the Discord developer portal."
+}
+
+# Close codes after which the session can't be resumed.
+SESSION_CLOSE_CODES = [4007, 4009]
+
+
+class Gateway:
+    """
+    Keeps a connection to the Discord Gateway and passes every event it
+    receives to a handler, called with the event name and its data. Takes care
+    of heartbeats, and reconnects and resumes the session when the connection
+    drops so that no events are missed. Exceptions raised by the handler are
+    printed and the connection is kept open.
+    """
+
+    def __init__(self, auth: str, bot: bool,
+                 handler: Callable[[str, dict], None]):
+        self.auth = auth
+        self.bot = bot
+        self.handler = handler
+        self.headers = Discord(auth=auth, bot=bot).headers
+        self.client = client
+
+        self.socket = None
+        self.session_id = None
+        self.sequence = None
+        self.resume_url = None
+        self.acknowledged = True
+        self.running = threading.Event()
+        self.ready = threading.Event()
+
+    def get_url(self) -> str:
+        """
+        Ask Discord which URL the gateway should be reached at.
+        """
+
+        if self.bot:
+            r = self.client.get("gateway.bot",
+                                f"{DISCORD_API_URL}/gateway/bot",
+                                headers=self.headers)
+        else:
+            r = self.client.get("gateway", f"{DISCORD_API_URL}/gateway",
+                                headers=self.headers)
+        Discord.check_status(r)
+
+        return json.loads(r.content)["url"]
+
+    def run(self):
+        """
+        Connect and handle events until stop() is called, or until Discord
+        refuses the connection for good.
+        """
+
+        self.running.set()
+        url = None
+        delay = 1
+
+        while self.running.is_set():
+            try:
+                if url is None:
+                    url = self.get_url()
+                self.connect(self.resume_url or url)
+                delay = 1
+                self.receive()
+            except (OSError, WebSocketClosed) as e:
+                if self.running.is_set():
+                    print(f"Lost connection to the Discord gateway ({e}).")
+            finally:
+                self.disconnect()
+
+            if self.running.is_set():
+                # Spread reconnects out a little, and back off if Discord
+                # keeps turning us away.
+                time.sleep(delay * random.uniform(0.5, 1))
+                delay = min(delay * 2, 60)
+
+    def stop(self):
+        self.running.clear()
+        self.disconnect(code=1000)
+
+    def connect(self, url: str):
+        """
+        Open the websocket, start heartbeating and either identify or resume
+        the previous session.
+        """
+
+        self.socket = WebSocket().connect(f"{url}?v=9&encoding=json")
+
+        hello = self.socket.recv()
+        if hello is None:
+            raise WebSocketClosed("Connection closed before the gateway said "
+                                  "hello.")
+        interval = json.loads(hello)["d"]["heartbeat_interval"] / 1000
+        self.acknowledged = True
+        threading.Thread(target=self.heartbeat, args=(self.socket, interval),
+                         daemon=True).start()
+
+        if self.session_id:
+            self.send(6, {"token": self.auth, "session_id": self.session_id,
+                          "seq": self.sequence})
+        else:
+            self.send(2, {"token": self.auth,
+                          "intents": GUILD_MESSAGES | MESSAGE_CONTENT,
+                          "properties": {"os": sys.platform,
+                                         "browser": "discordmovies",
+                                         "device": "discordmovies"}})
+
+    def disconnect(self, code: int = 4000):
+        """
+        Close the current connection. Any code other than 1000 keeps the
+        session alive on Discord's end so that it can be resumed.
+        """
+
+        if self.socket is not None:
+            self.socket.close(code)
+
+    def send(self, op: int, data):
+        self.socket.send(json.dumps({"op": op, "d": data}))
+
+    def heartbeat(self, socket: WebSocket, interval: float):
+        """
+        Send heartbeats until the connection closes. If Discord didn't
+        acknowledge the previous heartbeat the connection is assumed dead and
+        closed, which makes run() reconnect.
+        """
+
+        # The first heartbeat is jittered so that clients don't all send them
+        # at once after an outage.
+        wait = interval * random.random()
+        while not socket.closed:
+            time.sleep(wait)
+            wait = interval
+            if socket.closed:
+                break
+            if not self.acknowledged:
+                socket.close(4000)
+                break
+
+            self.acknowledged = False
+            try:
+                socket.send(json.dumps({"op": 1, "d": self.sequence}))
+            except (OSError, WebSocketClosed):
+                break
+
+    def receive(self):
+        """
+        Handle gateway messages until the connection closes or Discord asks
+        us to reconnect.
+        """
+
+        while self.running.is_set():
+            message = self.socket.recv()
+            if message is None:
+                code = self.socket.close_code
+                if code in FATAL_CLOSE_CODES:
+                    self.running.clear()
+                    raise ValueError(f"Discord closed the gateway "
+                                     f"connection: "
+                                     f"{FATAL_CLOSE_CODES[code]}")
+                if code in SESSION_CLOSE_CODES:
+                    self.reset_session()
+                return
+
+            payload = json.loads(message)
+            if payload.get("s") is not None:
+                self.sequence = payload["s"]
+
+            op = payload["op"]
+            if op == 0:
+                self.dispatch(payload["t"], payload["d"])
+            elif op == 1:
+                self.send(1, self.sequence)
+            elif op == 7:
+                # Discord wants us to reconnect and resume.
+                return
+            elif op == 9:
+                # The session is no longer valid, d says whether it can still
+                # be resumed.
+                if not payload["d"]:
+                    self.reset_session()
+                time.sleep(random.uniform(1, 5))
+                return
+            elif op == 11:
+                self.acknowledged = True
+
+    def reset_session(self):
+        self.session_id = None
+        self.sequence = None
+        self.resume_url = None
+
+    def dispatch(self, event: str, data: dict):
+        if event == "READY":
+            self.session_id = data["session_id"]
+            self.resume_url = data.get("resume_gateway_url")
+            self.ready.set()
+        elif event == "RESUMED":
+            self.ready.set()
+
+        # A handler failing on one event shouldn't drop the connection and
+        # the events after it.
+        try:
+            self.handler(event, data)
+        except Exception:
+            print(f"Handling the {event} gateway event failed:")
+            traceback.print_exc()
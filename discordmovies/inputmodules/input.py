@@ -1,7 +1,9 @@
 from discordmovies.attributes import DiscordMoviesAttributes
-from typing import List, Dict
-from discordmovies.movies import Movie
+from typing import Callable, List, Dict
+from discordmovies.links import LinkRegistry
+from discordmovies.movies import Movie, MovieList
 from discordmovies.attributes import Keys, DiscordAttributes
+from discordmovies.metrics import metrics
 
 
 class Input:
@@ -13,7 +15,8 @@ class Input:
     def __init__(self, attributes: DiscordMoviesAttributes,
                  keys: Keys,
                  current_content: List[List[str]] = None,
-                 discord_attr: DiscordAttributes = None):
+                 discord_attr: DiscordAttributes = None,
+                 archived_links: LinkRegistry = None):
         self.source_type = attributes["source"]
 
         if self.source_type == "discord":
@@ -21,12 +24,17 @@ class Input:
 
             self.source = Discord(auth=keys["discord"], bot=attributes["bot"],
                                   max_messages=discord_attr["max_messages"])
+        elif self.source_type == "archive":
+            from discordmovies.inputmodules.archive import Archive
+
+            self.source = Archive(paths=attributes["options"]["archive"])
         else:
             raise AttributeError("Source provided is not supported")
 
         self.messages = None
         self.attributes = attributes
         self.current_content = current_content
+        self.archived_links = archived_links
         self.tmdb_api_key = keys["tmdb"]
         self.watched_channel_id = discord_attr["watched_channel_id"]
         self.remove_watched = attributes["remove_watched"]
@@ -39,8 +47,10 @@ class Input:
         """
 
         if recalc or not self.messages:
+            metrics.record_cache("links", hit=False)
             self.messages = self.source.get_links(channel_id=channel_id)
             return self.messages
+        metrics.record_cache("links", hit=True)
         return self.messages
 
     def fill_movie_list(self, channel_id: str):
@@ -49,63 +59,126 @@ class Input:
 
     def fill_links(self, channel_id: str):
         links = self.get_links(channel_id=channel_id)
-        self.attributes["links"] = [
-            i["Link"] for i in links
-        ]
+        self.attributes["links"] = LinkRegistry(i["Link"] for i in links)
 
     def remove_already_present(self):
         """
         Remove values from the movie list that are already present in
-        current_content.
+        current_content, or among archived_links.
         """
         link_index = self.attributes["movie_list"].get_cat_indexes()["Link"]
-        current_links = [i[link_index] for i in self.current_content if i != []]
+        current_links = LinkRegistry(self.archived_links)
+        for i in self.current_content or []:
+            if len(i) > link_index:
+                current_links.extend(LinkRegistry.split(i[link_index]))
 
-        self.attributes["movie_list"].remove_by_attribute_value(
-            attribute="Link",
-            value=current_links)
+        self.attributes["movie_list"].remove_links(links=current_links)
 
     def mark_watched(self):
         links = self.get_links(channel_id=self.watched_channel_id, recalc=True)
 
-        self.attributes["watched_links"] = [
-            i["Link"] for i in links
-        ]
+        self.attributes["watched_links"] = LinkRegistry(
+            i["Link"] for i in links)
         self.attributes["movie_list"].mark_watched(
             watched_links=self.attributes["watched_links"]
         )
-        self.remove_watched_links()
+        # Otherwise watched movies stay in the file and are only marked.
+        if self.remove_watched:
+            self.remove_watched_links()
 
     def remove_watched_links(self) -> None:
-        [self.attributes["links"].remove(i) for i in
-         self.attributes["watched_links"]
-         if i in self.attributes["links"]]
+        self.attributes["links"] = self.attributes["links"].difference(
+            self.attributes["watched_links"])
 
-    def setup_movie_list(self):
+    def setup_movie_list(self, flush: Callable[[List[Movie]], None] = None):
         """
         Get values from a source that are not already present in
-        current_content.
+        current_content. With flush, movies are handed to it in batches
+        while metadata is gathered, see MovieList.fill_all_metadata.
+
+        Movies with the same title are merged within each batch before it's
+        handed to flush. Movies that were flushed are left out of the merge
+        of the rest, so no link is merged into a movie that was already
+        written.
         """
 
-        self.fill_movie_list(self.movie_channel_id)
-        self.fill_links(self.movie_channel_id)
+        with metrics.stage("fill_movie_list"):
+            self.fill_movie_list(self.movie_channel_id)
+        with metrics.stage("fill_links"):
+            self.fill_links(self.movie_channel_id)
         # There may be links sent twice, these should be combined.
-        self.attributes["movie_list"].merge_duplicates(ignore=["Link"],
-                                                       attribute="Link")
+        with metrics.stage("merge_duplicates"):
+            self.attributes["movie_list"].merge_duplicates(ignore=["Link"],
+                                                           attribute="Link")
 
         if self.watched_channel_id is not None:
-            self.mark_watched()
+            with metrics.stage("mark_watched"):
+                self.mark_watched()
 
         if self.remove_watched:
-            self.attributes["movie_list"].remove_by_attribute_value(
-                attribute="Watched",
-                value="True"
-            )
-
-        if self.current_content:
-            self.remove_already_present()
-
-        self.attributes["movie_list"].fill_all_metadata(
-            tmdb_api_key=self.tmdb_api_key)
+            with metrics.stage("remove_watched"):
+                self.attributes["movie_list"].remove_by_attribute_value(
+                    attribute="Watched",
+                    value="True"
+                )
+
+        if self.current_content or self.archived_links:
+            with metrics.stage("remove_already_present"):
+                self.remove_already_present()
+
+        # Movies handed to flush, and those merged into them, by id.
+        flushed = set()
+        merged = set()
+
+        def flush_batch(movies: List[Movie]):
+            batch = MovieList(
+                categories=self.attributes["movie_list"].get_categories(),
+                items=movies)
+            self.merge_titles(batch)
+            flushed.update(id(i) for i in batch)
+            merged.update(id(i) for i in movies if id(i) not in flushed)
+            flush(list(batch))
+
+        options = self.attributes["options"]
+        with metrics.stage("fill_all_metadata"):
+            self.attributes["movie_list"].fill_all_metadata(
+                tmdb_api_key=self.tmdb_api_key,
+                deadline=self.attributes.get("deadline"),
+                checkpoint=self.attributes.get("checkpoint"),
+                flush=flush_batch if flush is not None else None,
+                flush_every=options["flush_every"],
+                flush_interval=options["flush_interval"])
+
+        with metrics.stage("validate_posters"):
+            from discordmovies.inputmodules.metadata.posters import \
+                validate_posters
+
+            validate_posters(self.attributes["movie_list"])
+
+        # The same title may have been linked several times, or from
+        # several sites when merge_similar is set.
+        with metrics.stage("merge_duplicates"):
+            movie_list = self.attributes["movie_list"]
+            if not flushed:
+                self.merge_titles(movie_list)
+            else:
+                rest = MovieList(
+                    categories=movie_list.get_categories(),
+                    items=[i for i in movie_list if id(i) not in flushed and
+                           id(i) not in merged])
+                self.merge_titles(rest)
+                self.attributes["movie_list"] = MovieList(
+                    categories=movie_list.get_categories(),
+                    items=[i for i in movie_list if id(i) in flushed] +
+                    list(rest))
+
+    def merge_titles(self, movie_list: MovieList):
+        """
+        Merge the movies of a list that have the same title, or similar ones
+        when merge_similar is set.
+        """
 
-        self.attributes["movie_list"].merge_duplicates()
+        if self.attributes["options"]["merge_similar"]:
+            movie_list.merge_similar()
+        else:
+            movie_list.merge_duplicates()
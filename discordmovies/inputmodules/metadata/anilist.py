@@ -1,7 +1,15 @@
-import requests
 import json
+import os
 from .mal import MAL
+from discordmovies.httpclient import HttpClient
 from discordmovies.movies import Movie
+from discordmovies.ratelimit import RateLimiter
+
+ANILIST_API_URL = os.environ.get("ANILIST_API_URL",
+                                 "https://graphql.anilist.co")
+
+# AniList allows 90 requests a minute.
+client = HttpClient("anilist", limiters=[RateLimiter(rate=1.5, burst=90)])
 
 
 class Anilist:
@@ -31,11 +39,11 @@ class Anilist:
             'id': content_id
         }
 
-        url = 'https://graphql.anilist.co'
+        url = ANILIST_API_URL
 
         # Make the HTTP Api request
-        response = requests.post(url,
-                                 json={'query': query, 'variables': variables})
+        response = client.post("graphql", url,
+                               json={'query': query, 'variables': variables})
 
         if response.status_code != 200:
             # More work should be done here for better error handling.
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+from discordmovies.exceptions import MovieIdentityError
+from discordmovies.metrics import metrics
+from discordmovies.movies import Movie
+
+# The attributes filled in by the metadata providers.
+METADATA_CATEGORIES = ["Poster", "Title", "Genres", "Runtime", "Trailer",
+                       "User Score", "ID", "Release Date"]
+
+
+class MetadataCache:
+    """
+    Remembers the metadata found for each title for as long as the process
+    runs, so a title suggested in several channels is only looked up once.
+    If a title is requested while another thread is already looking it up,
+    the second thread waits for that result instead of sending its own
+    requests.
+
+    Titles that couldn't be identified are remembered too. Other errors,
+    such as connection problems, are not, so the next request tries again.
+    The aliases found for a title are remembered along with its metadata.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[Hashable, Future] = {}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def fill(self, key: Hashable, movie: Movie,
+             fetch: Callable[[Movie], None]):
+        """
+        Fill the metadata of movie. fetch is called with a movie that has all
+        categories if the title with the given key hasn't been looked up
+        yet.
+        """
+
+        with self.lock:
+            future = self.entries.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.entries[key] = future
+
+        metrics.record_cache("metadata", hit=not owner)
+
+        if owner:
+            # Movies may leave out categories, so fetch into one that has
+            # them all in case the next job asking for this title wants them.
+            complete = Movie(values={"Link": movie["Link"]})
+            try:
+                fetch(complete)
+            except MovieIdentityError as e:
+                future.set_exception(e)
+            except BaseException as e:
+                with self.lock:
+                    del self.entries[key]
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(({i: complete[i] for i in
+                                    METADATA_CATEGORIES},
+                                   list(complete.aliases)))
+
+        values, aliases = future.result()
+        for i, j in values.items():
+            movie[i] = j
+        movie.aliases.extend(aliases)
+
+
+# A single instance shared by the whole package.
+cache = MetadataCache()
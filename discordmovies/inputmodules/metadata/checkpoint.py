@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Union
+from discordmovies.metrics import metrics
+from discordmovies.movies import Movie
+from discordmovies.utils import Utils
+from .cache import METADATA_CATEGORIES
+
+# Metadata found while gathering it is saved here until the movies are
+# written, so a run that's interrupted doesn't have to look them up again.
+# Each file has its own, see checkpoint_path.
+CHECKPOINT_PATH = ".discordmovies-metadata.json"
+
+# How often progress is saved while gathering metadata, in seconds.
+SAVE_INTERVAL = 5
+
+# Entries that are never written, because their movies were removed from
+# Discord in the meantime for example, are dropped after a week.
+CHECKPOINT_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def checkpoint_path(name: str, output: str) -> str:
+    """
+    Where the checkpoint of the file named name, written as output, is kept.
+    """
+
+    root, extension = os.path.splitext(CHECKPOINT_PATH)
+    name = re.sub(r"[^\w.-]+", "_", name)
+    return f"{root}-{output}-{name}{extension}"
+
+
+class MetadataCheckpoint:
+    """
+    The metadata of movies that have been looked up but not written to a
+    file yet, kept in a file by link. Movies that couldn't be identified are
+    remembered too. See MovieList.fill_all_metadata.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH,
+                 save_interval: float = SAVE_INTERVAL,
+                 max_age: float = CHECKPOINT_MAX_AGE):
+        self.path = path
+        self.save_interval = save_interval
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # Links to when they were looked up and their metadata, None if they
+        # couldn't be identified.
+        self.entries: Dict[str, list] = None
+        self.changed = False
+        self.saved = time.monotonic()
+
+    def load(self):
+        if self.entries is not None:
+            return
+
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, link: str) -> Union[Dict[str, str], None, bool]:
+        """
+        The metadata saved for a link, None if it couldn't be identified and
+        False if there's nothing saved.
+        """
+
+        with self.lock:
+            self.load()
+            entry = self.entries.get(link)
+
+        metrics.record_cache("checkpoint", hit=entry is not None)
+
+        return False if entry is None else entry[1]
+
+    def set(self, link: str, movie: Union[Movie, None]):
+        """
+        Save the metadata of a movie, or None if it couldn't be identified.
+        Progress is written to the file every save_interval seconds.
+        """
+
+        with self.lock:
+            self.load()
+            self.entries[link] = [time.time(), None if movie is None else {
+                i: movie.info[i] for i in METADATA_CATEGORIES
+                if i in movie.info}]
+            self.changed = True
+
+        if time.monotonic() - self.saved >= self.save_interval:
+            self.save()
+
+    def discard(self, links: Iterable[str]):
+        """
+        Forget links once their movies have been written.
+        """
+
+        with self.lock:
+            self.load()
+            for i in links:
+                if self.entries.pop(i, None) is not None:
+                    self.changed = True
+
+        self.save()
+
+    def clear(self):
+        """
+        Forget everything saved, so the movies are looked up again.
+        """
+
+        with self.lock:
+            self.entries = {}
+            self.changed = True
+
+        self.save()
+
+    def save(self):
+        with self.lock:
+            self.saved = time.monotonic()
+            if not self.changed:
+                return
+            self.changed = False
+
+            oldest = time.time() - self.max_age
+            self.entries = {i: j for i, j in self.entries.items()
+                            if j[0] >= oldest}
+            if self.entries:
+                Utils.atomic_write(self.path, json.dumps(self.entries))
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class MetadataCheckpoints:
+    """
+    The checkpoints of the files being written, one per file, so jobs
+    writing different files at the same time don't share one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkpoints: Dict[str, MetadataCheckpoint] = {}
+
+    def get(self, name: str, output: str) -> MetadataCheckpoint:
+        """
+        The checkpoint of the file named name, written as output.
+        """
+
+        path = checkpoint_path(name, output)
+        with self.lock:
+            if path not in self.checkpoints:
+                self.checkpoints[path] = MetadataCheckpoint(path=path)
+            return self.checkpoints[path]
+
+
+# A single instance shared by the whole package.
+checkpoints = MetadataCheckpoints()
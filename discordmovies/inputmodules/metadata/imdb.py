@@ -1,24 +1,38 @@
-import requests
 from discordmovies.exceptions import MovieIdentityError
+from discordmovies.httpclient import HttpClient
+from discordmovies.metrics import metrics
+from discordmovies.ratelimit import RateLimiter
+from .posters import pick_size
 import json
+import os
+import threading
 from discordmovies.movies import Movie
 
+TMDB_API_URL = os.environ.get("TMDB_API_URL", "https://api.themoviedb.org/3")
+
+# TMDB allows around 50 requests a second.
+client = HttpClient("tmdb", limiters=[RateLimiter(rate=40, burst=40)])
+
+# The image configuration hardly ever changes, so it's only fetched once per
+# process.
+configuration = None
+configuration_lock = threading.Lock()
+
 
 class IMDB:
     """
     IMDB class that can get metadata for a film.
     """
     @staticmethod
-    def get_imdb(content_id: int, omdb_api_key: str, movie: Movie):
+    def find(content_id: str, omdb_api_key: str) -> dict:
         """
-        Gets metadata from tmdb given an imdb link. Could
-        technically work with a lot more than just imdb since it uses
-        omdb.
+        Find the TMDB movie with an IMDB ID. Returns TMDB's summary of it,
+        which has its TMDB ID and poster.
         """
 
-        find_r = requests.get(f"https://api.themoviedb.org/3/find"
-                              f"/{content_id}?api_key={omdb_api_key}&"
-                              f"language=en-US&external_source=imdb_id")
+        find_r = client.get("find", f"{TMDB_API_URL}/find"
+                            f"/{content_id}?api_key={omdb_api_key}&"
+                            f"language=en-US&external_source=imdb_id")
 
         if find_r.status_code == 404:
             raise MovieIdentityError(f"Could not find IMDB movie with "
@@ -32,16 +46,54 @@ class IMDB:
                                   f"reason: {find_r.reason} \n"
                                   f"url: {find_r.url}")
 
-        omdb_id = json.loads(find_r.content)["movie_results"][0]["id"]
+        results = json.loads(find_r.content)["movie_results"]
+        if not results:
+            raise MovieIdentityError(f"Could not find IMDB movie with "
+                                     f"ID: {content_id}")
+
+        return results[0]
 
-        lookup_r = requests.get(f"https://api.themoviedb.org/3/movie"
-                                f"/{omdb_id}?api_key={omdb_api_key}")
+    @staticmethod
+    def poster_url(poster_path: str, omdb_api_key: str) -> str:
+        images = IMDB.get_configuration(omdb_api_key=omdb_api_key)["images"]
+        image_base = images["secure_base_url"]
+        image_size = pick_size(images["poster_sizes"])
 
-        config_r = requests.get(f"https://api.themoviedb.org/3/configuration"
-                                f"?api_key={omdb_api_key}")
+        return image_base + image_size + poster_path
 
-        video_r = requests.get(f"https://api.themoviedb.org/3/movie/{omdb_id}"
-                               f"/videos?api_key={omdb_api_key}")
+    @staticmethod
+    def get_poster(content_id: str, omdb_api_key: str, movie: Movie):
+        """
+        Only fill in the poster, which takes a single request rather than
+        the three get_imdb makes. Used when the rest comes from elsewhere,
+        see offline.OfflineDatasets.
+        """
+
+        poster_path = IMDB.find(content_id, omdb_api_key)["poster_path"]
+        movie["Poster"] = IMDB.poster_url(poster_path, omdb_api_key) \
+            if poster_path else ""
+
+    @staticmethod
+    def get_imdb(content_id: int, omdb_api_key: str, movie: Movie):
+        """
+        Gets metadata from tmdb given an imdb link. Could
+        technically work with a lot more than just imdb since it uses
+        omdb.
+        """
+
+        omdb_id = IMDB.find(content_id, omdb_api_key)["id"]
+
+        lookup_r = client.get("movie", f"{TMDB_API_URL}/movie"
+                              f"/{omdb_id}?api_key={omdb_api_key}")
+
+        video_r = client.get("videos", f"{TMDB_API_URL}/movie/{omdb_id}"
+                             f"/videos?api_key={omdb_api_key}")
+
+        for i in [lookup_r, video_r]:
+            if i.status_code != 200:
+                raise ConnectionError("Could not get TMDB movie "
+                                      f"{omdb_id}, status code: "
+                                      f"{i.status_code}")
 
         videos = json.loads(video_r.content)["results"]
         video = None
@@ -51,8 +103,6 @@ class IMDB:
                 break
 
         content = json.loads(lookup_r.content)
-        image_base = json.loads(config_r.content)["images"]["secure_base_url"]
-        image_size = json.loads(config_r.content)["images"]["poster_sizes"][4]
 
         genres = [i["name"] for i in content["genres"]]
         if len(genres) > 1:
@@ -60,8 +110,10 @@ class IMDB:
         else:
             genres = genres[0]
 
-        movie["Poster"] = image_base + image_size + content["poster_"
-                                                            "path"]
+        movie.aliases.extend([content["title"], content.get("original_title")])
+
+        movie["Poster"] = IMDB.poster_url(content["poster_path"],
+                                          omdb_api_key)
         movie["Title"] = str(content["title"])
         movie["Genres"] = str(genres)
         movie["Runtime"] = str(content["runtime"])
@@ -69,3 +121,26 @@ class IMDB:
         movie["User Score"] = str(content["vote_average"])
         movie["ID"] = "IMDB: " + str(content_id)
         movie["Release Date"] = str(content["release_date"]).split("-")[0]
+
+    @staticmethod
+    def get_configuration(omdb_api_key: str) -> dict:
+        """
+        Get the TMDB API configuration, which says where images are hosted.
+        """
+
+        global configuration
+
+        with configuration_lock:
+            metrics.record_cache("tmdb_configuration",
+                                 hit=configuration is not None)
+            if configuration is None:
+                config_r = client.get("configuration",
+                                      f"{TMDB_API_URL}/configuration"
+                                      f"?api_key={omdb_api_key}")
+                if config_r.status_code != 200:
+                    raise ConnectionError("Could not get the TMDB "
+                                          "configuration, status code: "
+                                          f"{config_r.status_code}")
+                configuration = json.loads(config_r.content)
+
+            return configuration
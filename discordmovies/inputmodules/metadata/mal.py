@@ -1,7 +1,15 @@
-import requests
 import json
+import os
 from discordmovies.exceptions import MovieIdentityError
+from discordmovies.httpclient import HttpClient
 from discordmovies.movies import Movie
+from discordmovies.ratelimit import RateLimiter
+
+JIKAN_API_URL = os.environ.get("JIKAN_API_URL", "https://api.jikan.moe/v4")
+
+# Jikan allows 3 requests a second and 60 a minute.
+client = HttpClient("jikan", limiters=[RateLimiter(rate=3, burst=3),
+                                       RateLimiter(rate=1, burst=60)])
 
 
 class MAL:
@@ -12,21 +20,20 @@ class MAL:
     def get_mal(movie: Movie, content_id: int, sleep_time: float = 0.5):
         """
         Take MAL link and fill metadata for that entry. Uses jikan.moe.
+        Requests are spaced out by the client's rate limiters, sleep_time is
+        only where backing off starts if Jikan rate limits anyway.
         """
-        import time
 
-        # Rate limits yawn
-        time.sleep(sleep_time)
-        response = requests.get(f"https://api.jikan.moe/v4/anime/{content_id}")
+        response = client.get("anime", f"{JIKAN_API_URL}/anime/{content_id}")
         sleep_time += 0.965
 
         while response.status_code == 429 and sleep_time < 24:
             # Try again in a bit in case of more severe rate limiting.
             sleep_time = sleep_time ** 2
-            time.sleep(sleep_time)
+            client.sleep(sleep_time)
 
-            response = requests.get(f"https://api.jikan.moe/v4/"
-                                    f"anime/{content_id}")
+            response = client.get("anime", f"{JIKAN_API_URL}/"
+                                  f"anime/{content_id}")
 
         if response.status_code == 429:
             # This should theoretically never happen.
@@ -60,6 +67,10 @@ class MAL:
         else:
             title = content["title_english"]
 
+        movie.aliases.extend(
+            [title, content["title"], content.get("title_japanese")] +
+            (content.get("title_synonyms") or []))
+
         # Fill in all the attributes into the movie object.
         movie["Poster"] = content["images"]["jpg"]["image_url"]
         movie["Title"] = title
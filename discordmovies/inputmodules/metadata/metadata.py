@@ -1,10 +1,12 @@
 from discordmovies.exceptions import MovieIdentityError
 from urllib.parse import urlparse
 from discordmovies.movies import Movie
-from typing import Union
+from typing import Callable, List, Union
 from .anilist import Anilist
+from .cache import cache
 from .imdb import IMDB
 from .mal import MAL
+from .offline import datasets
 
 
 class Metadata:
@@ -42,26 +44,55 @@ class Metadata:
                      omdb_api_key: str = None, ) -> Union[list, None]:
         """
         Takes a Movie object which has a link in it and adds as much metadata
-        as it can to it, trying to fill in the other attributes.
+        as it can to it, trying to fill in the other attributes. Results are
+        shared through the metadata cache, see MetadataCache.
         """
 
         site_info = self.identify(movie["Link"])
+        content_id = site_info[1]
 
-        if site_info[1] is None:
+        if content_id is None:
             raise MovieIdentityError
 
         elif site_info[0] == "anilist.co":
-            return Anilist.get_anilist(content_id=site_info[1], movie=movie)
+            self.fill(site="anilist", content_id=content_id, movie=movie,
+                      online=lambda i, attributes: Anilist.get_anilist(
+                          content_id=content_id, movie=i))
 
         elif site_info[0] == "myanimelist.net":
-            return MAL.get_mal(content_id=site_info[1], movie=movie)
+            self.fill(site="mal", content_id=content_id, movie=movie,
+                      online=lambda i, attributes: MAL.get_mal(
+                          content_id=content_id, movie=i))
 
         elif site_info[0] in ["www.imdb.com", "m.imdb.com"]:
-            if omdb_api_key is not None:
-                return IMDB.get_imdb(
-                    content_id=site_info[1],
-                    omdb_api_key=omdb_api_key,
-                    movie=movie
-                )
-            else:
-                return None
+            def online(i: Movie, attributes: List[str] = None):
+                if attributes == ["Poster"]:
+                    IMDB.get_poster(content_id=content_id,
+                                    omdb_api_key=omdb_api_key, movie=i)
+                else:
+                    IMDB.get_imdb(content_id=content_id,
+                                  omdb_api_key=omdb_api_key, movie=i)
+
+            if omdb_api_key is None:
+                online = None
+            if online is not None or datasets.enabled():
+                self.fill(site="imdb", content_id=content_id, movie=movie,
+                          online=online)
+
+        return None
+
+    @staticmethod
+    def fill(site: str, content_id: str, movie: Movie,
+             online: Union[Callable[[Movie, List[str]], None], None]):
+        """
+        Fill a movie through the metadata cache, from the offline datasets
+        if they are set up, see OfflineDatasets.fill, or otherwise online.
+        """
+
+        if datasets.enabled():
+            fetch = lambda i: datasets.fill(site=site, content_id=content_id,
+                                            movie=i, online=online)
+        else:
+            fetch = lambda i: online(i, None)
+
+        cache.fill(key=(site, content_id), movie=movie, fetch=fetch)
@@ -0,0 +1,319 @@
+import gzip
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+from typing import Callable, Dict, List, Union
+from discordmovies.exceptions import MovieIdentityError
+from discordmovies.metrics import metrics
+from discordmovies.movies import Movie
+
+# A directory with the IMDb datasets title.basics.tsv and title.ratings.tsv
+# from https://datasets.imdbws.com. They may still be gzipped, they are
+# unpacked next to themselves the first time they're used.
+IMDB_DATASETS = os.environ.get("IMDB_DATASETS")
+
+# The anime-offline-database.json file of the manami-project's anime offline
+# database. An index of it is written next to it the first time it's used,
+# and again when it's updated.
+ANIME_OFFLINE_DATABASE = os.environ.get("ANIME_OFFLINE_DATABASE")
+
+# Attributes the datasets don't have that are still looked up online. Each
+# takes requests per title, trailers for example are a request to TMDB or
+# Jikan, so by default only posters are.
+ONLINE_ATTRIBUTES = [i.strip() for i in os.environ.get(
+    "OFFLINE_ONLINE_ATTRIBUTES", "Poster").split(",") if i.strip()]
+
+# The anime offline database has tags rather than genres, these are the ones
+# MyAnimeList uses as genres.
+MAL_GENRES = ["Action", "Adventure", "Avant Garde", "Award Winning",
+              "Boys Love", "Comedy", "Drama", "Ecchi", "Erotica", "Fantasy",
+              "Girls Love", "Gourmet", "Hentai", "Horror", "Mystery",
+              "Romance", "Sci-Fi", "Slice of Life", "Sports", "Supernatural",
+              "Suspense"]
+
+# The sites in the anime offline database that links are supported for,
+# and the number their IDs are prefixed with in its index.
+ANIME_SITES = {"myanimelist.net": 1, "anilist.co": 2}
+ANIME_HOSTS = {"mal": "myanimelist.net", "anilist": "anilist.co"}
+
+
+class SortedLines:
+    """
+    A memory-mapped text file whose lines are sorted by a number at their
+    start, such as the IMDb datasets, which are sorted by ID. Lines are
+    found by binary search, so nothing is loaded up front and lookups only
+    touch a few pages of the file.
+    """
+
+    def __init__(self, path: str, key: Callable[[bytes], int]):
+        self.path = path
+        self.key = key
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(path) else b""
+
+    def find(self, key: int) -> Union[List[str], None]:
+        """
+        The tab separated fields of the line with the given key, None if
+        there isn't one.
+        """
+
+        data = self.map
+        low, high = 0, len(data)
+        while low < high:
+            start = data.rfind(b"\n", 0, (low + high) // 2) + 1
+            end = data.find(b"\n", start)
+            end = len(data) if end == -1 else end
+            tab = data.find(b"\t", start, end)
+            line_key = self.key(data[start:end if tab == -1 else tab])
+
+            if line_key == key:
+                return data[start:end].decode("utf-8").split("\t")
+            if line_key < key:
+                low = end + 1
+            else:
+                high = start
+
+        return None
+
+
+def imdb_key(field: bytes) -> int:
+    # tt0000001, the header line sorts first.
+    return int(field[2:]) if field[:2] == b"tt" and field[2:].isdigit() \
+        else -1
+
+
+def anime_key(site: str, content_id: Union[str, int]) -> int:
+    return ANIME_SITES[site] * 10 ** 10 + int(content_id)
+
+
+def unpack(path: str) -> str:
+    """
+    The path of a dataset, unpacking path.gz to path if only that exists.
+    """
+
+    if not os.path.exists(path) and os.path.exists(path + ".gz"):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(path + ".gz", "rb") as source, \
+                open(temporary, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+        os.replace(temporary, path)
+
+    return path
+
+
+def runtime(seconds: int, episodes: int) -> str:
+    """
+    A runtime the way MyAnimeList writes it, like "1 hr 55 min" or "24 min
+    per ep".
+    """
+
+    hours, minutes = divmod(round(seconds / 60), 60)
+    text = " ".join(([f"{hours} hr"] if hours else []) +
+                    ([f"{minutes} min"] if minutes or not hours else []))
+
+    return text + " per ep" if (episodes or 0) > 1 else text
+
+
+class OfflineDatasets:
+    """
+    Metadata from local dumps of the IMDb datasets and the anime offline
+    database, so titles in them can be filled in without any requests.
+    They don't have everything the online providers do, see
+    ONLINE_ATTRIBUTES.
+
+    Each dataset is opened the first time it's needed. Datasets that
+    aren't set up are skipped.
+    """
+
+    def __init__(self, imdb_directory: str = IMDB_DATASETS,
+                 anime_database: str = ANIME_OFFLINE_DATABASE):
+        self.imdb_directory = imdb_directory
+        self.anime_database = anime_database
+        self.lock = threading.Lock()
+        self.files: Dict[str, Union[SortedLines, None]] = {}
+
+    def open(self, name: str) -> Union[SortedLines, None]:
+        with self.lock:
+            if name not in self.files:
+                self.files[name] = self.load(name)
+
+            return self.files[name]
+
+    def load(self, name: str) -> Union[SortedLines, None]:
+        if name in ["title.basics", "title.ratings"]:
+            if not self.imdb_directory:
+                return None
+            path = unpack(os.path.join(self.imdb_directory, name + ".tsv"))
+            if not os.path.exists(path):
+                return None
+            return SortedLines(path, key=imdb_key)
+
+        if not self.anime_database or \
+                not os.path.exists(self.anime_database):
+            return None
+        index = self.anime_database + ".index"
+        if not os.path.exists(index) or os.path.getmtime(index) < \
+                os.path.getmtime(self.anime_database):
+            self.build_anime_index(self.anime_database, index)
+        return SortedLines(index, key=int)
+
+    @staticmethod
+    def build_anime_index(source: str, index: str):
+        """
+        Write the entries of the anime offline database to a file sorted by
+        site and ID, with a line per link to the entry.
+        """
+
+        with open(source, encoding="utf-8") as f:
+            entries = json.load(f)["data"]
+
+        lines = []
+        for i in entries:
+            record = json.dumps({j: i.get(j) for j in [
+                "sources", "title", "synonyms", "episodes", "animeSeason",
+                "picture", "tags", "duration", "score"]})
+            for j in i.get("sources", []):
+                match = re.match(r"https?://(?:www\.)?([^/]+)/anime/(\d+)", j)
+                if match and match.group(1) in ANIME_SITES:
+                    lines.append((anime_key(*match.groups()), record))
+        lines.sort(key=lambda i: i[0])
+
+        temporary = f"{index}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            for key, record in lines:
+                f.write(f"{key}\t{record}\n")
+        os.replace(temporary, index)
+
+    def imdb(self, content_id: str,
+             movie: Movie = None) -> Union[Dict[str, str], None]:
+        """
+        The attributes of an IMDb title, None if it isn't in the datasets.
+        Its titles are added to the aliases of movie, if given.
+        """
+
+        basics = self.open("title.basics")
+        number = imdb_key(content_id.encode())
+        line = basics.find(number) if basics is not None else None
+        if line is None:
+            return None
+
+        fields = dict(zip(["tconst", "titleType", "primaryTitle",
+                           "originalTitle", "isAdult", "startYear",
+                           "endYear", "runtimeMinutes", "genres"], line))
+        # Missing values are written as \N.
+        fields = {i: j for i, j in fields.items() if j != "\\N"}
+
+        if movie is not None:
+            movie.aliases.extend([fields.get("primaryTitle"),
+                                  fields.get("originalTitle")])
+
+        values = {
+            "Title": fields.get("primaryTitle", "None"),
+            "Genres": fields.get("genres", "None").replace(",", ", "),
+            "Runtime": fields.get("runtimeMinutes", "None"),
+            "ID": f"IMDB: {content_id}",
+            "Release Date": fields.get("startYear", "None")
+        }
+
+        ratings = self.open("title.ratings")
+        rating = ratings.find(number) if ratings is not None else None
+        if rating is not None and rating[1] != "\\N":
+            values["User Score"] = rating[1]
+
+        return values
+
+    def anime(self, site: str, content_id: str,
+              movie: Movie = None) -> Union[Dict[str, str], None]:
+        """
+        The attributes of an anime on MyAnimeList or AniList, site being
+        "mal" or "anilist". None if it isn't in the database. Its titles are
+        added to the aliases of movie, if given.
+        """
+
+        database = self.open("anime")
+        line = database.find(anime_key(ANIME_HOSTS[site], content_id)) \
+            if database is not None else None
+        if line is None:
+            return None
+
+        entry = json.loads(line[1])
+        if movie is not None:
+            movie.aliases.extend([entry.get("title")] +
+                                 (entry.get("synonyms") or []))
+
+        # Titles are listed under their MyAnimeList ID, like the online
+        # providers do.
+        mal_id = next((re.search(r"(\d+)$", i.rstrip("/")).group(1)
+                       for i in entry.get("sources", [])
+                       if "myanimelist.net/anime/" in i), None)
+
+        tags = {i.lower() for i in entry.get("tags") or []}
+        genres = [i for i in MAL_GENRES if i.lower() in tags]
+
+        values = {
+            "Title": entry.get("title") or "None",
+            "Genres": ", ".join(genres) or "None",
+            "ID": f"MAL: {mal_id}" if mal_id else f"AniList: {content_id}",
+            "Release Date": str((entry.get("animeSeason") or {}).get(
+                "year") or "None")
+        }
+        if entry.get("picture"):
+            values["Poster"] = entry["picture"]
+        if entry.get("duration"):
+            values["Runtime"] = runtime(entry["duration"]["value"],
+                                        entry.get("episodes"))
+        if entry.get("score"):
+            values["User Score"] = str(round(
+                entry["score"]["arithmeticMean"], 2))
+
+        return values
+
+    def fill(self, site: str, content_id: str, movie: Movie,
+             online: Callable[[Movie, List[str]], None] = None):
+        """
+        Fill in a movie from the datasets. site is "imdb", "mal" or
+        "anilist". online is called with a separate movie and the attributes
+        in ONLINE_ATTRIBUTES the datasets don't have, to find those. Titles
+        that aren't in the datasets are looked up online entirely, with
+        None for the attributes. Without online, attributes that can't be
+        found are left empty.
+        """
+
+        values = self.imdb(content_id, movie=movie) if site == "imdb" else \
+            self.anime(site, content_id, movie=movie)
+
+        metrics.record_cache("offline", hit=values is not None)
+        if values is None:
+            if online is not None:
+                online(movie, None)
+            return
+
+        for i, j in values.items():
+            movie[i] = j
+
+        missing = [i for i in ONLINE_ATTRIBUTES if i not in values]
+        if not missing:
+            return
+
+        found = Movie(values={"Link": movie["Link"],
+                              **{i: "" for i in missing}})
+        if online is not None:
+            try:
+                online(found, missing)
+            except MovieIdentityError:
+                # The online providers don't know the title, what the
+                # datasets have is still worth keeping.
+                pass
+        for i in missing:
+            movie[i] = found[i]
+
+    def enabled(self) -> bool:
+        return bool(self.imdb_directory or self.anime_database)
+
+
+# A single instance shared by the whole package.
+datasets = OfflineDatasets()
@@ -0,0 +1,202 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Union
+from discordmovies.httpclient import HttpClient
+from discordmovies.metrics import metrics
+from discordmovies.movies import Movie
+from discordmovies.outputmodules.layout import ROW_HEIGHT
+from discordmovies.ratelimit import RateLimiter
+from discordmovies.utils import Utils
+
+# Posters are drawn to fit their cell, and are about 2:3.
+POSTER_RATIO = 2 / 3
+
+TMDB_SIZES = ["w92", "w154", "w185", "w342", "w500", "w780", "original"]
+
+# Whether posters load is remembered between runs for a week, after which
+# they are checked again.
+CACHE_PATH = ".discordmovies-posters.json"
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+# How many posters are checked at once.
+WORKERS = 8
+
+# Image hosts don't publish limits, this is just to be polite.
+client = HttpClient("posters", limiters=[RateLimiter(rate=100, burst=100)])
+
+
+def pick_size(sizes: List[str], height: int = None) -> str:
+    """
+    The smallest of TMDB's poster sizes, such as "w92" or "original", that
+    still fills a row of the given height, by default the height rows of
+    movies are given in Google Sheets, see layout.ROW_HEIGHT.
+    """
+
+    height = ROW_HEIGHT if height is None else height
+    width = height * POSTER_RATIO
+    widths = sorted((int(i[1:]), i) for i in sizes
+                    if i.startswith("w") and i[1:].isdigit())
+    for i, j in widths:
+        if i >= width:
+            return j
+
+    return "original" if "original" in sizes else sizes[-1]
+
+
+def alternatives(url: str) -> List[str]:
+    """
+    Other URLs the same poster may be found at, to try when url doesn't
+    load. For TMDB these are the larger sizes, for MyAnimeList the large
+    and WebP versions.
+    """
+
+    match = re.match(r"(.+/t/p/)([^/]+)(/.+)$", url)
+    if match:
+        base, size, path = match.groups()
+        start = TMDB_SIZES.index(size) + 1 if size in TMDB_SIZES else 0
+        return [base + i + path for i in TMDB_SIZES[start:]]
+
+    match = re.match(r"(.+/images/anime/.+?)(l|t)?\.(jpg|webp)$", url)
+    if match:
+        base = match.group(1)
+        return [i for i in [base + "l.jpg", base + ".webp", base + "l.webp"]
+                if i != url]
+
+    return []
+
+
+class PosterCache:
+    """
+    Remembers whether poster URLs load, in a file so later runs don't check
+    them again until they expire.
+    """
+
+    def __init__(self, path: str = CACHE_PATH,
+                 max_age: float = CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # URLs to when they were checked and whether they loaded.
+        self.entries: Dict[str, list] = None
+
+    def load(self):
+        if self.entries is not None:
+            return
+
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, url: str) -> Union[bool, None]:
+        """
+        Whether url loaded when it was last checked, None if it hasn't been
+        checked or that has expired.
+        """
+
+        with self.lock:
+            self.load()
+            entry = self.entries.get(url)
+            if entry is None or entry[0] < time.time() - self.max_age:
+                return None
+
+            return entry[1]
+
+    def set(self, url: str, loads: bool):
+        with self.lock:
+            self.load()
+            self.entries[url] = [time.time(), loads]
+
+    def save(self):
+        with self.lock:
+            if self.entries is None:
+                return
+            oldest = time.time() - self.max_age
+            self.entries = {i: j for i, j in self.entries.items()
+                            if j[0] >= oldest}
+            Utils.atomic_write(self.path, json.dumps(self.entries))
+
+
+# A single instance shared by the whole package.
+cache = PosterCache()
+
+
+def check(url: str) -> Union[bool, None]:
+    """
+    Whether an image loads. Returns None if that couldn't be told, for
+    example because its host is down.
+    """
+
+    import requests
+
+    try:
+        response = client.request("HEAD", "head", url, allow_redirects=True,
+                                  timeout=10)
+        # Some hosts don't answer HEAD requests.
+        if response.status_code == 405:
+            response = client.get("get", url, stream=True, timeout=10)
+            response.close()
+    except requests.RequestException:
+        return None
+
+    if response.status_code in [404, 410]:
+        return False
+    if response.status_code < 400:
+        return True
+
+    return None
+
+
+def validate(urls: Iterable[str],
+             workers: int = WORKERS) -> Dict[str, Union[bool, None]]:
+    """
+    Check whether each URL loads, using the cache where possible. URLs that
+    aren't cached are checked at once.
+    """
+
+    results = {}
+    unknown = []
+    for url in dict.fromkeys(urls):
+        loads = cache.get(url)
+        metrics.record_cache("posters", hit=loads is not None)
+        if loads is None:
+            unknown.append(url)
+        else:
+            results[url] = loads
+
+    if unknown:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for url, loads in zip(unknown, executor.map(check, unknown)):
+                results[url] = loads
+                if loads is not None:
+                    cache.set(url, loads)
+        cache.save()
+
+    return results
+
+
+def validate_posters(movies: Iterable[Movie], workers: int = WORKERS):
+    """
+    Check that the poster of every movie loads. Posters that don't are
+    replaced with the first alternative that does, or left empty so sheets
+    don't show a broken image. Posters that couldn't be checked are kept.
+    """
+
+    movies = [i for i in movies if i.check_attribute("Poster") and
+              i["Poster"].startswith("http")]
+    results = validate((i["Poster"] for i in movies), workers=workers)
+
+    dead = [i for i in movies if results[i["Poster"]] is False]
+    if not dead:
+        return
+
+    candidates = {i["Poster"]: alternatives(i["Poster"]) for i in dead}
+    found = validate((j for i in candidates.values() for j in i),
+                     workers=workers)
+    for i in dead:
+        i["Poster"] = next((j for j in candidates[i["Poster"]] if found[j]),
+                           "")
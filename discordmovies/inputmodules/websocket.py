@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import threading
+from typing import Union
+from urllib.parse import urlparse
+
+# Defined by RFC 6455, used to derive Sec-WebSocket-Accept.
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketClosed(Exception):
+    """
+    Raised when sending on, or receiving from, a closed connection.
+    """
+    pass
+
+
+class WebSocket:
+    """
+    A minimal RFC 6455 websocket, enough to talk to the Discord Gateway
+    without pulling in another dependency. Can be used on either end of a
+    connection: connect() opens a client connection to a ws:// or wss:// URL,
+    while passing an already upgraded socket with client=False gives the
+    server side, which the stand-in gateway uses.
+
+    Only text messages are supported, compression is not.
+    """
+
+    def __init__(self, sock: socket.socket = None, client: bool = True):
+        self.sock = sock
+        self.client = client
+        self.send_lock = threading.Lock()
+        self.closed = sock is None
+        # Bytes read from the socket past the last frame.
+        self.buffer = b""
+        # The code the other end closed the connection with, see recv().
+        self.close_code = None
+
+    @staticmethod
+    def accept_key(key: str) -> str:
+        return base64.b64encode(
+            hashlib.sha1((key + GUID).encode()).digest()).decode()
+
+    def connect(self, url: str, timeout: float = 30) -> "WebSocket":
+        """
+        Open a connection and perform the opening handshake.
+        """
+
+        parsed = urlparse(url)
+        secure = parsed.scheme == "wss"
+        port = parsed.port or (443 if secure else 80)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+
+        sock = socket.create_connection((parsed.hostname, port),
+                                        timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(
+                sock, server_hostname=parsed.hostname)
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall((f"GET {path} HTTP/1.1\r\n"
+                      f"Host: {parsed.hostname}:{port}\r\n"
+                      f"Upgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\n"
+                      f"Sec-WebSocket-Key: {key}\r\n"
+                      f"Sec-WebSocket-Version: 13\r\n\r\n").encode())
+
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("Connection closed during the websocket "
+                                      "handshake.")
+            response += chunk
+
+        head, rest = response.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        if " 101 " not in lines[0] + " ":
+            raise ConnectionError(f"Websocket handshake failed: {lines[0]}")
+
+        headers = {}
+        for i in lines[1:]:
+            name, _, value = i.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("sec-websocket-accept") != self.accept_key(key):
+            raise ConnectionError("Websocket handshake returned the wrong "
+                                  "accept key.")
+
+        sock.settimeout(None)
+        self.sock = sock
+        self.buffer = rest
+        self.closed = False
+
+        return self
+
+    def read_exactly(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            chunk = self.sock.recv(max(4096, size - len(self.buffer)))
+            if not chunk:
+                self.closed = True
+                raise WebSocketClosed("Connection closed by the other end.")
+            self.buffer += chunk
+
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def send_frame(self, opcode: int, payload: bytes = b""):
+        header = bytes([0x80 | opcode])
+        mask_bit = 0x80 if self.client else 0
+        length = len(payload)
+        if length < 126:
+            header += bytes([mask_bit | length])
+        elif length < 2 ** 16:
+            header += bytes([mask_bit | 126]) + struct.pack("!H", length)
+        else:
+            header += bytes([mask_bit | 127]) + struct.pack("!Q", length)
+
+        # Clients must mask everything they send, servers must not.
+        if self.client:
+            mask = os.urandom(4)
+            header += mask
+            payload = bytes(j ^ mask[i % 4] for i, j in enumerate(payload))
+
+        with self.send_lock:
+            if self.closed:
+                raise WebSocketClosed("Cannot send on a closed websocket.")
+            self.sock.sendall(header + payload)
+
+    def read_frame(self) -> tuple:
+        first, second = self.read_exactly(2)
+        fin = bool(first & 0x80)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.read_exactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.read_exactly(8))[0]
+
+        mask = self.read_exactly(4) if second & 0x80 else None
+        payload = self.read_exactly(length)
+        if mask:
+            payload = bytes(j ^ mask[i % 4] for i, j in enumerate(payload))
+
+        return fin, opcode, payload
+
+    def send(self, text: str):
+        """
+        Send a text message.
+        """
+
+        self.send_frame(OP_TEXT, text.encode())
+
+    def recv(self) -> Union[str, None]:
+        """
+        Wait for the next text message. Pings are answered along the way.
+        Returns None once the other end closes the connection, the close code
+        is then available as close_code.
+        """
+
+        message = b""
+        while True:
+            fin, opcode, payload = self.read_frame()
+
+            if opcode == OP_PING:
+                self.send_frame(OP_PONG, payload)
+            elif opcode == OP_PONG:
+                pass
+            elif opcode == OP_CLOSE:
+                self.close_code = struct.unpack("!H", payload[:2])[0] \
+                    if len(payload) >= 2 else None
+                self.close(self.close_code or 1000)
+                return None
+            else:
+                message += payload
+                if fin:
+                    return message.decode()
+
+    def close(self, code: int = 1000):
+        """
+        Send a close frame, if the connection is still open, and close the
+        socket.
+        """
+
+        if self.closed:
+            return
+        try:
+            self.send_frame(OP_CLOSE, struct.pack("!H", code))
+        except (OSError, WebSocketClosed):
+            pass
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
@@ -0,0 +1,151 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union, Dict
+from discordmovies.attributes import RunOptions
+from discordmovies.discordmovies import DiscordMovies
+from discordmovies.metrics import metrics
+
+
+class Job(dict):
+    """
+    The settings for keeping a single file up to date, the same ones that can
+    be given on the command line. Settings other than these are those of
+    RunOptions.
+    """
+
+    def __init__(self, channel_id: Union[str, int],
+                 output: str = "csv",
+                 name: str = None,
+                 watched_channel_id: Union[str, int] = None,
+                 sheet_id: str = None,
+                 filename: str = "DiscordMovies",
+                 max_messages: int = 100,
+                 remove_watched: bool = False,
+                 reformat_sheet: bool = False,
+                 attributes: List[str] = None,
+                 exclude_attributes: List[str] = None,
+                 token: str = None,
+                 bot: bool = True,
+                 tmdb_api_key: str = None,
+                 **options):
+
+        super().__init__()
+
+        if output not in ["sheet", "csv", "all"]:
+            raise TypeError('Output type was not correctly specified. Please '
+                            'choose from "sheet", "csv", or "all".')
+        if token is None:
+            raise TypeError(f"No Discord auth token found for the job with "
+                            f"channel ID {channel_id}.")
+        options = RunOptions(**options)
+        if options["serve"] is not None:
+            raise TypeError("Queries can only be served for a single file, "
+                            "not for jobs.")
+
+        self["name"] = name if name is not None else \
+            f"{filename} ({channel_id})"
+        self["output"] = output
+        self["channel_id"] = channel_id
+        self["watched_channel_id"] = watched_channel_id
+        self["sheet_id"] = sheet_id
+        self["filename"] = filename
+        self["max_messages"] = max_messages
+        self["remove_watched"] = remove_watched
+        self["reformat_sheet"] = reformat_sheet
+        self["options"] = options
+        self["attributes"] = attributes
+        self["exclude_attributes"] = exclude_attributes
+        self["token"] = token
+        self["bot"] = bot
+        self["tmdb_api_key"] = tmdb_api_key
+
+    def output_types(self) -> List[str]:
+        if self["output"] == "all":
+            return ["sheet", "csv"]
+        return [self["output"]]
+
+
+class JobRunner:
+    """
+    Runs many jobs at once in a single process, for example one per server or
+    channel, instead of a separate run for each. Jobs share HTTP connections,
+    rate limiters, Google credentials and the metadata cache, so a title
+    suggested in several channels is only looked up once and the providers'
+    rate limits are respected across all jobs.
+
+    A job failing doesn't stop the others, the names of failed jobs are
+    returned once all of them have finished.
+    """
+
+    def __init__(self, jobs: List[Job], workers: int = 4):
+        csv_files = [i["filename"] for i in jobs if "csv" in i.output_types()]
+        duplicates = {i for i in csv_files if csv_files.count(i) > 1}
+        if duplicates:
+            raise ValueError(f"Several jobs write to the same CSV file: "
+                             f"{', '.join(sorted(duplicates))}. Give each of "
+                             f"them a different filename.")
+
+        self.jobs = jobs
+        self.workers = workers
+
+    @classmethod
+    def from_file(cls, path: str, defaults: Dict[str, object] = None,
+                  workers: int = None) -> "JobRunner":
+        """
+        Load jobs from a JSON file. It holds a list of jobs under "jobs",
+        each with the arguments of Job, and optionally settings shared by all
+        jobs under "defaults" and the amount of jobs to run at once under
+        "workers". defaults are used for settings missing from both.
+        """
+
+        with open(path) as f:
+            config = json.load(f)
+
+        shared = {**(defaults or {}), **config.get("defaults", {})}
+        jobs = [Job(**{**shared, **i}) for i in config["jobs"]]
+
+        if workers is None:
+            workers = config.get("workers", 4)
+
+        return cls(jobs=jobs, workers=workers)
+
+    def run(self) -> List[str]:
+        """
+        Run every job and return the names of the ones that failed.
+        """
+
+        with metrics.stage("jobs"):
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [(i, executor.submit(self.run_job, i)) for i in
+                           self.jobs]
+
+        failures = []
+        for job, future in futures:
+            error = future.exception()
+            if error is not None:
+                print(f"Job {job['name']} failed: {error!r}")
+                failures.append(job["name"])
+
+        return failures
+
+    @staticmethod
+    def run_job(job: Job):
+        for i in job.output_types():
+            movies = DiscordMovies(
+                discord_auth_token=job["token"],
+                bot=job["bot"],
+                doc_name=job["filename"],
+                attributes=job["attributes"],
+                exclude_attributes=job["exclude_attributes"]
+            )
+            movies.discord_to_file(
+                filetype=i,
+                channel_id=job["channel_id"],
+                watched_channel_id=job["watched_channel_id"],
+                sheet_id=job["sheet_id"],
+                max_messages=job["max_messages"],
+                tmdb_api_key=job["tmdb_api_key"],
+                remove_watched=job["remove_watched"],
+                reformat_sheet=job["reformat_sheet"],
+                options=job["options"]
+            )
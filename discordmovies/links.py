@@ -0,0 +1,179 @@
+from typing import Dict, Iterable, Iterator, List
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+# Hosts that serve the same pages under another name.
+HOST_ALIASES = {
+    "m.imdb.com": "www.imdb.com",
+    "imdb.com": "www.imdb.com",
+    "anilist.co": "anilist.co",
+    "www.anilist.co": "anilist.co",
+    "myanimelist.net": "myanimelist.net",
+    "www.myanimelist.net": "myanimelist.net"
+}
+
+# For supported sites, the part of the path that identifies a title. Anything
+# after the ID, like the title slug MAL adds, doesn't change what is linked.
+ID_PATHS = {
+    "www.imdb.com": "title",
+    "anilist.co": "anime",
+    "myanimelist.net": "anime"
+}
+
+# Query parameters added to links for tracking, which don't change what is
+# linked. Parameters starting with TRACKING_PREFIX are tracking ones too.
+TRACKING_PARAMETERS = {"fbclid", "gclid", "igshid", "si", "ref", "ref_"}
+TRACKING_PREFIX = "utm_"
+
+
+class LinkRegistry:
+    """
+    An ordered set of links. Links are compared in their canonical form, so
+    the same title linked with or without a trailing slash, from the mobile
+    site or with tracking parameters is only in the registry once. Iterating
+    gives the links as they were first added.
+
+    Cells in a file may hold several links on separate lines after
+    duplicates are merged, use matches() to check those.
+    """
+
+    def __init__(self, links: Iterable[str] = None):
+        self.links: Dict[str, str] = {}
+        if links is not None:
+            self.extend(links)
+
+    @staticmethod
+    def canonical(link: str) -> str:
+        """
+        The form links are compared in: host and path without the scheme or
+        tracking parameters, and for supported sites only the part of the
+        path with the ID. Text that isn't a URL, like a note someone typed
+        into the link column, is compared as it is, without the whitespace
+        around it. Text without a scheme is only a URL if it starts with a
+        host name with a dot in it, like www.imdb.com.
+        """
+
+        link = link.strip()
+        url = link if "://" in link else "https://" + link
+
+        try:
+            parsed = urlparse(url)
+            port = parsed.port
+        except ValueError:
+            return link
+
+        host = (parsed.hostname or "").lower()
+        if "://" not in link and ("." not in host or
+                                  any(i.isspace() for i in host)):
+            return link
+        host = HOST_ALIASES.get(host, host)
+        if port is not None:
+            host += f":{port}"
+        path = [i for i in parsed.path.split("/") if i]
+
+        if host in ID_PATHS:
+            kind = ID_PATHS[host]
+            if kind in path and path.index(kind) + 1 < len(path):
+                start = path.index(kind)
+                return f"{host}/{kind}/{path[start + 1]}"
+
+        canonical = "/".join([host] + path)
+        query = [(i, j) for i, j in parse_qsl(parsed.query,
+                                              keep_blank_values=True)
+                 if i not in TRACKING_PARAMETERS and
+                 not i.startswith(TRACKING_PREFIX)]
+        if query:
+            canonical += "?" + urlencode(query)
+
+        return canonical
+
+    @staticmethod
+    def split(cell: str) -> List[str]:
+        """
+        The links in a cell of a file.
+        """
+
+        return [i for i in str(cell).split("\n") if i.strip()]
+
+    def __contains__(self, link: str) -> bool:
+        return self.canonical(link) in self.links
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.links.values()))
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def __bool__(self) -> bool:
+        return bool(self.links)
+
+    def __repr__(self) -> str:
+        return f"LinkRegistry({list(self.links.values())!r})"
+
+    def add(self, link: str):
+        self.links.setdefault(self.canonical(link), link)
+
+    def extend(self, links: Iterable[str]):
+        for i in links:
+            self.add(i)
+
+    def remove(self, link: str):
+        """
+        Remove a link. Raises a ValueError if it isn't there, like
+        list.remove.
+        """
+
+        try:
+            del self.links[self.canonical(link)]
+        except KeyError:
+            raise ValueError(f"{link} is not in the registry.") from None
+
+    def discard(self, link: str):
+        self.links.pop(self.canonical(link), None)
+
+    def matches(self, cell: str) -> bool:
+        """
+        Whether any of the links in a cell are in the registry.
+        """
+
+        return any(i in self for i in self.split(cell))
+
+    def difference(self, links: Iterable[str]) -> "LinkRegistry":
+        """
+        The links in this registry that aren't in links, in order.
+        """
+
+        other = as_registry(links)
+        result = LinkRegistry()
+        result.links = {i: j for i, j in self.links.items()
+                        if i not in other.links}
+
+        return result
+
+    def intersection(self, links: Iterable[str]) -> "LinkRegistry":
+        """
+        The links in this registry that are also in links, in order.
+        """
+
+        other = as_registry(links)
+        result = LinkRegistry()
+        result.links = {i: j for i, j in self.links.items()
+                        if i in other.links}
+
+        return result
+
+    def copy(self) -> "LinkRegistry":
+        result = LinkRegistry()
+        result.links = dict(self.links)
+
+        return result
+
+
+def as_registry(links: Iterable[str]) -> LinkRegistry:
+    """
+    Turn any iterable of links into a registry, registries are returned as
+    they are.
+    """
+
+    if isinstance(links, LinkRegistry):
+        return links
+    return LinkRegistry(links)
@@ -0,0 +1,371 @@
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple, Union
+from discordmovies.attributes import DiscordMoviesAttributes, Keys, \
+    DiscordAttributes
+from discordmovies.inputmodules.discord import Discord
+from discordmovies.inputmodules.metadata.posters import validate_posters
+from discordmovies.links import LinkRegistry
+from discordmovies.metrics import metrics
+from discordmovies.movies import Movie, MovieList
+from discordmovies.outputmodules.filehelper import FileHelper
+
+
+class PendingChanges:
+    """
+    Changes waiting to be written to the files. Collecting them first means a
+    burst of changes is written at once, and changes that cancel each other
+    out, like a link that is sent and then deleted, are never written at all.
+
+    Changes are due to be written once nothing has changed for debounce
+    seconds, or max_delay seconds after the first of them, whichever comes
+    first. Links are kept in their canonical form, see LinkRegistry.
+    """
+
+    def __init__(self, debounce: float = 0.0, max_delay: float = 30.0):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.clear()
+
+    def clear(self):
+        # Links to append, with who suggested them and when.
+        self.added: Dict[str, Dict[str, str]] = {}
+        # Links whose rows should be removed. A dict is used as an ordered
+        # set.
+        self.removed: Dict[str, None] = {}
+        # Links whose watched column should change, and what it should be.
+        self.watched: Dict[str, bool] = {}
+        self.first = None
+        self.last = None
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.watched)
+
+    def touch(self):
+        self.last = time.monotonic()
+        if self.first is None:
+            self.first = self.last
+
+    def add(self, suggestion: Dict[str, str], present: bool):
+        """
+        Add a movie. present is whether its row is already in the files, in
+        which case this only cancels a pending removal.
+        """
+
+        link = LinkRegistry.canonical(suggestion["Link"])
+        if link in self.removed:
+            del self.removed[link]
+        elif not present:
+            self.added[link] = suggestion
+        self.touch()
+
+    def remove(self, link: str, present: bool):
+        if link in self.added:
+            del self.added[link]
+        elif present:
+            self.removed[link] = None
+        self.touch()
+
+    def watch(self, link: str, watched: bool = True):
+        self.watched[link] = watched
+        self.touch()
+
+    def time_until_due(self) -> Union[float, None]:
+        """
+        Seconds until the changes should be written, or None if there are
+        none.
+        """
+
+        if not self:
+            return None
+
+        now = time.monotonic()
+        return max(0.0, min(self.last + self.debounce - now,
+                            self.first + self.max_delay - now))
+
+    def due(self) -> bool:
+        return self.time_until_due() == 0.0
+
+
+class Listener:
+    """
+    Keeps files up to date in real time using events from the Discord Gateway
+    rather than by paging through channel history. New links in the movie
+    channel are looked up and appended, links removed by editing or deleting
+    a message are removed, and links sent to or removed from the watched
+    channel update the watched column.
+
+    Usage is connect(), then a normal run to catch up on anything that
+    happened while offline, then run(). Events arriving in the meantime are
+    queued and applied once run() is called, links the catch-up run already
+    wrote are skipped.
+
+    Changes are collected in PendingChanges and written together, see its
+    description for what debounce and max_delay do.
+    """
+
+    def __init__(self, attributes: DiscordMoviesAttributes, keys: Keys,
+                 discord_attr: DiscordAttributes,
+                 remove_watched: bool = False, debounce: float = 0.0,
+                 max_delay: float = 30.0):
+        self.attributes = attributes
+        self.keys = keys
+        self.discord_attr = discord_attr
+        self.remove_watched = remove_watched
+        self.channel_id = str(discord_attr["channel_id"])
+        self.watched_channel_id = str(discord_attr["watched_channel_id"]) \
+            if discord_attr["watched_channel_id"] is not None else None
+        self.source = Discord(auth=keys["discord"], bot=attributes["bot"],
+                              max_messages=discord_attr["max_messages"])
+
+        # The links in every message we know of, and how many messages
+        # contain each link, per channel. Deleting a message only gives its
+        # ID, and a link should only be removed once no message has it. Links
+        # are canonical, so the same title linked in different ways counts as
+        # one.
+        self.messages: Dict[str, Dict[str, List[str]]] = {
+            i: {} for i in [self.channel_id, self.watched_channel_id] if i}
+        self.counts: Dict[str, Counter] = {i: Counter() for i in
+                                           self.messages}
+        # The newest message ID seen in each channel.
+        self.latest: Dict[str, Union[str, None]] = {i: None for i in
+                                                    self.messages}
+        # Who suggested each canonical link and when, in case it has to be
+        # added again.
+        self.suggestions: Dict[str, Dict[str, str]] = {}
+
+        self.changes = PendingChanges(debounce=debounce, max_delay=max_delay)
+        self.files: List[FileHelper] = []
+        self.events = queue.Queue()
+        self.error = None
+        self.gateway = None
+
+    def run_gateway(self):
+        try:
+            self.gateway.run()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.events.put(None)
+
+    def connect(self, timeout: float = 30):
+        """
+        Connect to the gateway and start queueing events, then go through the
+        channel history once.
+        """
+
+        from discordmovies.inputmodules.gateway import Gateway
+
+        self.gateway = Gateway(auth=self.keys["discord"],
+                               bot=self.attributes["bot"],
+                               handler=lambda i, j: self.events.put((i, j)))
+        threading.Thread(target=self.run_gateway, daemon=True).start()
+        if not self.gateway.ready.wait(timeout):
+            self.stop()
+            if self.error:
+                raise self.error
+            raise ConnectionError("Could not connect to the Discord gateway.")
+
+        with metrics.stage("load_history"):
+            self.load_history()
+
+    def run(self, files: List[FileHelper]):
+        """
+        Apply events to the given files until stop() is called.
+        """
+
+        self.files = files
+
+        while True:
+            try:
+                item = self.events.get(timeout=self.changes.time_until_due())
+            except queue.Empty:
+                self.flush()
+                continue
+
+            if item is None:
+                break
+            with metrics.stage("gateway_event"):
+                self.handle(*item)
+
+        self.flush()
+        if self.error:
+            raise self.error
+
+    def stop(self):
+        if self.gateway is not None:
+            self.gateway.stop()
+        self.events.put(None)
+
+    def load_history(self):
+        """
+        Find which links each existing message holds, so that later edits and
+        deletes can be matched up with rows in the files.
+        """
+
+        for channel in self.messages:
+            for page in self.source.get_messages(channel_id=channel):
+                for message in page:
+                    self.update_message(channel, message["id"],
+                                        self.extract(message))
+
+    def extract(self, message: dict) -> List[Dict[str, str]]:
+        links = Discord.extract_links(messages=[[message]])
+        for i in links:
+            self.suggestions.setdefault(LinkRegistry.canonical(i["Link"]), i)
+
+        return links
+
+    def update_message(self, channel: str, message_id: str,
+                       links: List[Dict[str, str]]) -> Tuple[List[str],
+                                                             List[str]]:
+        """
+        Replace the links held by a message. Returns the links that are now in
+        the channel for the first time and the ones no longer in it at all.
+        """
+
+        latest = self.latest[channel]
+        if latest is None or int(message_id) > int(latest):
+            self.latest[channel] = message_id
+
+        old = self.messages[channel].pop(message_id, [])
+        new = list(dict.fromkeys(LinkRegistry.canonical(i["Link"])
+                                 for i in links))
+        if new:
+            self.messages[channel][message_id] = new
+
+        counts = self.counts[channel]
+        added = [i for i in new if i not in old and counts[i] == 0]
+        counts.update(new)
+        counts.subtract(old)
+        removed = [i for i in old if i not in new and counts[i] <= 0]
+        for i in removed:
+            del counts[i]
+
+        return added, removed
+
+    def handle(self, event: str, data: dict):
+        """
+        Record the changes a single gateway event makes to the files.
+        """
+
+        if event not in ["MESSAGE_CREATE", "MESSAGE_UPDATE",
+                         "MESSAGE_DELETE"]:
+            return
+
+        channel = str(data.get("channel_id"))
+        if channel not in self.messages:
+            return
+
+        if event == "MESSAGE_DELETE":
+            links = []
+        elif "content" not in data or "author" not in data:
+            # Updates that only add embeds don't carry the content.
+            return
+        else:
+            links = self.extract(data)
+
+        added, removed = self.update_message(channel, data["id"], links)
+
+        if channel == self.channel_id:
+            self.add_movies(added)
+            self.remove_movies(removed)
+        else:
+            self.watch(added)
+            self.unwatch(removed)
+
+    def add_movies(self, links: List[str]):
+        for i in links:
+            if self.remove_watched and i in self.attributes["watched_links"]:
+                continue
+            self.changes.add(self.suggestions[i],
+                             present=i in self.attributes["links"])
+
+    def remove_movies(self, links: List[str]):
+        for i in links:
+            self.changes.remove(i, present=i in self.attributes["links"])
+
+    def watch(self, links: List[str]):
+        self.attributes["watched_links"].extend(links)
+        if self.remove_watched:
+            self.remove_movies(links)
+        else:
+            for i in links:
+                self.changes.watch(i, watched=True)
+
+    def unwatch(self, links: List[str]):
+        for i in links:
+            self.attributes["watched_links"].discard(i)
+        if self.remove_watched:
+            # Bring back movies that are still suggested.
+            self.add_movies([i for i in links
+                             if self.counts[self.channel_id][i] > 0])
+        else:
+            for i in links:
+                self.changes.watch(i, watched=False)
+
+    def flush(self):
+        """
+        Write all pending changes to the files.
+        """
+
+        if not self.changes:
+            return
+
+        added = list(self.changes.added.values())
+        removed = list(self.changes.removed)
+        watched = [i for i, j in self.changes.watched.items()
+                   if j and i not in self.changes.added]
+        unwatched = [i for i, j in self.changes.watched.items()
+                     if not j and i not in self.changes.added]
+        self.changes.clear()
+
+        with metrics.stage("flush"):
+            movie_list = MovieList(
+                categories=self.attributes["movie_list"].get_categories())
+            for i in added:
+                movie_list.append(Movie(values=i))
+            if self.watched_channel_id is not None:
+                movie_list.mark_watched(
+                    watched_links=self.attributes["watched_links"])
+            movie_list.fill_all_metadata(tmdb_api_key=self.keys["tmdb"])
+            validate_posters(movie_list)
+
+            for i in removed:
+                self.attributes["links"].discard(i)
+            self.attributes["links"].extend(i["Link"] for i in movie_list)
+
+            changelog = None
+            store = self.attributes.get("movie_store")
+            path = self.attributes["options"]["changelog"]
+            if path or store is not None:
+                from discordmovies.changelog import Changelog
+
+                changelog = Changelog(path=path,
+                                      name=self.attributes["name"],
+                                      output=self.files[0].filetype)
+
+            for i in self.files:
+                # Read once per flush, in case someone else edited the file
+                # since the last one.
+                values = i.get_values(force_recalc=True)
+                if changelog is not None and i is self.files[0]:
+                    changelog.add_changes(
+                        previous=values, movie_list=movie_list,
+                        removed=removed, watched=watched,
+                        unwatched=unwatched)
+                if removed:
+                    i.remove_links(links=removed)
+                if movie_list:
+                    i.append_movies(movie_list=movie_list)
+                if watched:
+                    i.mark_watched(links=watched, watched=True)
+                if unwatched:
+                    i.mark_watched(links=unwatched, watched=False)
+
+            if changelog is not None:
+                if store is not None:
+                    store.apply(changelog.events)
+                changelog.write()
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Union
+from discordmovies.utils import Utils
+
+
+class Metrics:
+    """
+    Collects timings and counters over the course of a run: how long each
+    pipeline stage took, how many requests were sent to each provider and
+    endpoint and how long they took, how long was spent sleeping because of
+    rate limits, and how often caches were hit. Can be exported as JSON or as
+    a Prometheus textfile collector file.
+    """
+
+    # Upper bounds of the request latency histogram buckets, in seconds.
+    BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = defaultdict(lambda: {"seconds": 0.0, "count": 0})
+            self.requests = defaultdict(lambda: {
+                "count": 0, "seconds": 0.0, "statuses": defaultdict(int),
+                "buckets": [0] * len(self.BUCKETS)})
+            self.sleeps = defaultdict(float)
+            self.caches = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def add_listener(self, listener):
+        """
+        Register an object to be told when stages start and finish. It needs
+        stage_started(name) and stage_finished(name, seconds) methods.
+        """
+
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of code as a pipeline stage. Stages with the same name
+        are added together.
+        """
+
+        for i in self.listeners:
+            i.stage_started(name)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.stages[name]["seconds"] += elapsed
+                self.stages[name]["count"] += 1
+
+            for i in self.listeners:
+                i.stage_finished(name, elapsed)
+
+    def record_request(self, provider: str, endpoint: str,
+                       status: Union[int, str], seconds: float):
+        """
+        Record an outbound request. status is the HTTP status code, or
+        "error" if no response was received.
+        """
+
+        with self.lock:
+            request = self.requests[(provider, endpoint)]
+            request["count"] += 1
+            request["seconds"] += seconds
+            request["statuses"][str(status)] += 1
+            for i, j in enumerate(self.BUCKETS):
+                if seconds <= j:
+                    request["buckets"][i] += 1
+                    break
+
+    def record_sleep(self, provider: str, seconds: float):
+        """
+        Record time spent waiting on a provider's rate limits.
+        """
+
+        with self.lock:
+            self.sleeps[provider] += seconds
+
+    def record_cache(self, cache: str, hit: bool):
+        with self.lock:
+            self.caches[cache]["hits" if hit else "misses"] += 1
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            http = defaultdict(dict)
+            for (provider, endpoint), i in self.requests.items():
+                http[provider][endpoint] = {
+                    "count": i["count"],
+                    "seconds": round(i["seconds"], 6),
+                    "statuses": dict(i["statuses"]),
+                    "rate_limited": i["statuses"].get("429", 0),
+                    "buckets": {str(j): k for j, k in
+                                zip(self.BUCKETS, i["buckets"])}
+                }
+
+            caches = {}
+            for i, j in self.caches.items():
+                total = j["hits"] + j["misses"]
+                caches[i] = {**j, "hit_rate": j["hits"] / total if total
+                             else 0.0}
+
+            return {
+                "stages": {i: {"seconds": round(j["seconds"], 6),
+                               "count": j["count"]}
+                           for i, j in self.stages.items()},
+                "http": dict(http),
+                "sleep_seconds": {i: round(j, 6) for i, j in
+                                  self.sleeps.items()},
+                "caches": caches
+            }
+
+    def write_json(self, path: str):
+        """
+        Write all metrics to a JSON file.
+        """
+
+        Utils.atomic_write(path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path: str):
+        """
+        Write all metrics in the Prometheus text format, suitable for the
+        node exporter's textfile collector.
+        """
+
+        data = self.to_dict()
+        lines = []
+
+        def metric(name: str, kind: str, description: str):
+            lines.append(f"# HELP discordmovies_{name} {description}")
+            lines.append(f"# TYPE discordmovies_{name} {kind}")
+
+        def sample(name: str, labels: Dict[str, str], value: float):
+            label_text = ",".join(
+                f'{i}="{str(j)}"' for i, j in labels.items())
+            lines.append(f"discordmovies_{name}{{{label_text}}} {value}")
+
+        metric("stage_duration_seconds", "gauge",
+               "Time spent in each pipeline stage during the last run.")
+        for i, j in data["stages"].items():
+            sample("stage_duration_seconds", {"stage": i}, j["seconds"])
+
+        metric("http_requests_total", "counter",
+               "Outbound requests by provider, endpoint and status.")
+        for provider, endpoints in data["http"].items():
+            for endpoint, i in endpoints.items():
+                for status, count in i["statuses"].items():
+                    sample("http_requests_total",
+                           {"provider": provider, "endpoint": endpoint,
+                            "status": status}, count)
+
+        metric("http_rate_limited_total", "counter",
+               "Outbound requests answered with a 429.")
+        for provider, endpoints in data["http"].items():
+            for endpoint, i in endpoints.items():
+                sample("http_rate_limited_total",
+                       {"provider": provider, "endpoint": endpoint},
+                       i["rate_limited"])
+
+        metric("http_request_duration_seconds", "histogram",
+               "Latency of outbound requests.")
+        for provider, endpoints in data["http"].items():
+            for endpoint, i in endpoints.items():
+                labels = {"provider": provider, "endpoint": endpoint}
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS, i["buckets"].values()):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    sample("http_request_duration_seconds_bucket",
+                           {**labels, "le": le}, cumulative)
+                sample("http_request_duration_seconds_sum", labels,
+                       i["seconds"])
+                sample("http_request_duration_seconds_count", labels,
+                       i["count"])
+
+        metric("rate_limit_sleep_seconds_total", "counter",
+               "Time spent sleeping because of provider rate limits.")
+        for i, j in data["sleep_seconds"].items():
+            sample("rate_limit_sleep_seconds_total", {"provider": i}, j)
+
+        metric("cache_requests_total", "counter",
+               "Cache lookups by cache and result.")
+        for i, j in data["caches"].items():
+            sample("cache_requests_total", {"cache": i, "result": "hit"},
+                   j["hits"])
+            sample("cache_requests_total", {"cache": i, "result": "miss"},
+                   j["misses"])
+
+        metric("last_run_timestamp_seconds", "gauge",
+               "When the metrics were written.")
+        lines.append(f"discordmovies_last_run_timestamp_seconds "
+                     f"{time.time()}")
+
+        Utils.atomic_write(path, "\n".join(lines) + "\n")
+
+
+# A single instance shared by the whole package.
+metrics = Metrics()
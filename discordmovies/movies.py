@@ -1,8 +1,10 @@
-from tqdm import tqdm
 from discordmovies.exceptions import MovieIdentityError
+from discordmovies.links import as_registry
+from discordmovies.searchindex import SearchIndex
 from discordmovies.utils import Utils
-from typing import Union, List, Dict
+from typing import Callable, Union, List, Dict, Iterable
 import copy
+import time
 
 
 class MovieCategories:
@@ -85,6 +87,11 @@ class Movie(MovieCategories):
                  exclude_categories: List[str] = None):
         super().__init__(categories=categories,
                          exclude_categories=exclude_categories)
+        # The search indexes of the lists the movie is in, which are told
+        # when its values change.
+        self.indexes: List[SearchIndex] = []
+        # Other titles of the movie, found with its metadata.
+        self.aliases: List[str] = []
         self.info = {}
         for i in self.categories:
             self.info[i] = "None"
@@ -105,6 +112,14 @@ class Movie(MovieCategories):
         if key not in self.categories:
             return False
         self.info[key] = value
+        for i in self.indexes:
+            i.update(self, key)
+
+    def __getstate__(self) -> dict:
+        # Copies aren't in the lists the original is in.
+        state = self.__dict__.copy()
+        state["indexes"] = []
+        return state
 
     def items(self):
         return self.info.items()
@@ -134,14 +149,17 @@ class Movie(MovieCategories):
         Format an attribute so that it displays nicely in Google Sheets as an
         image. Can accept multiple attributes in the form of a list. The
         attribute should be a link to an image. By default, edits
-        the "Poster" attribute.
+        the "Poster" attribute. Empty attributes, such as posters that
+        couldn't be found, are left empty.
         """
 
         if isinstance(attribute, list):
             for i in attribute:
-                self[i] = f'=IMAGE("{self[i]}")'
+                if self[i]:
+                    self[i] = f'=IMAGE("{self[i]}")'
         elif isinstance(attribute, str):
-            self[attribute] = f'=IMAGE("{self[attribute]}")'
+            if self[attribute]:
+                self[attribute] = f'=IMAGE("{self[attribute]}")'
         else:
             raise TypeError("Variable 'attribute' must be of type 'list' or "
                             "'str'.")
@@ -161,6 +179,9 @@ class MovieList(MovieCategories):
             self.movies = list()
         else:
             self.movies = list(items)
+        # Search indexes by attribute, built the first time an attribute is
+        # searched and kept up to date from then on.
+        self.indexes: Dict[str, SearchIndex] = {}
 
     def __getitem__(self, item: int) -> Movie:
         return self.movies[item]
@@ -168,12 +189,29 @@ class MovieList(MovieCategories):
     def __bool__(self) -> bool:
         return bool(self.movies)
 
-    def __delitem__(self, key: int):
+    def __delitem__(self, key: Union[int, slice]):
+        removed = self.movies[key]
         del self.movies[key]
+        self.unindex(removed if isinstance(key, slice) else [removed])
 
     def __len__(self):
         return len(self.movies)
 
+    def __getstate__(self) -> dict:
+        # Copies build their own indexes when they are searched.
+        state = self.__dict__.copy()
+        state["indexes"] = {}
+        return state
+
+    def unindex(self, movies: Iterable[Movie]):
+        """
+        Remove movies that are no longer in the list from the search indexes.
+        """
+
+        for i in self.indexes.values():
+            for j in movies:
+                i.remove(j)
+
     @staticmethod
     def check_movie(item) -> bool:
         """
@@ -192,6 +230,8 @@ class MovieList(MovieCategories):
             raise TypeError("Item must be a Movie object.")
 
         self.movies.append(item)
+        for i in self.indexes.values():
+            i.add(item)
 
     def append_with_metadata(self, item: Movie, omdb_api_key: str):
         """
@@ -203,7 +243,7 @@ class MovieList(MovieCategories):
 
         try:
             item.fill_metadata(omdb_api_key)
-            self.movies.append(item)
+            self.append(item)
 
         except MovieIdentityError:
             print(f"cannot insert {item['Link']}, getting metadata failed, "
@@ -211,16 +251,23 @@ class MovieList(MovieCategories):
 
     def remove(self, movie: Movie):
         self.movies.remove(movie)
+        self.unindex([movie])
 
-    def search(self, value: str, attribute: str) -> list:
+    def search(self, value: str, attribute: str, prefix: bool = False,
+               ignore_case: bool = False) -> List[Movie]:
         """
         Search for a movie based on the value of an attribute. For example,
         with attribute = "Title" and value = "Joker", will return a list with
         the movie Joker if it is in the list.
 
-        Partial matches are also returned.
+        Partial matches are also returned. With prefix, only movies where a
+        line of the attribute starts with value are, so "Jok" finds Joker
+        but "oker" doesn't. With ignore_case, case is ignored.
 
-        This method hasn't really been tested, so it may be buggy.
+        The first search of an attribute indexes it, which takes about as
+        long as checking every movie. The index is kept up to date as the
+        list changes, so later searches only check the movies that share
+        every trigram with value.
         """
 
         if not self.movies:
@@ -229,12 +276,21 @@ class MovieList(MovieCategories):
         if attribute not in self.movies[0].get_categories():
             raise AttributeError("Attribute not found!")
 
-        matches = []
-        for i in self.movies:
-            if value in i[attribute]:
-                matches.append(i)
+        if attribute not in self.indexes:
+            self.indexes[attribute] = SearchIndex(attribute, self.movies)
 
-        return matches
+        return self.indexes[attribute].search(value, prefix=prefix,
+                                              ignore_case=ignore_case)
+
+    def columns(self):
+        """
+        A typed, columnar copy of the list for filtering and sorting with
+        NumPy, see columns.MovieColumns.
+        """
+
+        from discordmovies.columns import MovieColumns
+
+        return MovieColumns(self)
 
     def get_movies_list(self, attributes_key: bool = True,
                         attributes: Union[str, List[str]] = None,
@@ -275,18 +331,74 @@ class MovieList(MovieCategories):
 
         return movies_list
 
-    def fill_all_metadata(self, tmdb_api_key: str):
+    def fill_all_metadata(self, tmdb_api_key: str, deadline: float = None,
+                          checkpoint: "MetadataCheckpoint" = None,
+                          flush: Callable[[List[Movie]], None] = None,
+                          flush_every: int = None,
+                          flush_interval: float = None):
         """
-        Fill metadata for all movies in list.
+        Fill metadata for all movies in list, in order.
+
+        Movies that aren't reached by deadline, a time.monotonic() value, are
+        removed from the list, so they are left for the next run. With
+        checkpoint, results are saved to it as they come in, and results
+        saved by an earlier run that didn't get to write them are used
+        instead of looking the movies up again, see MetadataCheckpoint.
+
+        With flush, movies are handed to it in batches as they are filled,
+        once flush_every of them are ready or flush_interval seconds after
+        the last batch, so they can be written while the rest are looked up.
+        Movies that are ready when the list is done are left to the caller.
         """
         failures = []
+        deferred = 0
+        ready = []
+        flushed = time.monotonic()
         if self:
-            for i in tqdm(self, unit=" movies",
-                          desc="gathering metadata"):
-                try:
-                    i.fill_metadata(omdb_api_key=tmdb_api_key)
-                except MovieIdentityError:
-                    failures.append(i)
+            from tqdm import tqdm
+
+            try:
+                for n, i in enumerate(tqdm(self, unit=" movies",
+                                           desc="gathering metadata")):
+                    if deadline is not None and time.monotonic() >= deadline:
+                        deferred = len(self) - n
+                        break
+
+                    saved = checkpoint.get(i["Link"]) \
+                        if checkpoint is not None else False
+                    if saved is None:
+                        failures.append(i)
+                    elif saved:
+                        for j, k in saved.items():
+                            i[j] = k
+                        ready.append(i)
+                    else:
+                        try:
+                            i.fill_metadata(omdb_api_key=tmdb_api_key)
+                        except MovieIdentityError:
+                            failures.append(i)
+                            if checkpoint is not None:
+                                checkpoint.set(i["Link"], None)
+                        else:
+                            if checkpoint is not None:
+                                checkpoint.set(i["Link"], i)
+                            ready.append(i)
+
+                    if flush is not None and ready and (
+                            flush_every and len(ready) >= flush_every or
+                            flush_interval is not None and
+                            time.monotonic() - flushed >= flush_interval):
+                        flush(ready)
+                        ready = []
+                        flushed = time.monotonic()
+            finally:
+                if checkpoint is not None:
+                    checkpoint.save()
+
+            if deferred:
+                print(f"Ran out of time, {deferred} movies are left for the "
+                      f"next run.")
+                del self[-deferred:]
 
             if len(failures) > 0:
                 print("The following movies were not found:")
@@ -325,6 +437,42 @@ class MovieList(MovieCategories):
 
         duplicates = Utils().check_duplicates(attributes)
 
+        self.merge_groups(groups=duplicates.values(), ignore=ignore)
+
+    def merge_similar(self, threshold: float = None,
+                      ignore: List[str] = None):
+        """
+        Like merge_duplicates by title, but also merges movies whose titles
+        only look alike, such as the same film linked from IMDB and MAL, see
+        dedupe.find_duplicates. threshold is how alike titles have to be,
+        from 0 to 1, and defaults to dedupe.THRESHOLD. Only the aliases of
+        the movies in this list are used.
+        """
+
+        from discordmovies.dedupe import AliasRegistry, find_duplicates
+
+        aliases = AliasRegistry()
+        for i in self:
+            aliases.add(i.aliases)
+
+        if ignore is None:
+            ignore = self.get_categories()
+            ignore.remove('Link')
+
+        groups = find_duplicates(
+            [(i["Title"], i.info.get("Release Date", ""),
+              i.info.get("ID", "")) for i in self], threshold=threshold,
+            aliases=aliases)
+
+        self.merge_groups(groups=groups, ignore=ignore)
+
+    def merge_groups(self, groups: Iterable[List[int]], ignore: List[str]):
+        """
+        Merge each group of movies, given as indexes, into the first movie
+        of the group. Attributes in ignore are taken from that movie, others
+        are combined.
+        """
+
         categories = self.get_categories()
 
         for i in ignore:
@@ -337,11 +485,10 @@ class MovieList(MovieCategories):
         # Iterate through the duplicates and merge them into one entry.
         # Duplicates don't get deleted here, because it would mess up the
         # indexing.
-        for i in duplicates:
-            if len(duplicates[i]) > 1:
-                minimum_dupe = min(duplicates[i])
-                dupes_minus_min = [n for n in duplicates[i] if n != min(
-                    duplicates[i])]
+        for i in groups:
+            if len(i) > 1:
+                minimum_dupe = min(i)
+                dupes_minus_min = [n for n in i if n != minimum_dupe]
                 removal_list += dupes_minus_min
 
                 for j in dupes_minus_min:
@@ -391,16 +538,32 @@ class MovieList(MovieCategories):
                     removal_list.append(i)
                     break
 
-        [self.movies.remove(i) for i in removal_list]
+        [self.remove(i) for i in removal_list]
+
+    def remove_links(self, links: Iterable[str]):
+        """
+        Remove all movies with a link that is in links. Unlike
+        remove_by_attribute_value, links are compared as whole links rather
+        than substrings, so this takes linear time.
+        """
+
+        links = as_registry(links)
+        kept = []
+        removed = []
+        for i in self.movies:
+            (removed if links.matches(i["Link"]) else kept).append(i)
+        self.movies = kept
+        self.unindex(removed)
 
-    def mark_watched(self, watched_links: List[str]):
+    def mark_watched(self, watched_links: Iterable[str]):
         """
         Marks movies as watched if they can be found on a list of links, and
         not watched if they cannot be found.
         """
 
+        watched_links = as_registry(watched_links)
         for i in self:
-            if any(j in i["Link"] for j in watched_links):
+            if watched_links.matches(i["Link"]):
                 i["Watched"] = "True"
             else:
                 i["Watched"] = "False"
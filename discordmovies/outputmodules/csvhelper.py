@@ -1,7 +1,11 @@
 import csv
 import os
-from typing import List
+from typing import Iterable, List
 from discordmovies.attributes import DiscordMoviesAttributes
+from discordmovies.links import LinkRegistry, as_registry
+from discordmovies.movies import MovieList
+from discordmovies.report import Report
+from discordmovies.utils import Utils
 
 
 class CsvHelper:
@@ -29,9 +33,10 @@ class CsvHelper:
             return True
         return False
 
-    def get_values(self) -> List[List[str]]:
+    def get_values(self, force_recalc: bool = True) -> List[List[str]]:
         """
-        Get the contents of the CSV file.
+        Get the contents of the CSV file. The file is always read again,
+        force_recalc is only here to match SheetsHelper.
         """
         if not self.exists():
             return []
@@ -39,17 +44,39 @@ class CsvHelper:
             reader = csv.reader(f)
             return list(reader)
 
-    def write_existing(self, overwrite: bool):
+    @staticmethod
+    def get_archived_links() -> LinkRegistry:
+        """
+        CSV files keep all movies together, so none are archived.
+        """
+
+        return LinkRegistry()
+
+    @staticmethod
+    def get_archived_values() -> List[List[str]]:
+        return []
+
+    def write_existing(self, overwrite: bool = False):
         """
-        Write to an existing CSV file. The file will be overwritten.
+        Write to an existing CSV file. New movies are added after the rows
+        already in it, the watched column of those rows is updated and rows
+        of movies that aren't suggested anymore are removed.
+
+        With overwrite, which is needed when the file's columns don't match
+        the current ones, the file only holds the movies being written.
         """
-        # Overwrite is a variable, but it does nothing at the moment. It's here
-        # mainly as a placeholder. Perhaps it could be used in the future.
+
+        if overwrite:
+            self.write_new()
+            return
 
         values = self.attributes["movie_list"].get_movies_list(
-            format_images=False)
+            attributes_key=False, format_images=False)
 
         file_contents = self.get_values()
+        if not file_contents:
+            file_contents.append(
+                self.attributes["movie_list"].get_categories())
         file_contents.extend(values)
         if "Watched" in self.attributes["movie_list"].get_categories():
             watched_index = self.attributes["movie_list"].get_cat_indexes()[
@@ -62,8 +89,7 @@ class CsvHelper:
             for k, i in enumerate(file_contents):
                 if k == 0:
                     continue
-                if any([j in i[link_index] for j in
-                        self.attributes["watched_links"]]):
+                if self.attributes["watched_links"].matches(i[link_index]):
                     # My IDE is complaining to me about watched_index here. IDK
                     # what's wrong, perhaps something with type hints somewhere?
                     i[watched_index] = True
@@ -71,14 +97,13 @@ class CsvHelper:
                 else:
                     i[watched_index] = False
 
-                if not any([j in i[link_index] for j in
-                            self.attributes["links"]]):
+                if not self.attributes["links"].matches(i[link_index]):
                     removal_list.append(k)
 
             if removal_list:
                 removal_list.reverse()
                 for i in removal_list:
-                    del self.attributes["movie_list"][i]
+                    del file_contents[i]
 
         self.write_new(values=file_contents)
 
@@ -96,3 +121,64 @@ class CsvHelper:
 
             for i in values:
                 writer.writerow(i)
+
+    def report_name(self) -> str:
+        return self.name[:-len(".csv")] + "-report.json"
+
+    def write_report(self, report: Report):
+        """
+        Write a report to a JSON file next to the CSV file, such as
+        DiscordMovies-report.json.
+        """
+
+        Utils.atomic_write(self.report_name(), report.to_json())
+
+    def append_movies(self, movie_list: MovieList):
+        """
+        Append movies to the CSV file. A header is written first if the file
+        is new.
+        """
+
+        values = movie_list.get_movies_list(attributes_key=not self.exists(),
+                                            format_images=False)
+
+        with open(self.name, "a", newline="") as f:
+            writer = csv.writer(f)
+
+            for i in values:
+                writer.writerow(i)
+
+    def remove_links(self, links: Iterable[str]):
+        """
+        Remove rows whose link matches any of the given links.
+        """
+
+        links = as_registry(links)
+        link_index = self.attributes["movie_list"].get_cat_indexes()["Link"]
+        file_contents = self.get_values()
+
+        self.write_new(values=file_contents[:1] + [
+            i for i in file_contents[1:]
+            if not links.matches(i[link_index])])
+
+    def mark_watched(self, links: Iterable[str], watched: bool = True):
+        """
+        Set the watched column of rows whose link matches any of the given
+        links.
+        """
+
+        if "Watched" not in self.attributes["movie_list"].get_categories():
+            print("Watched column not found, watched movies not updated.")
+            return
+
+        links = as_registry(links)
+        watched_index = self.attributes["movie_list"].get_cat_indexes()[
+            "Watched"]
+        link_index = self.attributes["movie_list"].get_cat_indexes()["Link"]
+        file_contents = self.get_values()
+
+        for i in file_contents[1:]:
+            if links.matches(i[link_index]):
+                i[watched_index] = str(watched)
+
+        self.write_new(values=file_contents)
@@ -1,5 +1,8 @@
 from discordmovies.attributes import DiscordMoviesAttributes
-from typing import List
+from discordmovies.links import LinkRegistry
+from discordmovies.movies import MovieList
+from discordmovies.report import Report
+from typing import Iterable, List
 
 
 class FileHelper:
@@ -8,14 +11,15 @@ class FileHelper:
     """
 
     def __init__(self, filetype: str, attributes: DiscordMoviesAttributes,
-                 sheet_id: str = None, reformat_sheet: bool = None):
+                 sheet_id: str = None, reformat_sheet: bool = None,
+                 shard: str = None):
         self.filetype = filetype
         if self.filetype == "sheet":
             from discordmovies.outputmodules.sheetshelper import SheetsHelper
 
             self.helper = SheetsHelper(attributes=attributes,
                                        spreadsheet_id=sheet_id,
-                                       reformat=reformat_sheet)
+                                       reformat=reformat_sheet, shard=shard)
 
         elif self.filetype == "csv":
             from discordmovies.outputmodules.csvhelper import CsvHelper
@@ -38,12 +42,29 @@ class FileHelper:
 
         return self.helper.exists()
 
-    def get_values(self) -> List[List[str]]:
+    def get_values(self, force_recalc: bool = False) -> List[List[str]]:
         """
-        Get all values from the file.
+        Get all values from the file. Some helpers cache the values, in which
+        case force_recalc reads them again.
         """
 
-        return self.helper.get_values()
+        return self.helper.get_values(force_recalc=force_recalc)
+
+    def get_archived_links(self) -> LinkRegistry:
+        """
+        The links of movies kept apart from the rest of the file, such as
+        the tabs sheets move watched movies to, see SheetsHelper.shard_sheet.
+        """
+
+        return self.helper.get_archived_links()
+
+    def get_archived_values(self) -> List[List[str]]:
+        """
+        The rows of the movies kept apart from the rest of the file, without
+        headers.
+        """
+
+        return self.helper.get_archived_values()
 
     def write_existing(self, overwrite: bool = False):
         """
@@ -60,3 +81,38 @@ class FileHelper:
         """
 
         self.helper.write_new()
+
+    def write_report(self) -> Report:
+        """
+        Work out statistics about the movies in the file, see Report, and
+        write them alongside it. Returns the report.
+        """
+
+        report = Report.from_values(self.get_values() +
+                                    self.get_archived_values())
+        self.helper.write_report(report)
+
+        return report
+
+    def append_movies(self, movie_list: MovieList):
+        """
+        Add movies to the end of the file, creating it if needed. Used to
+        apply changes one at a time, without rewriting the rest of the file.
+        """
+
+        self.helper.append_movies(movie_list=movie_list)
+
+    def remove_links(self, links: Iterable[str]):
+        """
+        Remove the rows of movies with any of the given links.
+        """
+
+        self.helper.remove_links(links=links)
+
+    def mark_watched(self, links: Iterable[str], watched: bool = True):
+        """
+        Mark the rows of movies with any of the given links as watched, or as
+        not watched. Other rows are left alone.
+        """
+
+        self.helper.mark_watched(links=links, watched=watched)
@@ -1 +1,2 @@
+from .builder import *
 from .sheetsutils import *
@@ -0,0 +1,259 @@
+import datetime
+import re
+from typing import List, Tuple, Union
+
+NUMBER = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+# ISO dates and times, like the suggestion dates from Discord. Sheets keeps
+# the time of day and leaves off the zone.
+DATE = re.compile(r"(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}):(\d{2})"
+                  r"(?::(\d{2}(?:\.\d+)?))?)?(?:Z|[+-]\d{2}:?\d{2})?")
+
+# Sheets stores dates as the days since this one.
+EPOCH = datetime.datetime(1899, 12, 30)
+
+NUMBER_FORMATS = {
+    "DATE": {"type": "DATE", "pattern": "yyyy-mm-dd"},
+    "DATE_TIME": {"type": "DATE_TIME", "pattern": "yyyy-mm-dd hh:mm:ss"}
+}
+
+
+class SpreadsheetBuilder:
+    """
+    Collects the contents and formatting of a new spreadsheet, and compiles
+    them into the body of a single spreadsheets.create request. This replaces
+    creating an empty sheet, formatting it and then filling it, which takes a
+    request for each step.
+
+    The grid is made as large as the rows given, rows added later extend it.
+    The formatting can also be compiled into batchUpdate requests, to apply
+    it to a sheet that already exists.
+    """
+
+    def __init__(self, title: str = None):
+        self.title = title
+        self.rows: List[List[str]] = []
+        self.row_heights: List[Tuple[int, int, int]] = []
+        self.cell_format = None
+        self.frozen_rows = None
+
+    def set_values(self, rows: List[List[str]]):
+        self.rows = rows
+
+    def set_row_height(self, height: int, start_row: int = None,
+                       end_row: int = None):
+        """
+        Set the height of the rows between start_row and end_row, all rows if
+        they aren't given. Later calls take precedence over earlier ones,
+        like separate requests would.
+        """
+
+        self.row_heights.append((height, start_row, end_row))
+
+    def set_alignment(self, hor_alignment: str = "CENTER",
+                      ver_alignment: str = "MIDDLE", wrap: str = "WRAP"):
+        self.cell_format = {
+            "verticalAlignment": ver_alignment,
+            "horizontalAlignment": hor_alignment,
+            "wrapStrategy": wrap
+        }
+
+    def freeze_rows(self, rows: int = 1):
+        self.frozen_rows = rows
+
+    @staticmethod
+    def date_value(value: str) -> Union[Tuple[float, str], None]:
+        """
+        The serial number of an ISO date or time, and the type of number
+        format Sheets shows it with. None if value isn't a date.
+        """
+
+        match = DATE.fullmatch(value.strip())
+        if not match:
+            return None
+
+        try:
+            date = datetime.datetime.strptime(match.group(1), "%Y-%m-%d")
+        except ValueError:
+            return None
+
+        if match.group(2) is None:
+            return (date - EPOCH).days, "DATE"
+
+        date += datetime.timedelta(hours=int(match.group(2)),
+                                   minutes=int(match.group(3)),
+                                   seconds=float(match.group(4) or 0))
+        delta = date - EPOCH
+        return delta.days + (delta.seconds + delta.microseconds / 1e6) / \
+            86400, "DATE_TIME"
+
+    @staticmethod
+    def cell_value(value: Union[str, int, float, bool]) -> dict:
+        """
+        The value a cell gets when value is written with the USER_ENTERED
+        input option, which cells created with the spreadsheet don't support.
+        Dates become serial numbers, which need the number format from
+        number_format to show as dates.
+        """
+
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, (int, float)):
+            return {"numberValue": value}
+
+        value = str(value)
+        if value.startswith("="):
+            return {"formulaValue": value}
+        if value.startswith("'"):
+            return {"stringValue": value[1:]}
+        if value.upper() in ["TRUE", "FALSE"]:
+            return {"boolValue": value.upper() == "TRUE"}
+        if NUMBER.fullmatch(value.strip()):
+            if value.strip().lstrip("+-").isdigit():
+                return {"numberValue": int(value)}
+            return {"numberValue": float(value)}
+        date = SpreadsheetBuilder.date_value(value)
+        if date is not None:
+            return {"numberValue": date[0]}
+
+        return {"stringValue": value}
+
+    @staticmethod
+    def number_format(value) -> Union[dict, None]:
+        """
+        The number format Sheets gives a cell when value is written with the
+        USER_ENTERED input option, for dates. None for other values.
+        """
+
+        if not isinstance(value, str) or value.startswith(("'", "=")):
+            return None
+
+        date = SpreadsheetBuilder.date_value(value)
+        return NUMBER_FORMATS[date[1]] if date is not None else None
+
+    def row_count(self) -> int:
+        # Sheets doesn't allow every row to be frozen.
+        return max(len(self.rows), (self.frozen_rows or 0) + 1)
+
+    def column_count(self) -> int:
+        return max([len(i) for i in self.rows] + [1])
+
+    def row_height(self, row: int) -> Union[int, None]:
+        height = None
+        for i, start, end in self.row_heights:
+            if (start is None or row >= start) and (end is None or row < end):
+                height = i
+
+        return height
+
+    def cell(self, value) -> dict:
+        cell = {}
+        if value != "":
+            cell["userEnteredValue"] = self.cell_value(value)
+        if self.cell_format is not None:
+            cell["userEnteredFormat"] = dict(self.cell_format)
+        number_format = self.number_format(value)
+        if number_format is not None:
+            cell.setdefault("userEnteredFormat", {})["numberFormat"] = \
+                number_format
+
+        return cell
+
+    def build(self) -> dict:
+        """
+        The body of the spreadsheets.create request.
+        """
+
+        row_count = self.row_count()
+        column_count = self.column_count()
+
+        row_data = []
+        for i in range(row_count):
+            row = self.rows[i] if i < len(self.rows) else []
+            row = list(row) + [""] * (column_count - len(row))
+            row_data.append({"values": [self.cell(j) for j in row]})
+
+        row_metadata = []
+        for i in range(row_count):
+            height = self.row_height(i)
+            row_metadata.append({} if height is None else
+                                {"pixelSize": height})
+
+        return {
+            "properties": {
+                "title": self.title
+            },
+            "sheets": [
+                {
+                    "properties": {
+                        "gridProperties": {
+                            "rowCount": row_count,
+                            "columnCount": column_count,
+                            "frozenRowCount": self.frozen_rows or 0
+                        }
+                    },
+                    "data": [
+                        {
+                            "startRow": 0,
+                            "startColumn": 0,
+                            "rowData": row_data,
+                            "rowMetadata": row_metadata
+                        }
+                    ]
+                }
+            ]
+        }
+
+    def format_requests(self, sheet_id: int = None) -> List[dict]:
+        """
+        The formatting as batchUpdate requests for the tab with sheet_id of
+        an existing spreadsheet, the first one by default. Rows and columns
+        are not limited to the grid built here, so the whole tab is
+        formatted.
+        """
+
+        tab = {} if sheet_id is None else {"sheetId": sheet_id}
+        requests = []
+        for height, start, end in self.row_heights:
+            span = {"dimension": "ROWS", **tab}
+            if start is not None:
+                span["startIndex"] = start
+            if end is not None:
+                span["endIndex"] = end
+            requests.append({
+                "updateDimensionProperties": {
+                    "range": span,
+                    "properties": {
+                        "pixelSize": height
+                    },
+                    "fields": "pixelSize"
+                }
+            })
+
+        if self.cell_format is not None:
+            requests.append({
+                "repeatCell": {
+                    "cell": {
+                        "userEnteredFormat": self.cell_format
+                    },
+                    "range": dict(tab),
+                    # Leave the number formats of dates alone.
+                    "fields": "userEnteredFormat("
+                              f"{','.join(self.cell_format)})"
+                }
+            })
+
+        if self.frozen_rows is not None:
+            requests.append({
+                "updateSheetProperties": {
+                    "properties": {
+                        **tab,
+                        "gridProperties": {
+                            "frozenRowCount": self.frozen_rows
+                        }
+                    },
+                    "fields": "gridProperties.frozenRowCount"
+                }
+            })
+
+        return requests
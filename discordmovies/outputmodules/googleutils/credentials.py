@@ -1,11 +1,6 @@
 import json
 import os.path
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.exceptions import RefreshError
-
 
 class Creds:
     """
@@ -24,6 +19,8 @@ class Creds:
         the user and raises a ValueError. If they are valid returns True.
         """
 
+        from google.oauth2.credentials import Credentials
+
         if not self.creds:
             if os.path.exists('token.json'):
                 creds = Credentials.from_authorized_user_file('token.json',
@@ -66,6 +63,11 @@ class Creds:
         credentials.json is not found, a FileNotFoundError is raised.
         """
 
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.exceptions import RefreshError
+
         if os.path.exists('token.json'):
             self.creds = Credentials.from_authorized_user_file('token.json',
                                                                self.SCOPES)
@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from discordmovies.metrics import metrics
+
+# Sheets allows 60 read and 60 write requests a minute per user. 0 turns
+# pacing off, for example against the stand-in server.
+READS_PER_MINUTE = int(os.environ.get("SHEETS_READS_PER_MINUTE", 60))
+WRITES_PER_MINUTE = int(os.environ.get("SHEETS_WRITES_PER_MINUTE", 60))
+
+READ_ENDPOINTS = ["values.get", "values.batchGet", "spreadsheets.get"]
+
+# Sending these twice has a different result than sending them once, so
+# they are only retried when the API says it didn't handle them. A 5xx
+# doesn't say whether a request was applied, and batchUpdates remove and
+# move rows by index, so sending one again would change other rows.
+NOT_IDEMPOTENT = ["values.append", "spreadsheets.create",
+                  "spreadsheets.batchUpdate"]
+
+
+class QuotaScheduler:
+    """
+    Every request to the Sheets API goes through here. Reads and writes are
+    counted over a sliding window, and requests wait before they would go
+    over the quota instead of being rejected. Requests that are rate limited
+    or fail on Google's side anyway are retried with jittered exponential
+    backoff. Time spent waiting is recorded in the metrics as sleep time for
+    "sheets".
+    """
+
+    def __init__(self, reads_per_minute: int = READS_PER_MINUTE,
+                 writes_per_minute: int = WRITES_PER_MINUTE,
+                 window: float = 60.0, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 64.0):
+        self.limits = {"read": reads_per_minute, "write": writes_per_minute}
+        self.window = window
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        # When each request in the window was, or will be, sent.
+        self.sent = {"read": deque(), "write": deque()}
+
+    @staticmethod
+    def kind(endpoint: str) -> str:
+        return "read" if endpoint in READ_ENDPOINTS else "write"
+
+    def reserve(self, kind: str) -> float:
+        """
+        Reserve a place in the window. Returns how many seconds to wait
+        before sending the request.
+        """
+
+        limit = self.limits[kind]
+        if not limit:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            sent = self.sent[kind]
+            while sent and sent[0] <= now - self.window:
+                sent.popleft()
+
+            start = now
+            if len(sent) >= limit:
+                # The request can go once the one limit requests earlier
+                # leaves the window.
+                start = max(now, sent[-limit] + self.window)
+            sent.append(start)
+
+            return start - now
+
+    def wait(self, seconds: float):
+        if seconds > 0:
+            metrics.record_sleep("sheets", seconds)
+            time.sleep(seconds)
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """
+        How long to wait before the given retry, the server's Retry-After if
+        it sent one.
+        """
+
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** attempt))
+
+    def should_retry(self, endpoint: str, status: int) -> bool:
+        if status == 429:
+            return True
+        return status >= 500 and endpoint not in NOT_IDEMPOTENT
+
+    def execute(self, request, endpoint: str):
+        """
+        Execute a request built with a Sheets service, recording every
+        attempt in the metrics under the given endpoint name.
+        """
+
+        import googleapiclient.errors
+
+        kind = self.kind(endpoint)
+        attempt = 0
+        while True:
+            self.wait(self.reserve(kind))
+
+            start = time.perf_counter()
+            try:
+                result = request.execute()
+            except googleapiclient.errors.HttpError as e:
+                status = e.resp.status
+                metrics.record_request("sheets", endpoint, status,
+                                       time.perf_counter() - start)
+                if attempt >= self.max_retries or \
+                        not self.should_retry(endpoint, status):
+                    raise
+
+                retry_after = e.resp.get("retry-after")
+                try:
+                    retry_after = float(retry_after)
+                except (TypeError, ValueError):
+                    retry_after = None
+                # Rather than hang for a long time, let the run fail and be
+                # picked up by the next one.
+                if retry_after is not None and retry_after > self.max_delay:
+                    raise
+
+                self.wait(self.backoff(attempt, retry_after))
+                attempt += 1
+                continue
+
+            metrics.record_request("sheets", endpoint, 200,
+                                   time.perf_counter() - start)
+
+            return result
+
+
+# A single instance shared by the whole package, the quota is per user
+# rather than per sheet.
+scheduler = QuotaScheduler()
@@ -1,7 +1,35 @@
-import googleapiclient.errors
-from googleapiclient.discovery import build
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .credentials import Creds
-from typing import List, Tuple
+from . import quota
+from .builder import SpreadsheetBuilder
+from discordmovies.metrics import metrics
+from discordmovies.utils import Utils
+from typing import Dict, Iterable, List, Tuple, Union
+
+# Only set when talking to something other than the real Sheets API, for
+# example the stand-in server in benchmarks/stubserver.py.
+SHEETS_API_URL = os.environ.get("GOOGLE_SHEETS_API_URL")
+
+# Credentials are loaded once per process. Services aren't safe to share
+# between threads, so each thread builds its own and keeps it.
+shared_creds = None
+creds_lock = threading.Lock()
+services = threading.local()
+
+# Large uploads are split into chunks of at most this many rows and roughly
+# this many bytes, well below the API's request size limit, and up to
+# UPLOAD_WORKERS chunks are sent at once.
+CHUNK_ROWS = 500
+CHUNK_BYTES = 1000000
+UPLOAD_WORKERS = 4
+
+# Created when first needed and kept, so its threads keep their services.
+upload_pool = None
+upload_pool_lock = threading.Lock()
 
 
 class DocsHandler:
@@ -26,21 +54,66 @@ class DocsHandler:
     def setup_docs(self):
         """
         Attempts to set up variables necessary for the functioning of the class.
+        The credentials and service are reused if another DocsHandler has
+        already set them up.
         """
 
-        self.creds.setup_creds()
-        self.creds.check_creds()
-        self.service = build("sheets", "v4", credentials=self.creds.creds)
+        global shared_creds
+
+        with creds_lock:
+            if shared_creds is None:
+                self.creds.setup_creds()
+                self.creds.check_creds()
+                shared_creds = self.creds
+            self.creds = shared_creds
+
+        self.service = self.get_service()
+
+    def get_service(self):
+        """
+        The service for the current thread, built the first time a thread
+        asks for it.
+        """
+
+        service = getattr(services, "service", None)
+        if service is None:
+            from googleapiclient.discovery import build
+
+            client_options = None
+            if SHEETS_API_URL:
+                client_options = {"api_endpoint": SHEETS_API_URL}
+
+            service = build("sheets", "v4", credentials=self.creds.creds,
+                            client_options=client_options)
+            services.service = service
+
+        return service
 
     def get_doc_contents(self) -> dict:
         """
         Get all contents from a spreadsheet in the form of a dictionary.
         """
 
-        return self.service.spreadsheets().values().get(
+        return self.execute(self.service.spreadsheets().values().get(
             spreadsheetId=self.spreadsheet_id, range="A:Z",
             valueRenderOption="FORMULA"
-        ).execute()
+        ), "values.get")
+
+    def get_ranges(self, ranges: List[str]) -> List[List[List[str]]]:
+        """
+        Get the values of several ranges in a single request, rendered like
+        get_doc_contents. Ranges without values give empty lists.
+        """
+
+        if not ranges:
+            return []
+
+        result = self.execute(self.service.spreadsheets().values().batchGet(
+            spreadsheetId=self.spreadsheet_id, ranges=ranges,
+            valueRenderOption="FORMULA"
+        ), "values.batchGet")
+
+        return [i.get("values", []) for i in result.get("valueRanges", [])]
 
     def create_sheet(self, title: str):
         """
@@ -53,9 +126,21 @@ class DocsHandler:
                 'title': title
             }
         }
-        spreadsheet = self.service.spreadsheets().create(body=spreadsheet,
-                                                         fields='spreadsheetId'
-                                                         ).execute()
+        spreadsheet = self.execute(self.service.spreadsheets().create(
+            body=spreadsheet, fields='spreadsheetId'), "spreadsheets.create")
+        self.spreadsheet_id = spreadsheet.get('spreadsheetId')
+
+        print('Spreadsheet created successfully.')
+
+    def create_spreadsheet(self, builder: SpreadsheetBuilder):
+        """
+        Create a sheet with the contents and formatting collected by a
+        builder in a single request. Also updates the spreadsheet id.
+        """
+
+        spreadsheet = self.execute(self.service.spreadsheets().create(
+            body=builder.build(), fields='spreadsheetId'),
+            "spreadsheets.create")
         self.spreadsheet_id = spreadsheet.get('spreadsheetId')
 
         print('Spreadsheet created successfully.')
@@ -63,9 +148,21 @@ class DocsHandler:
     def fill_sheet(self, inputs: List[List[str]]):
         """
         Inserts contents into the body of a sheet. Input should be a list
-        of lists with each list being a row.
+        of lists with each list being a row. Large inputs are uploaded in
+        chunks, see upload_chunks.
         """
 
+        chunks = self.split_rows(inputs)
+        if len(chunks) > 1:
+            pending = {}
+            row = 0
+            for i in chunks:
+                pending[row] = i
+                row += len(i)
+            cells = self.upload_chunks(pending)
+            print('{0} cells updated '.format(cells))
+            return
+
         data = [
             {"range": "A:Z",
              "values": inputs}
@@ -74,8 +171,9 @@ class DocsHandler:
             'valueInputOption': "USER_ENTERED",
             'data': data
         }
-        result = self.service.spreadsheets().values().batchUpdate(
-            spreadsheetId=self.spreadsheet_id, body=body).execute()
+        request = self.service.spreadsheets().values().batchUpdate(
+            spreadsheetId=self.spreadsheet_id, body=body)
+        result = self.execute(request, "values.batchUpdate")
         print('{0} cells updated '.format(result.get('totalUpdatedCells')))
 
     def check_existence(self, sheet_id: str = None) -> bool:
@@ -90,9 +188,11 @@ class DocsHandler:
         if self.spreadsheet_id is None:
             return False
 
+        import googleapiclient.errors
+
         try:
-            self.service.spreadsheets().get(
-                spreadsheetId=sheet_id).execute()
+            self.execute(self.service.spreadsheets().get(
+                spreadsheetId=sheet_id), "spreadsheets.get")
         except googleapiclient.errors.HttpError:
             print("Sheet ID specified, but not found.")
             return False
@@ -100,19 +200,155 @@ class DocsHandler:
 
     def append_sheet(self, values: List[List[str]], quiet: bool = False):
         """
-        Append a list of values to a sheet.
+        Append a list of values to a sheet. Large lists are uploaded in
+        chunks: the first is appended to find where the rest go, and the rest
+        are sent with upload_chunks.
         """
 
+        chunks = self.split_rows(values)
         body = {
-            'values': values
+            'values': chunks[0] if chunks else values
         }
-        result = self.service.spreadsheets().values().append(
+        result = self.execute(self.service.spreadsheets().values().append(
             spreadsheetId=self.spreadsheet_id, range="A:Z",
-            valueInputOption="USER_ENTERED", body=body).execute()
+            valueInputOption="USER_ENTERED", body=body), "values.append")
+        cells = result.get('updates').get('updatedCells')
+
+        if len(chunks) > 1:
+            # The range written to ends with the last row appended.
+            updated = result.get('updates').get('updatedRange', "")
+            end = re.search(r"(\d+)$", updated)
+            pending = {}
+            row = int(end.group(1)) if end else None
+            for i in chunks[1:]:
+                if row is None:
+                    # Without knowing where the table ends the chunks have to
+                    # be appended one after the other.
+                    cells += self.execute(
+                        self.service.spreadsheets().values().append(
+                            spreadsheetId=self.spreadsheet_id, range="A:Z",
+                            valueInputOption="USER_ENTERED",
+                            body={'values': i}),
+                        "values.append").get('updates').get('updatedCells')
+                    continue
+                pending[row] = i
+                row += len(i)
+            cells += self.upload_chunks(pending)
+
         if not quiet:
-            print('{0} cells appended.'.format(result
-                                               .get('updates')
-                                               .get('updatedCells')))
+            print('{0} cells appended.'.format(cells))
+
+    @staticmethod
+    def split_rows(values: List[List[str]], max_rows: int = None,
+                   max_bytes: int = None) -> List[List[List[str]]]:
+        """
+        Split rows into chunks of at most max_rows rows and roughly max_bytes
+        bytes once encoded, CHUNK_ROWS and CHUNK_BYTES by default.
+        """
+
+        max_rows = max_rows or CHUNK_ROWS
+        max_bytes = max_bytes or CHUNK_BYTES
+        chunks = []
+        chunk = []
+        size = 0
+        for i in values:
+            row_size = len(json.dumps(i))
+            if chunk and (len(chunk) >= max_rows or
+                          size + row_size > max_bytes):
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+            chunk.append(i)
+            size += row_size
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
+    def progress_path(self) -> str:
+        return f".discordmovies-upload-{self.spreadsheet_id}.json"
+
+    def save_progress(self, pending: Dict[int, List[List[str]]]):
+        """
+        Record the chunks of an upload that haven't been confirmed yet, keyed
+        by the row they start at. The record is removed once there are none.
+        """
+
+        if pending:
+            Utils.atomic_write(self.progress_path(), json.dumps(
+                {"spreadsheet_id": self.spreadsheet_id,
+                 "pending": {str(i): j for i, j in pending.items()}}))
+        elif os.path.exists(self.progress_path()):
+            os.remove(self.progress_path())
+
+    def upload_chunks(self, pending: Dict[int, List[List[str]]]) -> int:
+        """
+        Write chunks of rows to the rows they are keyed by, several at a
+        time. Progress is recorded as chunks are confirmed, so if the upload
+        is interrupted resume_upload can send only the chunks that are
+        missing. If any chunk fails the first error is raised once the others
+        are done. Returns the amount of cells written.
+        """
+
+        global upload_pool
+
+        with upload_pool_lock:
+            if upload_pool is None:
+                upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+
+        pending = dict(pending)
+        lock = threading.Lock()
+        self.save_progress(pending)
+
+        def upload(row: int) -> int:
+            result = self.execute(
+                self.get_service().spreadsheets().values().update(
+                    spreadsheetId=self.spreadsheet_id, range=f"A{row + 1}",
+                    valueInputOption="USER_ENTERED",
+                    body={"values": pending[row]}),
+                "values.update")
+            with lock:
+                del pending[row]
+                self.save_progress(pending)
+
+            return result.get("updatedCells", 0)
+
+        with metrics.stage("upload_chunks"):
+            futures = [upload_pool.submit(upload, i) for i in list(pending)]
+            errors = [i.exception() for i in futures]
+
+        errors = [i for i in errors if i is not None]
+        if errors:
+            raise errors[0]
+
+        return sum(i.result() for i in futures)
+
+    def resume_upload(self) -> bool:
+        """
+        Send the rest of an upload to this spreadsheet that was interrupted.
+        Returns whether there was one.
+        """
+
+        if self.spreadsheet_id is None or \
+                not os.path.exists(self.progress_path()):
+            return False
+
+        import googleapiclient.errors
+
+        with open(self.progress_path()) as f:
+            pending = {int(i): j for i, j in
+                       json.load(f)["pending"].items()}
+
+        print(f"Resuming an interrupted upload of {len(pending)} chunks.")
+        try:
+            self.upload_chunks(pending)
+        except googleapiclient.errors.HttpError as e:
+            if e.resp.status != 404:
+                raise
+            print("The sheet of the interrupted upload no longer exists.")
+            self.save_progress({})
+
+        return True
 
     def adjust_row_height(self, height: int, start_row: int = None,
                           end_row: int = None):
@@ -142,9 +378,9 @@ class DocsHandler:
             'requests': requests
         }
 
-        self.service.spreadsheets().batchUpdate(
+        self.execute(self.service.spreadsheets().batchUpdate(
             spreadsheetId=self.spreadsheet_id,
-            body=body).execute()
+            body=body), "spreadsheets.batchUpdate")
 
     def set_alignment(self, hor_alignment: str = "CENTER",
                       ver_alignment: str = "MIDDLE", wrap: str = "WRAP"):
@@ -173,9 +409,9 @@ class DocsHandler:
             'requests': requests
         }
 
-        self.service.spreadsheets().batchUpdate(
+        self.execute(self.service.spreadsheets().batchUpdate(
             spreadsheetId=self.spreadsheet_id,
-            body=body).execute()
+            body=body), "spreadsheets.batchUpdate")
 
     def remove_row(self, start: int, stop: int):
         """
@@ -199,9 +435,163 @@ class DocsHandler:
             'requests': requests
         }
 
-        self.service.spreadsheets().batchUpdate(
+        self.execute(self.service.spreadsheets().batchUpdate(
             spreadsheetId=self.spreadsheet_id,
-            body=body).execute()
+            body=body), "spreadsheets.batchUpdate")
+
+    @staticmethod
+    def row_spans(rows: Iterable[int]) -> List[Tuple[int, int]]:
+        """
+        Merge row indexes into runs of adjacent rows, as start and stop
+        indexes in ascending order.
+        """
+
+        spans = []
+        for i in sorted(set(rows)):
+            if spans and spans[-1][1] == i:
+                spans[-1] = (spans[-1][0], i + 1)
+            else:
+                spans.append((i, i + 1))
+
+        return spans
+
+    def remove_rows(self, rows: Iterable[int], sheet_id: int = None):
+        """
+        Removes rows by their indexes in a single request. Runs of adjacent
+        rows are removed together, and the last ones first so the indexes of
+        the others stay the same.
+        """
+
+        self.remove_tab_rows({sheet_id: rows})
+
+    def remove_tab_rows(self, rows: Dict[Union[int, None], Iterable[int]]):
+        """
+        Like remove_rows, but removes rows of several tabs in a single
+        request. rows has the indexes of the rows to remove by the sheet ID
+        of their tab, None being the first tab.
+        """
+
+        requests = []
+        for sheet_id, indexes in rows.items():
+            tab = {} if sheet_id is None else {"sheetId": sheet_id}
+            requests += [
+                {
+                    "deleteDimension": {
+                        "range": {
+                            **tab,
+                            "dimension": "ROWS",
+                            "startIndex": start,
+                            "endIndex": stop
+                        }
+                    }
+                } for start, stop in reversed(self.row_spans(indexes))
+            ]
+
+        self.batch_update(requests)
+
+    def move_rows(self, moves: Dict[str, List[int]], sheets: List[dict],
+                  used_rows: Dict[str, int], header: List[str],
+                  formatting: SpreadsheetBuilder = None):
+        """
+        Move rows of the first tab to the end of other tabs in a single
+        request. moves has the indexes of the rows to move by the title of
+        the tab they go to, sheets the tabs as given by get_sheets and
+        used_rows how many rows of each tab hold values.
+
+        Tabs that don't exist yet are added, starting with header, and tabs
+        are grown to fit the rows. The rows are copied, formulas and
+        formatting included, and then removed, since moveDimension only moves
+        rows within a tab. If formatting is given, the tabs are formatted
+        like it.
+        """
+
+        tabs = {i["title"]: i for i in sheets}
+        source = sheets[0]["sheetId"]
+        next_id = max(i["sheetId"] for i in sheets) + 1
+        builder = SpreadsheetBuilder()
+        requests = []
+
+        for title, rows in moves.items():
+            spans = self.row_spans(rows)
+            start = used_rows.get(title, 0)
+            needed = max(start, 1) + sum(j - i for i, j in spans)
+
+            if title in tabs:
+                sheet_id = tabs[title]["sheetId"]
+                row_count = tabs[title].get("gridProperties", {}).get(
+                    "rowCount", 0)
+                if needed > row_count:
+                    requests.append({
+                        "appendDimension": {
+                            "sheetId": sheet_id,
+                            "dimension": "ROWS",
+                            "length": needed - row_count
+                        }
+                    })
+            else:
+                sheet_id = next_id
+                next_id += 1
+                requests.append({
+                    "addSheet": {
+                        "properties": {
+                            "sheetId": sheet_id,
+                            "title": title,
+                            "gridProperties": {
+                                "rowCount": needed
+                            }
+                        }
+                    }
+                })
+
+            if start == 0:
+                requests.append({
+                    "updateCells": {
+                        "range": {
+                            "sheetId": sheet_id
+                        },
+                        "rows": [{"values": [builder.cell(i)
+                                             for i in header]}],
+                        "fields": "userEnteredValue"
+                    }
+                })
+                start = 1
+
+            for i, j in spans:
+                requests.append({
+                    "copyPaste": {
+                        "source": {
+                            "sheetId": source,
+                            "startRowIndex": i,
+                            "endRowIndex": j
+                        },
+                        "destination": {
+                            "sheetId": sheet_id,
+                            "startRowIndex": start,
+                            "endRowIndex": start + j - i
+                        },
+                        "pasteType": "PASTE_NORMAL"
+                    }
+                })
+                start += j - i
+
+            if formatting is not None:
+                requests += formatting.format_requests(sheet_id=sheet_id)
+
+        moved = [j for i in moves.values() for j in i]
+        requests += [
+            {
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": source,
+                        "dimension": "ROWS",
+                        "startIndex": start,
+                        "endIndex": stop
+                    }
+                }
+            } for start, stop in reversed(self.row_spans(moved))
+        ]
+
+        self.batch_update(requests)
 
     def update_value(self, value: List[List[str]], start_index: Tuple[int, int],
                      stop_index):
@@ -220,7 +610,7 @@ class DocsHandler:
             spreadsheetId=self.spreadsheet_id, range=coordinates,
             valueInputOption="USER_ENTERED", body=body)
 
-        request.execute()
+        self.execute(request, "values.update")
 
     def freeze_row(self, rows: int = 1):
         """
@@ -245,13 +635,96 @@ class DocsHandler:
             'requests': requests
         }
 
-        self.service.spreadsheets().batchUpdate(
+        self.execute(self.service.spreadsheets().batchUpdate(
             spreadsheetId=self.spreadsheet_id,
-            body=body).execute()
+            body=body), "spreadsheets.batchUpdate")
+
+    def batch_update(self, requests: List[dict]):
+        """
+        Send several batchUpdate requests at once. They are applied in order,
+        and if one fails none of them are.
+        """
+
+        if not requests:
+            return
+
+        self.execute(self.service.spreadsheets().batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={'requests': requests}), "spreadsheets.batchUpdate")
+
+    def get_sheets(self) -> List[dict]:
+        """
+        The properties of the tabs in the spreadsheet in order, such as their
+        titles, sheet IDs and sizes.
+        """
+
+        spreadsheet = self.execute(self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, fields="sheets.properties"),
+            "spreadsheets.get")
+
+        return [i["properties"] for i in spreadsheet.get("sheets", [])]
+
+    def get_tabs(self) -> Dict[str, int]:
+        """
+        The titles of the tabs in the spreadsheet and their sheet IDs.
+        """
+
+        return {i["title"]: i["sheetId"] for i in self.get_sheets()}
 
-    def clear_sheet(self):
+    def replace_tab(self, title: str, values: List[List[str]]):
         """
-        Deletes all content in a sheet.
+        Replace everything in a tab with values, adding the tab if there
+        isn't one with that title. The tab is resized to fit the values, and
+        it all takes one read and one write.
+        """
+
+        tabs = self.get_tabs()
+        requests = []
+        sheet_id = tabs.get(title)
+        if sheet_id is None:
+            sheet_id = max(list(tabs.values()) + [-1]) + 1
+            requests.append({
+                "addSheet": {
+                    "properties": {
+                        "sheetId": sheet_id,
+                        "title": title
+                    }
+                }
+            })
+
+        builder = SpreadsheetBuilder()
+        builder.set_values(values)
+        requests += [
+            {
+                "updateSheetProperties": {
+                    "properties": {
+                        "sheetId": sheet_id,
+                        "gridProperties": {
+                            "rowCount": builder.row_count(),
+                            "columnCount": builder.column_count()
+                        }
+                    },
+                    "fields": "gridProperties(rowCount,columnCount)"
+                }
+            },
+            {
+                "updateCells": {
+                    "range": {
+                        "sheetId": sheet_id
+                    },
+                    "rows": [{"values": [builder.cell(j) for j in i]}
+                             for i in values],
+                    "fields": "userEnteredValue,userEnteredFormat.numberFormat"
+                }
+            }
+        ]
+
+        self.batch_update(requests)
+
+    def clear_sheet(self, sheet_ids: Iterable[int] = ()):
+        """
+        Deletes all content in a sheet, and in the tabs with sheet_ids in
+        the same request.
         """
 
         requests = [
@@ -263,15 +736,34 @@ class DocsHandler:
                 }
             }
 
+        ] + [
+            {
+                "updateCells": {
+                    "range": {
+                        "sheetId": i
+                    },
+                    "fields": "userEnteredValue"
+                }
+            } for i in sheet_ids
         ]
 
         body = {
             'requests': requests
         }
 
-        self.service.spreadsheets().batchUpdate(
+        self.execute(self.service.spreadsheets().batchUpdate(
             spreadsheetId=self.spreadsheet_id,
-            body=body).execute()
+            body=body), "spreadsheets.batchUpdate")
+
+    @staticmethod
+    def execute(request, endpoint: str):
+        """
+        Execute a request built with the service, recording it in the
+        metrics under the given endpoint name. Requests are paced to stay
+        within the Sheets quota and retried when rate limited.
+        """
+
+        return quota.scheduler.execute(request, endpoint)
 
     @staticmethod
     def convert_a1(start_coordinate: Tuple[int, int],
@@ -0,0 +1,9 @@
+import os
+
+# The height of the rows of movies in Google Sheets, in pixels, see
+# SheetsHelper.format_sheet. Posters are drawn to fit their cell, so they are
+# fetched in the smallest size that fills it, see posters.pick_size.
+ROW_HEIGHT = int(os.environ.get("SHEET_ROW_HEIGHT", 148))
+
+# The height of the header row.
+FIRST_ROW_HEIGHT = 30
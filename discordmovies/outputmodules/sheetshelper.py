@@ -1,6 +1,19 @@
-from discordmovies.outputmodules.googleutils import DocsHandler
-from typing import List, Union
+import datetime
+from discordmovies.outputmodules.googleutils import DocsHandler, \
+    SpreadsheetBuilder
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 from discordmovies.attributes import DiscordMoviesAttributes
+from discordmovies.links import LinkRegistry, as_registry
+from discordmovies.movies import MovieList
+from discordmovies.outputmodules.layout import FIRST_ROW_HEIGHT, ROW_HEIGHT
+from discordmovies.report import REPORT_TAB, Report
+
+# The ways movies can be moved out of the first tab, see
+# SheetsHelper.shard_sheet.
+SHARD_MODES = ["watched", "year"]
+
+# Where watched movies are moved to when sharding by "watched".
+WATCHED_TAB = "Watched"
 
 
 class SheetsHelper:
@@ -10,12 +23,24 @@ class SheetsHelper:
     """
 
     def __init__(self, attributes: DiscordMoviesAttributes,
-                 spreadsheet_id: str = None, reformat: bool = False):
+                 spreadsheet_id: str = None, reformat: bool = False,
+                 shard: str = None):
+        if shard is not None and shard not in SHARD_MODES:
+            raise ValueError(f"shard must be one of "
+                             f"{', '.join(SHARD_MODES)}, not {shard}.")
+
         self.attributes = attributes
         self.handler = DocsHandler(spreadsheet_id=spreadsheet_id)
         self.handler.setup_docs()
+        # Finish what an earlier run didn't before anything is read.
+        self.handler.resume_upload()
         self.values = None
         self.reformat = reformat
+        self.shard = shard
+        # The tabs of the spreadsheet, and the links in each tab movies were
+        # moved to by title, read when first needed.
+        self.sheets = None
+        self.archived = None
 
     def exists(self) -> bool:
         return self.handler.check_existence()
@@ -27,6 +52,10 @@ class SheetsHelper:
         Get all values from the sheet. Returns an empty list if there are none.
         Can specify a column if you only wish to get values from a certain
         column.
+
+        Values are cached, and the cache is kept up to date as rows are
+        written or removed, so the sheet only needs to be read again when it
+        may have been edited by someone else.
         """
 
         if self.values is None or force_recalc:
@@ -38,27 +67,32 @@ class SheetsHelper:
                 self.values = sheet["values"]
             except KeyError:
                 self.values = []
-                return []
-
-            if column:
-                column_index = self.attributes["movie_list"].get_cat_indexes(
-                )[column]
 
-                return [i[column_index] for i in self.values]
-            else:
-                return self.values
+        if column:
+            column_index = self.attributes["movie_list"].get_cat_indexes(
+            )[column]
 
+            # Sheets leaves out empty cells at the end of a row.
+            return [i[column_index] if column_index < len(i) else ""
+                    for i in self.values]
         else:
             return self.values
 
-    def remove_row_not_listed(self, values: List[str], column: int,
-                              ignore: List[List[str]]) -> bool:
+    def remove_row_not_listed(self, values: Iterable[str], column: int,
+                              ignore: List[List[str]],
+                              archived: Dict[str, List[int]] = None) -> bool:
         """
-        Remove a row if the value in its column isn't in a list. You can also
-        specify which rows to ignore in a list. When specifying what row to
-        ignore, you must pass the exact string representation of the entire row.
+        Remove a row if none of the links in its column are in a list. You can
+        also specify which rows to ignore in a list. When specifying what row
+        to ignore, you must pass the exact string representation of the entire
+        row.
+
+        Rows of the tabs movies were moved to are removed too, in the same
+        request, along with the rows of archived, their indexes by the title
+        of their tab.
         """
 
+        values = as_registry(values)
         removal_list = []
 
         contents = self.get_values()
@@ -66,60 +100,93 @@ class SheetsHelper:
         for k, i in enumerate(contents):
             if i in ignore:
                 continue
-            elif not any([j in i[column] for j in values]):
+            elif not values.matches(i[column]):
                 removal_list.append(k)
 
-        removal_list.reverse()
+        tabs = self.find_archived(lambda i: not values.matches(i))
+        for title, rows in (archived or {}).items():
+            tabs[title] = sorted(set(tabs.get(title, []) + rows))
 
-        for i in removal_list:
-            self.handler.remove_row(i, i + 1)
+        self.delete_rows(rows=removal_list, archived=tabs)
 
         return True
 
-    def remove_row_listed(self, values: List[str], column: int):
+    def remove_row_listed(self, values: Iterable[str], column: int):
         """
-        Remove a row if the contents of one of its columns matches a value/s.
+        Remove a row if one of the links in its column is in a list, from the
+        tabs movies were moved to too.
         """
 
+        values = as_registry(values)
         removal_list = []
 
         contents = self.get_values()
 
         for k, i in enumerate(contents):
-            if any([j in i[column] for j in values]):
+            if values.matches(i[column]):
                 removal_list.append(k)
 
-        removal_list.reverse()
-
-        for i in removal_list:
-            self.handler.remove_row(i, i + 1)
+        self.delete_rows(rows=removal_list,
+                         archived=self.find_archived(values.matches))
 
         return True
 
-    def format_sheet(self, row_height: int = 148,
-                     first_row_height: int = 30):
+    def delete_rows(self, rows: List[int],
+                    archived: Dict[str, List[int]] = None):
+        """
+        Remove rows of the first tab, and the rows of archived from the tabs
+        movies were moved to, their indexes by the title of their tab, in a
+        single request. The cached values are kept up to date.
+        """
+
+        tabs = {None: rows}
+        archived = {i: j for i, j in (archived or {}).items() if j}
+        if archived:
+            sheet_ids = {i["title"]: i["sheetId"] for i in self.get_sheets()}
+            for title, indexes in archived.items():
+                tabs[sheet_ids[title]] = indexes
+
+        self.handler.remove_tab_rows(tabs)
+
+        contents = self.get_values()
+        for i in sorted(rows, reverse=True):
+            del contents[i]
+        for title, indexes in archived.items():
+            for i in sorted(indexes, reverse=True):
+                del self.archived[title][i]
+
+    def format_sheet(self, row_height: int = ROW_HEIGHT,
+                     first_row_height: int = FIRST_ROW_HEIGHT,
+                     builder: SpreadsheetBuilder = None):
         """
-        Format a sheet to make it look pretty.
+        Format a sheet to make it look pretty. If a builder is given, the
+        formatting is added to the sheet it builds, otherwise it is applied
+        to the existing sheet in a single request.
         """
 
-        self.handler.adjust_row_height(row_height)
-        self.handler.adjust_row_height(height=first_row_height, start_row=0,
-                                       end_row=1)
-        self.handler.set_alignment()
-        self.handler.freeze_row(1)
+        target = builder if builder is not None else SpreadsheetBuilder()
+        target.set_row_height(row_height)
+        target.set_row_height(height=first_row_height, start_row=0,
+                              end_row=1)
+        target.set_alignment()
+        target.freeze_rows(1)
+
+        if builder is None:
+            self.handler.batch_update(target.format_requests())
 
-    def update_watched(self, values: List[str]):
+    def update_watched(self, values: Iterable[str]):
         """
         Checks values in watched column and updates them if they've changed.
         """
+        values = as_registry(values)
         if "Watched" in self.attributes["movie_list"].get_categories():
             column_id = self.attributes["movie_list"].get_cat_indexes()[
                 "Watched"]
-            row_indexes = []
+            row_indexes = set()
 
             for k, i in enumerate(self.get_values(column="Link")):
-                if any(j in i for j in values):
-                    row_indexes.append(k)
+                if values.matches(i):
+                    row_indexes.add(k)
 
             for i, j in enumerate(self.get_values(column="Watched",
                                                   force_recalc=True)):
@@ -127,29 +194,40 @@ class SheetsHelper:
                 )[column_id]:
                     continue
 
+                # Sheets reads checkboxes back as booleans, and rows written
+                # in this run are cached as text.
                 if i in row_indexes:
-                    if j != "TRUE":
+                    if str(j).upper() != "TRUE":
                         self.handler.update_value(value=[["TRUE"]],
                                                   start_index=(column_id, i),
                                                   stop_index=(column_id, i))
+                        self.set_cached(i, column_id, "TRUE")
 
-                else:
+                elif str(j).upper() != "FALSE":
                     self.handler.update_value(value=[["FALSE"]],
                                               start_index=(column_id, i),
                                               stop_index=(column_id, i))
+                    self.set_cached(i, column_id, "FALSE")
 
         else:
             print("Watched column not found, watched movies not updated.")
 
+    def set_cached(self, row: int, column: int, value: str):
+        """
+        Keep the cached values in line with a cell that was written.
+        """
+
+        cells = self.values[row]
+        cells.extend([""] * (column + 1 - len(cells)))
+        cells[column] = value
+
     def reformat_sheet(self):
         """
-        Re-formats the sheet by deleting all values and reinserting them.
+        Re-formats the sheet in place. The values are left as they are, only
+        the formatting of the grid is reset.
         """
 
-        values = self.get_values(force_recalc=True)
-        self.handler.clear_sheet()
         self.format_sheet()
-        self.handler.append_sheet(values=values, quiet=True)
 
     def write_existing(self, overwrite: bool = False):
         """
@@ -158,31 +236,44 @@ class SheetsHelper:
         all films.
 
         The overwrite option specifies whether the existing sheet's data should
-        be overwritten. It may be overwritten anyway if reformat is set to true.
-        Important to note is that only values being currently written to the
-        sheet will be on the sheet after a overwrite.
+        be overwritten, which is needed when its columns don't match the
+        current ones. Important to note is that only values being currently
+        written to the sheet will be on the sheet after a overwrite. The sheet
+        is also reformatted after an overwrite, or if reformat is set to true.
         """
 
         if overwrite:
-            self.handler.clear_sheet()
-            values = self.attributes["movie_list"].get_movies_list()
-        else:
-            values = self.attributes["movie_list"].get_movies_list(
-                attributes_key=False)
+            # Movies moved to other tabs are moved again from the rewritten
+            # first tab, see shard_sheet, so they're laid out like it.
+            archived = self.get_archived()
+            tabs = {i["title"]: i["sheetId"] for i in self.get_sheets()} \
+                if archived else {}
+            self.handler.clear_sheet(sheet_ids=[tabs[i] for i in archived])
+            self.values = []
+            self.archived = {i: [] for i in archived}
+
+        # The header is added below if the sheet is empty.
+        values = self.attributes["movie_list"].get_movies_list(
+            attributes_key=False)
 
         link_column = self.attributes["movie_list"].get_cat_indexes()["Link"]
         categories = self.attributes["movie_list"].get_categories()
         ignore_column = [categories]
 
         if not overwrite:
+            # Movies that aren't watched anymore go back to the first tab.
+            unwatched, restored = self.get_unwatched_archived()
             self.remove_row_not_listed(values=self.attributes["links"],
                                        column=link_column,
-                                       ignore=ignore_column)
+                                       ignore=ignore_column,
+                                       archived=unwatched)
+            values = restored + values
 
         if not self.get_values():
             values.insert(0, categories)
 
         self.handler.append_sheet(values=values)
+        self.get_values().extend(values)
 
         if self.attributes["watched_links"]:
             self.update_watched(values=self.attributes["watched_links"])
@@ -190,13 +281,284 @@ class SheetsHelper:
         if self.reformat or overwrite:
             self.reformat_sheet()
 
-    def write_new(self):
+        if self.shard:
+            self.shard_sheet()
+
+    def write_new(self, movie_list: MovieList = None):
         """
-        Create a new sheet, format it, and write to it.
+        Create a new sheet, format it, and write the movies of movie_list to
+        it, all movies by default.
         """
 
-        values = self.attributes["movie_list"].get_movies_list()
+        if movie_list is None:
+            movie_list = self.attributes["movie_list"]
+        values = movie_list.get_movies_list()
 
-        self.handler.create_sheet(title=self.attributes["name"])
-        self.format_sheet()
-        self.handler.fill_sheet(inputs=values)
+        # Sheets small enough to upload at once are created with their
+        # contents and formatting in a single request.
+        if len(self.handler.split_rows(values)) > 1:
+            self.handler.create_sheet(title=self.attributes["name"])
+            self.format_sheet()
+            self.handler.fill_sheet(inputs=values)
+        else:
+            builder = SpreadsheetBuilder(title=self.attributes["name"])
+            builder.set_values(values)
+            self.format_sheet(builder=builder)
+            self.handler.create_spreadsheet(builder)
+
+        self.values = [list(i) for i in values]
+
+        if self.shard:
+            self.shard_sheet()
+
+    def get_sheets(self) -> List[dict]:
+        """
+        The tabs of the spreadsheet, see DocsHandler.get_sheets. They are
+        read once and kept until tabs are added.
+        """
+
+        if self.sheets is None:
+            self.sheets = self.handler.get_sheets()
+
+        return self.sheets
+
+    def is_shard(self, title: str) -> bool:
+        """
+        Whether a tab is one movies are moved to with the current shard mode.
+        """
+
+        if self.shard == "watched":
+            return title == WATCHED_TAB
+        if self.shard == "year":
+            return len(title) == 4 and title.isdigit()
+
+        return False
+
+    @staticmethod
+    def year_of(value: Union[str, int, float]) -> Union[int, None]:
+        """
+        The year of a suggestion date. Dates are written as text, but if
+        Sheets turned them into dates they are read back as days since
+        1899-12-30.
+        """
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return (datetime.date(1899, 12, 30) +
+                    datetime.timedelta(days=int(value))).year
+
+        value = str(value)
+        if value[:4].isdigit():
+            return int(value[:4])
+
+        return None
+
+    def shard_of(self, row: List[str]) -> Union[str, None]:
+        """
+        The title of the tab a row belongs in, None if it stays in the first
+        tab. With "watched", watched movies are moved to the Watched tab, and
+        with "year", movies suggested before this year to a tab named after
+        the year.
+        """
+
+        indexes = self.attributes["movie_list"].get_cat_indexes()
+
+        def cell(category: str) -> Union[str, None]:
+            index = indexes.get(category)
+            if index is None or index >= len(row):
+                return None
+            return row[index]
+
+        if self.shard == "watched":
+            if str(cell("Watched")).upper() == "TRUE":
+                return WATCHED_TAB
+        elif self.shard == "year":
+            year = self.year_of(cell("Date Suggested") or "")
+            if year is not None and year < datetime.date.today().year:
+                return str(year)
+
+        return None
+
+    def get_archived(self) -> Dict[str, List[str]]:
+        """
+        The link column of each tab movies were moved to, header included, by
+        the title of the tab. All of them are read in a single request, once.
+        """
+
+        if self.archived is None:
+            self.archived = {}
+            if self.shard and self.exists():
+                titles = [i["title"] for i in self.get_sheets()[1:]
+                          if self.is_shard(i["title"])]
+                column = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"[self.attributes[
+                    "movie_list"].get_cat_indexes()["Link"]]
+                values = self.handler.get_ranges(
+                    [f"'{i}'!{column}:{column}" for i in titles])
+                for title, rows in zip(titles, values):
+                    self.archived[title] = [i[0] if i else "" for i in rows]
+
+        return self.archived
+
+    def get_archived_links(self) -> LinkRegistry:
+        """
+        The links of the movies that were moved out of the first tab, so
+        they aren't added to it again.
+        """
+
+        links = LinkRegistry()
+        for i in self.get_archived().values():
+            for j in i[1:]:
+                links.extend(LinkRegistry.split(str(j)))
+
+        return links
+
+    def get_archived_values(self) -> List[List[str]]:
+        """
+        The rows of the movies that were moved out of the first tab, without
+        the headers of their tabs. Tabs whose columns aren't the current ones
+        are left out, their rows wouldn't line up with those of the first.
+        """
+
+        values = self.handler.get_ranges(
+            [f"'{i}'!A:Z" for i in self.get_archived()])
+        categories = self.attributes["movie_list"].get_categories()
+
+        return [j for i in values if i and i[0] == categories
+                for j in i[1:]]
+
+    def find_archived(self, found: Callable[[str], bool]) \
+            -> Dict[str, List[int]]:
+        """
+        The indexes of the rows of the tabs movies were moved to whose links
+        found is true for, by the title of their tab. Headers are skipped.
+        """
+
+        return {title: [k for k, i in enumerate(links[1:], 1)
+                        if found(str(i))]
+                for title, links in self.get_archived().items()}
+
+    def get_unwatched_archived(self) -> Tuple[Dict[str, List[int]],
+                                              List[List[str]]]:
+        """
+        The rows of the Watched tab whose movies are still listed but aren't
+        watched anymore, by their indexes in the tab as they are given to
+        remove_row_not_listed, and as values with their watched cell set to
+        FALSE, to be written to the first tab instead. The tab is only read
+        if there are any. Like update_watched, nothing is done if no movies
+        are watched.
+        """
+
+        links = self.attributes["links"]
+        watched = self.attributes["watched_links"]
+        column = self.attributes["movie_list"].get_cat_indexes().get(
+            "Watched")
+        if self.shard != "watched" or not watched or column is None:
+            return {}, []
+
+        rows = self.find_archived(
+            lambda i: links.matches(i) and not watched.matches(i)).get(
+            WATCHED_TAB)
+        if not rows:
+            return {}, []
+
+        values, = self.handler.get_ranges([f"'{WATCHED_TAB}'!A:Z"])
+        restored = []
+        for i in rows:
+            row = list(values[i]) if i < len(values) else []
+            row.extend([""] * (column + 1 - len(row)))
+            row[column] = "FALSE"
+            restored.append(row)
+
+        return {WATCHED_TAB: rows}, restored
+
+    def shard_sheet(self):
+        """
+        Move the rows that belong in other tabs, see shard_of, out of the
+        first tab, keeping it small and quick to open and read. The tabs are
+        in the same spreadsheet, added and formatted like the first as
+        needed, and all rows are moved in a single request.
+        """
+
+        values = self.get_values()
+        moves = {}
+        for k, i in enumerate(values[1:], 1):
+            title = self.shard_of(i)
+            if title is not None:
+                moves.setdefault(title, []).append(k)
+
+        if not moves:
+            return
+
+        archived = self.get_archived()
+        formatting = SpreadsheetBuilder()
+        self.format_sheet(builder=formatting)
+        self.handler.move_rows(
+            moves=moves, sheets=self.get_sheets(),
+            used_rows={i: len(j) for i, j in archived.items()},
+            header=values[0], formatting=formatting)
+
+        link_index = self.attributes["movie_list"].get_cat_indexes()["Link"]
+        for title, rows in moves.items():
+            archived.setdefault(title, [values[0][link_index]]).extend(
+                values[i][link_index] if link_index < len(values[i]) else ""
+                for i in rows)
+
+        moved = {j for i in moves.values() for j in i}
+        self.values = [j for i, j in enumerate(values) if i not in moved]
+        # Tabs were added or grown.
+        self.sheets = None
+
+        print(f"Moved {len(moved)} movies to {', '.join(sorted(moves))}.")
+
+    def write_report(self, report: Report):
+        """
+        Write a report to its own tab of the spreadsheet, replacing the one
+        written before.
+        """
+
+        self.handler.replace_tab(title=REPORT_TAB, values=report.rows())
+
+    def append_movies(self, movie_list: MovieList):
+        """
+        Append movies to the end of the sheet, along with the header if the
+        sheet is empty. The sheet is created if it doesn't exist.
+        """
+
+        values = movie_list.get_movies_list(attributes_key=False)
+
+        if not self.get_values():
+            if not self.exists():
+                self.write_new(movie_list=movie_list)
+                return
+            values.insert(0, movie_list.get_categories())
+
+        self.handler.append_sheet(values=values)
+        self.get_values().extend(values)
+
+    def remove_links(self, links: Iterable[str]):
+        """
+        Remove rows whose link matches any of the given links.
+        """
+
+        self.remove_row_listed(
+            values=links,
+            column=self.attributes["movie_list"].get_cat_indexes()["Link"])
+
+    def mark_watched(self, links: Iterable[str], watched: bool = True):
+        """
+        Set the watched column of rows whose link matches any of the given
+        links. Unlike update_watched, only the matching rows are written.
+        """
+
+        if "Watched" not in self.attributes["movie_list"].get_categories():
+            print("Watched column not found, watched movies not updated.")
+            return
+
+        links = as_registry(links)
+        column_id = self.attributes["movie_list"].get_cat_indexes()["Watched"]
+        value = "TRUE" if watched else "FALSE"
+
+        for k, i in enumerate(self.get_values(column="Link")):
+            if k > 0 and links.matches(i):
+                self.handler.update_value(value=[[value]],
+                                          start_index=(column_id, k),
+                                          stop_index=(column_id, k))
@@ -0,0 +1,58 @@
+import re
+from typing import List, Union
+
+# The values of a file, or of a movie, as the columns and reports that
+# filter and count them need them. They come as text from movies and CSV
+# files, and Sheets gives some of them back as numbers or booleans. Values
+# that aren't known are None.
+
+
+def first_line(value) -> str:
+    # Merged duplicates hold a value per movie on separate lines.
+    return str(value).split("\n", 1)[0].strip()
+
+
+def is_watched(value) -> bool:
+    # Sheets gives the watched column back as booleans, CSV files as text.
+    return first_line(value).upper() == "TRUE"
+
+
+def parse_runtime(value) -> Union[float, None]:
+    """
+    A runtime in minutes, from TMDB's "142" or MyAnimeList's "1 hr 55 min" or
+    "24 min per ep".
+    """
+
+    value = first_line(value)
+    if value.isdigit():
+        return float(value) or None
+
+    parts = dict((j, float(i)) for i, j in
+                 re.findall(r"(\d+)\s*(hr|min|sec)", value))
+    if not parts:
+        return None
+
+    return parts.get("hr", 0) * 60 + parts.get("min", 0) + \
+        parts.get("sec", 0) / 60
+
+
+def parse_score(value) -> Union[float, None]:
+    """
+    A user score. Neither site scores titles 0, they give that to titles
+    without enough votes, so 0 is None like a missing score.
+    """
+
+    try:
+        return float(first_line(value)) or None
+    except ValueError:
+        return None
+
+
+def parse_year(value) -> Union[int, None]:
+    match = re.match(r"(\d{4})", first_line(value))
+    return int(match.group(1)) if match else None
+
+
+def parse_genres(value) -> List[str]:
+    genres = [j.strip() for i in str(value).split("\n") for j in i.split(",")]
+    return list(dict.fromkeys(i for i in genres if i and i != "None"))
@@ -0,0 +1,145 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import List
+from discordmovies.metrics import metrics
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread at a fixed interval and counts how often
+    each stack is seen. The counts can be written in the collapsed format
+    used by flamegraph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = threading.Event()
+
+    def run(self):
+        self.running.set()
+        while self.running.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename == __file__:
+                        # The profiler's own work, don't count it.
+                        stack = None
+                        break
+                    stack.append(f"{os.path.basename(code.co_filename)}:"
+                                 f"{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running.clear()
+        self.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Profiles a run with cProfile and tracemalloc. When stopped it writes
+    three files to the given directory:
+
+    - discordmovies.pstats, loadable with pstats or snakeviz.
+    - discordmovies.collapsed, sampled stacks for flamegraph tools.
+    - allocations.txt, the top allocations made during each of the given
+      pipeline stages.
+    """
+
+    STAGES = ["fill_movie_list", "merge_duplicates", "fill_all_metadata",
+              "write"]
+
+    def __init__(self, directory: str = "profile", top: int = 10,
+                 interval: float = 0.005, stages: List[str] = None):
+        self.directory = directory
+        self.top = top
+        self.stages = stages if stages is not None else self.STAGES
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), interval=interval)
+        self.snapshots = {}
+        self.report = []
+
+    def start(self) -> "Profiler":
+        os.makedirs(self.directory, exist_ok=True)
+        tracemalloc.start()
+        metrics.add_listener(self)
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        self.profile.disable()
+        self.sampler.stop()
+        metrics.remove_listener(self)
+        tracemalloc.stop()
+
+        self.profile.dump_stats(os.path.join(self.directory,
+                                             "discordmovies.pstats"))
+        self.sampler.write(os.path.join(self.directory,
+                                        "discordmovies.collapsed"))
+        with open(os.path.join(self.directory, "allocations.txt"), "w") as f:
+            f.write("\n".join(self.report) + "\n")
+
+        print(f"Profile written to {self.directory}")
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def stage_started(self, name: str):
+        if name not in self.stages:
+            return
+
+        # Taking and comparing snapshots is slow, keep it out of the profile.
+        self.profile.disable()
+        self.snapshots[name] = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.profile.enable()
+
+    def stage_finished(self, name: str, seconds: float):
+        """
+        Compare memory to when the stage started and add the largest
+        differences to the report.
+        """
+
+        if name not in self.snapshots:
+            return
+
+        self.profile.disable()
+        peak = tracemalloc.get_traced_memory()[1]
+        before = self.snapshots.pop(name)
+        after = tracemalloc.take_snapshot()
+        differences = [i for i in after.compare_to(before, "lineno")
+                       if i.traceback[0].filename not in
+                       [tracemalloc.__file__, __file__]]
+
+        net = sum(i.size_diff for i in differences)
+        self.report.append(f"== {name}: {seconds:.3f} s, peak "
+                           f"{peak / 1024 ** 2:.2f} MiB, net "
+                           f"{net / 1024 ** 2:+.2f} MiB")
+        for i, j in enumerate(differences[:self.top]):
+            frame = j.traceback[0]
+            self.report.append(f"  {i + 1}) {frame.filename}:{frame.lineno}: "
+                               f"{j.size_diff / 1024:+.1f} KiB "
+                               f"({j.count_diff:+d} blocks)")
+
+        self.profile.enable()
@@ -0,0 +1,367 @@
+import json
+import os
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Union
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from discordmovies.changelog import rows_by_column
+from discordmovies.links import LinkRegistry
+from discordmovies.movies import Movie, MovieList
+from discordmovies.parsers import is_watched
+
+# Posters as Google Sheets gives them back, see Movie.format_image.
+IMAGE_FORMULA = re.compile(r'^=IMAGE\("(.*)"\)$')
+
+# Query parameters of /movies that take numbers.
+NUMBERS = {"min_score": "score", "max_score": "score",
+           "min_runtime": "runtime", "max_runtime": "runtime",
+           "min_year": "year", "max_year": "year"}
+
+
+def plain(value) -> str:
+    """
+    A value of a file as text, with posters unwrapped from their IMAGE
+    formulas.
+    """
+
+    match = IMAGE_FORMULA.match(str(value))
+    return match.group(1) if match else str(value)
+
+
+class MovieStore:
+    """
+    The movies of a file kept in memory for QueryServer, along with the
+    indexes queries use: the search indexes of MovieList, the columns of
+    MovieColumns, and the movies by link.
+
+    The list is loaded from the file once, then kept up to date with the
+    changes of each sync as Changelog events, see apply, so it never has to
+    be read again. version counts the changes, and with a token that's new
+    for every store makes up the ETag of the responses.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.movie_list = MovieList()
+        self.by_link: Dict[str, Movie] = {}
+        self.generation = uuid.uuid4().hex[:12]
+        self.version = 0
+        # Built for the first query after a change.
+        self.columns = None
+        self.positions: Dict[int, int] = {}
+        # The changelog followed for changes made by other processes.
+        self.changelog = None
+        self.offset = 0
+        self.name = None
+        self.output = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.generation}-{self.version}"'
+
+    def load(self, values: List[List[str]]):
+        """
+        Replace the movies with the rows of a file, the first of which is
+        the header.
+        """
+
+        # Files that are still empty hold every category.
+        categories = [str(i) for i in values[0]] if values else None
+        with self.lock:
+            self.movie_list = MovieList(categories=categories)
+            self.by_link = {}
+            for i in rows_by_column(values):
+                self.add(i)
+            self.changed()
+
+    def add(self, row: Dict[str, str]):
+        movie = Movie(categories=self.movie_list.get_categories(),
+                      values={i: plain(j) for i, j in row.items()
+                              if i in self.movie_list.get_categories()})
+        # Google Sheets gives it back as a boolean, CSV files as text.
+        if "Watched" in movie.info:
+            movie.info["Watched"] = str(is_watched(movie["Watched"]))
+
+        self.remove(movie["Link"])
+        self.movie_list.append(movie)
+        for i in LinkRegistry.split(movie["Link"]):
+            self.by_link[LinkRegistry.canonical(i)] = movie
+
+    def find(self, link: str) -> Union[Movie, None]:
+        for i in LinkRegistry.split(str(link)):
+            movie = self.by_link.get(LinkRegistry.canonical(i))
+            if movie is not None:
+                return movie
+
+        return None
+
+    def remove(self, link: str):
+        movie = self.find(link)
+        while movie is not None:
+            self.movie_list.remove(movie)
+            for i in LinkRegistry.split(movie["Link"]):
+                self.by_link.pop(LinkRegistry.canonical(i), None)
+            movie = self.find(link)
+
+    def changed(self):
+        self.version += 1
+        self.columns = None
+
+    def apply(self, events: Iterable[dict]) -> int:
+        """
+        Apply Changelog events to the movies, returning how many were
+        applied. Applying an event again changes nothing, so events can be
+        replayed from the start of a changelog.
+        """
+
+        applied = 0
+        with self.lock:
+            for i in events:
+                if i["event"] in ["added", "updated"]:
+                    self.add(i["movie"])
+                elif i["event"] == "removed":
+                    self.remove(i["link"])
+                elif i["event"] in ["watched", "unwatched"]:
+                    movie = self.find(i["link"])
+                    if movie is None or "Watched" not in movie.info:
+                        continue
+                    movie["Watched"] = str(i["event"] == "watched")
+                else:
+                    continue
+                applied += 1
+
+            if applied:
+                self.changed()
+
+        return applied
+
+    def follow(self, path: str, name: str = None, output: str = None):
+        """
+        Apply the events other processes append to a changelog from now on,
+        only those of the file named name written as output when they are
+        given. The changelog is checked before every query.
+        """
+
+        with self.lock:
+            self.changelog = path
+            self.name = name
+            self.output = output
+            self.offset = os.path.getsize(path) if os.path.exists(path) \
+                else 0
+
+    def refresh(self) -> int:
+        """
+        Apply the events added to the followed changelog since it was last
+        checked. A changelog that got smaller was started over, and is read
+        again from its start.
+        """
+
+        if self.changelog is None:
+            return 0
+
+        with self.lock:
+            try:
+                size = os.path.getsize(self.changelog)
+            except OSError:
+                return 0
+            if size < self.offset:
+                self.offset = 0
+            if size == self.offset:
+                return 0
+
+            with open(self.changelog, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+            # A line still being written is read next time.
+            data = data[:data.rfind(b"\n") + 1]
+            self.offset += len(data)
+
+            events = [json.loads(i) for i in data.decode("utf-8").splitlines()
+                      if i.strip()]
+            return self.apply(
+                i for i in events
+                if (self.name is None or i.get("file") == self.name) and
+                (self.output is None or i.get("output") == self.output))
+
+    def get_columns(self):
+        if self.columns is None:
+            self.columns = self.movie_list.columns()
+            self.positions = {id(j): i for i, j in
+                              enumerate(self.columns.movies)}
+
+        return self.columns
+
+    def query(self, params: Dict[str, List[str]]) -> dict:
+        """
+        The movies matching the parameters of a /movies request, see
+        QueryServer.
+        """
+
+        with self.lock:
+            columns = self.get_columns()
+            mask = np.ones(len(columns), dtype=bool)
+
+            if "title" in params and "Title" in columns.categories:
+                found = np.zeros(len(columns), dtype=bool)
+                found[[self.positions[id(i)] for i in self.movie_list.search(
+                    params["title"][0], "Title",
+                    prefix=params.get("prefix", ["false"])[0] == "true",
+                    ignore_case=True)]] = True
+                mask &= found
+            if "watched" in params:
+                watched = params["watched"][0].lower() == "true"
+                mask &= columns.watched if watched else ~columns.watched
+            if "user" in params:
+                mask &= columns.user(*params["user"])
+            if "genre" in params:
+                mask &= columns.genre(*params["genre"])
+            for i, j in NUMBERS.items():
+                if i in params:
+                    limit = float(params[i][0])
+                    values = getattr(columns, j)
+                    mask &= values >= limit if i.startswith("min_") else \
+                        values <= limit
+
+            limit = int(params["limit"][0]) if "limit" in params else None
+            indexes = columns.indexes(
+                mask=mask, sort=params.get("sort", [None])[0],
+                descending=params.get("order", ["asc"])[0] == "desc",
+                limit=limit)
+
+            return {"count": int(mask.sum()),
+                    "movies": [dict(columns.movies[i].items())
+                               for i in indexes]}
+
+    def users(self) -> dict:
+        with self.lock:
+            columns = self.get_columns()
+            counts = np.bincount(columns.user_codes,
+                                 minlength=len(columns.user_names))
+            return {"users": {i: int(j) for i, j in
+                              zip(columns.user_names, counts)}}
+
+    def genres(self) -> dict:
+        with self.lock:
+            columns = self.get_columns()
+            return {"genres": {i: int(j) for i, j in
+                               zip(columns.genre_names,
+                                   columns.genres.sum(axis=0))}}
+
+
+class QueryServer:
+    """
+    A read-only HTTP service answering queries about a file's movies from a
+    MovieStore, so bots and dashboards don't have to read the file itself,
+    and use up the Sheets quota, every time.
+
+    GET /movies returns the movies matching its parameters, combined:
+
+        title       Part of the title, case ignored. With prefix=true, the
+                    start of it.
+        watched     true or false.
+        user        Suggested by this user. Can be given several times.
+        genre       Has this genre. Can be given several times.
+        min_score, max_score, min_runtime, max_runtime, min_year, max_year
+        sort        runtime, score or year, with order=desc to reverse it.
+        limit       At most this many movies.
+
+    GET /users and /genres return how many movies each user suggested and
+    each genre has, and /health how many movies there are.
+
+    Responses carry an ETag that changes whenever the movies do. Requests
+    sending it back in If-None-Match get a 304 until then.
+    """
+
+    def __init__(self, store: MovieStore, host: str = "127.0.0.1",
+                 port: int = 8000):
+        self.store = store
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "QueryServer":
+        """
+        Serve requests in the background.
+        """
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.dispatch(self)
+
+            def do_HEAD(self):
+                server.dispatch(self)
+
+        return Handler
+
+    @staticmethod
+    def respond(handler: BaseHTTPRequestHandler, status: int,
+                body: dict = None, etag: str = None):
+        content = json.dumps(body).encode() if body is not None else b""
+        handler.send_response(status)
+        if etag is not None:
+            handler.send_header("ETag", etag)
+            # Clients may keep responses, but have to check they're current.
+            handler.send_header("Cache-Control", "no-cache")
+        if status != 304:
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        if handler.command != "HEAD" and status != 304:
+            handler.wfile.write(content)
+
+    def dispatch(self, handler: BaseHTTPRequestHandler):
+        parsed = urlparse(handler.path)
+        params = parse_qs(parsed.query)
+        path = parsed.path.rstrip("/")
+
+        routes = {"/movies": lambda: self.store.query(params),
+                  "/users": self.store.users,
+                  "/genres": self.store.genres,
+                  "/health": lambda: {"movies": len(self.store.movie_list),
+                                      "version": self.store.version}}
+        if path not in routes:
+            return self.respond(handler, 404, {"error": "Not found."})
+
+        self.store.refresh()
+        with self.store.lock:
+            etag = self.store.etag
+            match = handler.headers.get("If-None-Match", "")
+            if etag in [i.strip() for i in match.split(",")] or \
+                    match.strip() == "*":
+                return self.respond(handler, 304, etag=etag)
+
+            try:
+                body = routes[path]()
+            except ValueError as e:
+                return self.respond(handler, 400, {"error": str(e)})
+
+        self.respond(handler, 200, body, etag=etag)
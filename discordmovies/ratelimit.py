@@ -0,0 +1,31 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spaces out requests to a provider so that no more than rate are sent per
+    second on average, counting every thread in the process. After a quiet
+    period up to burst requests may be sent at once.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1 / rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        # When the next request would be allowed if there were no bursts.
+        self.next = 0.0
+
+    def reserve(self) -> float:
+        """
+        Reserve a slot for a request. Returns how many seconds to wait before
+        sending it. The wait itself is left to the caller so other threads
+        can reserve their own slots in the meantime.
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next, now)
+            self.next = start + self.interval
+
+            return max(0.0, start - now - (self.burst - 1) * self.interval)
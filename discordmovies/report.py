@@ -0,0 +1,142 @@
+import json
+from typing import Dict, Iterable, List, Union
+from discordmovies.movies import MovieList
+from discordmovies.parsers import first_line, is_watched, parse_genres, \
+    parse_score
+
+# The tab of the Google Sheet the report is written to.
+REPORT_TAB = "Report"
+
+
+def percentage(part: int, whole: int) -> str:
+    return f"{100 * part / whole:.1f}%" if whole else ""
+
+
+class Tally:
+    """
+    Running totals for a group of movies, such as those suggested by one user.
+    """
+
+    def __init__(self):
+        self.movies = 0
+        self.watched = 0
+        self.scored = 0
+        self.score_total = 0.0
+
+    def add(self, watched: bool, score: Union[float, None]):
+        self.movies += 1
+        self.watched += watched
+        if score is not None:
+            self.scored += 1
+            self.score_total += score
+
+    def watch_rate(self) -> Union[float, None]:
+        return self.watched / self.movies if self.movies else None
+
+    def average_score(self) -> Union[float, None]:
+        return self.score_total / self.scored if self.scored else None
+
+    def to_dict(self) -> dict:
+        rate = self.watch_rate()
+        score = self.average_score()
+        return {
+            "movies": self.movies,
+            "watched": self.watched,
+            "watch_rate": None if rate is None else round(rate, 4),
+            "average_score": None if score is None else round(score, 2)
+        }
+
+    def row(self, name: str) -> List[Union[str, int]]:
+        score = self.average_score()
+        return [name, self.movies, self.watched,
+                percentage(self.watched, self.movies),
+                "" if score is None else round(score, 2)]
+
+
+class Report:
+    """
+    Statistics about the movies in a file: how many each user suggested and
+    how many of those were watched, the same per genre, and the average
+    user scores. Movies are added one at a time and only running totals are
+    kept, so the whole report takes a single pass over the file.
+
+    Written alongside the file, see FileHelper.write_report, so people
+    looking at it don't have to work these out with formulas.
+    """
+
+    def __init__(self):
+        self.total = Tally()
+        self.users: Dict[str, Tally] = {}
+        self.genres: Dict[str, Tally] = {}
+
+    def add(self, movie: Dict[str, str]):
+        """
+        Add a movie, given as its attributes and their values.
+        """
+
+        watched = is_watched(movie.get("Watched", ""))
+        score = parse_score(movie.get("User Score", ""))
+
+        self.total.add(watched, score)
+
+        user = first_line(movie.get("User", "")) or "Unknown"
+        self.users.setdefault(user, Tally()).add(watched, score)
+
+        for i in parse_genres(movie.get("Genres", "")):
+            self.genres.setdefault(i, Tally()).add(watched, score)
+
+    @classmethod
+    def from_values(cls, values: Iterable[List[str]]) -> "Report":
+        """
+        A report of the rows of a file, the first of which is the header.
+        """
+
+        report = cls()
+        rows = iter(values)
+        header = next(rows, [])
+        for i in rows:
+            report.add(dict(zip(header, i)))
+
+        return report
+
+    @classmethod
+    def from_movie_list(cls, movie_list: MovieList) -> "Report":
+        report = cls()
+        for i in movie_list:
+            report.add(i.info)
+
+        return report
+
+    @staticmethod
+    def ranked(tallies: Dict[str, Tally]) -> List[str]:
+        # Most movies first, then most watched, then by name.
+        return sorted(tallies, key=lambda i: (-tallies[i].movies,
+                                              -tallies[i].watched, i))
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total.to_dict(),
+            "users": {i: self.users[i].to_dict()
+                      for i in self.ranked(self.users)},
+            "genres": {i: self.genres[i].to_dict()
+                       for i in self.ranked(self.genres)}
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def rows(self) -> List[List[Union[str, int]]]:
+        """
+        The report as a table, for a sheet: the totals, the leaderboard of
+        users and the genres, with an empty row between them.
+        """
+
+        header = ["Movies", "Watched", "Watch Rate", "Average Score"]
+
+        rows = [[""] + header, self.total.row("Total"), [],
+                ["User"] + header]
+        rows += [self.users[i].row(i) for i in self.ranked(self.users)]
+        rows += [[], ["Genre"] + header]
+        rows += [self.genres[i].row(i) for i in self.ranked(self.genres)]
+
+        return rows
@@ -0,0 +1,152 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+# Added around every line of a value, so short values still have trigrams and
+# prefix searches can require the start of a line.
+PAD = "\0"
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    The trigrams of every line of a casefolded value, each padded on both
+    sides.
+    """
+
+    grams = set()
+    for line in text.split("\n"):
+        padded = f"{PAD}{line}{PAD}"
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+class SearchIndex:
+    """
+    An inverted index from the trigrams of one attribute to the movies that
+    have them, so searches only look at movies that share every trigram
+    with the query instead of every movie. Movies are added and removed as
+    their list changes, and movies report changes to their values
+    themselves, see Movie.__setitem__.
+
+    Matching is done on the values as they are, so results are the same as
+    checking every movie.
+    """
+
+    def __init__(self, attribute: str, movies: Iterable = ()):
+        self.attribute = attribute
+        self.postings: Dict[str, set] = defaultdict(set)
+        # Each one and two character string to the trigrams that contain it,
+        # for queries too short to have trigrams of their own.
+        self.short: Dict[str, Set[str]] = defaultdict(set)
+        # The value each movie was indexed with, and its place in the list so
+        # results come out in the list's order.
+        self.values: dict = {}
+        self.order: dict = {}
+        self.counts: dict = defaultdict(int)
+        self.added = 0
+
+        for i in movies:
+            self.add(i)
+
+    def value(self, movie) -> str:
+        return str(movie.info.get(self.attribute, ""))
+
+    def index(self, movie, value: str):
+        self.values[movie] = value
+        for i in trigrams(value.casefold()):
+            if i not in self.postings:
+                for j in [i[0], i[1], i[2], i[:2], i[1:]]:
+                    self.short[j].add(i)
+            self.postings[i].add(movie)
+
+    def unindex(self, movie):
+        for i in trigrams(self.values.pop(movie).casefold()):
+            posting = self.postings[i]
+            posting.discard(movie)
+            if not posting:
+                del self.postings[i]
+
+    def add(self, movie):
+        """
+        Add a movie to the end of the list.
+        """
+
+        self.counts[movie] += 1
+        if self.counts[movie] > 1:
+            return
+
+        self.order[movie] = self.added
+        self.added += 1
+        self.index(movie, self.value(movie))
+        movie.indexes.append(self)
+
+    def remove(self, movie):
+        self.counts[movie] -= 1
+        if self.counts[movie] > 0:
+            return
+
+        del self.counts[movie]
+        del self.order[movie]
+        self.unindex(movie)
+        movie.indexes.remove(self)
+
+    def update(self, movie, attribute: str):
+        """
+        Called by movies when the value of one of their attributes changes.
+        """
+
+        if attribute != self.attribute:
+            return
+
+        value = self.value(movie)
+        if value != self.values[movie]:
+            self.unindex(movie)
+            self.index(movie, value)
+
+    def candidates(self, query: str) -> set:
+        """
+        The movies whose values have every trigram of the casefolded query.
+        """
+
+        if len(query) >= 3:
+            grams = [self.postings.get(query[i:i + 3], set())
+                     for i in range(len(query) - 2)]
+            grams.sort(key=len)
+            return grams[0].intersection(*grams[1:])
+
+        candidates = set()
+        for i in self.short.get(query, ()):
+            candidates.update(self.postings.get(i, ()))
+
+        return candidates
+
+    def search(self, value: str, prefix: bool = False,
+               ignore_case: bool = False) -> List:
+        """
+        The movies whose value contains value, or with prefix, has a line
+        that starts with it. Each movie is returned once, in the order of
+        the list.
+        """
+
+        if not value or "\n" in value:
+            # These can't be looked up by trigrams.
+            candidates = self.values
+        else:
+            candidates = self.candidates(
+                (PAD if prefix else "") + value.casefold())
+
+        if ignore_case:
+            value = value.casefold()
+
+        matches = []
+        for i in candidates:
+            text = self.values[i].casefold() if ignore_case else self.values[i]
+            if prefix:
+                if any(j.startswith(value) for j in text.split("\n")):
+                    matches.append(i)
+            elif value in text:
+                matches.append(i)
+
+        matches.sort(key=self.order.__getitem__)
+
+        return matches
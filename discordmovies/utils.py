@@ -1,3 +1,6 @@
+import os
+
+
 class Utils:
     """
     A class containing utility functions that can be used by other classes in
@@ -20,3 +23,16 @@ class Utils:
             dupes[item[0]].append(i)
 
         return dupes
+
+    @staticmethod
+    def atomic_write(path: str, content: str):
+        """
+        Write to a temporary file first and then move it into place, so
+        readers such as the metrics textfile collector, or a run that starts
+        while another is saving its checkpoint, never see a partial file.
+        """
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            f.write(content)
+        os.replace(temporary, path)
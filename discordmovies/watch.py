@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import List
+from discordmovies.attributes import DiscordMoviesAttributes, Keys, \
+    DiscordAttributes
+from discordmovies.listener import Listener
+from discordmovies.metrics import metrics
+from discordmovies.outputmodules.filehelper import FileHelper
+
+
+class Watcher(Listener):
+    """
+    Keeps files up to date by polling Discord on a schedule, for when the
+    gateway can't be used. Everything is set up once and kept between cycles:
+    the files and the Sheets service, HTTP connections and what is known
+    about each message.
+
+    Every interval only messages newer than the last one seen are fetched.
+    Edits and deletes can't be seen that way, so every full_sync_every cycles
+    the channel history is fetched again and compared to what was seen
+    before. Changes are written the same way as in Listener, at most once per
+    cycle unless debounce holds them back.
+    """
+
+    def __init__(self, attributes: DiscordMoviesAttributes, keys: Keys,
+                 discord_attr: DiscordAttributes,
+                 remove_watched: bool = False, interval: float = 300,
+                 full_sync_every: int = 12, debounce: float = 0.0,
+                 max_delay: float = 3600.0):
+        super().__init__(attributes=attributes, keys=keys,
+                         discord_attr=discord_attr,
+                         remove_watched=remove_watched, debounce=debounce,
+                         max_delay=max_delay)
+        self.interval = interval
+        self.full_sync_every = full_sync_every
+        self.stopped = threading.Event()
+
+    def connect(self, timeout: float = 30):
+        """
+        Go through the channel history once, there is nothing to connect to.
+        """
+
+        with metrics.stage("load_history"):
+            self.load_history()
+
+    def run(self, files: List[FileHelper]):
+        """
+        Poll and apply changes to the given files until stop() is called.
+        """
+
+        self.files = files
+        self.stopped.clear()
+        cycle = 0
+        next_poll = time.monotonic() + self.interval
+
+        while True:
+            wait = next_poll - time.monotonic()
+            if self.changes:
+                wait = min(wait, self.changes.time_until_due())
+            if self.stopped.wait(max(0.0, wait)):
+                break
+
+            if time.monotonic() >= next_poll:
+                cycle += 1
+                full = bool(self.full_sync_every) and \
+                    cycle % self.full_sync_every == 0
+                with metrics.stage("poll"):
+                    self.poll(full=full)
+                next_poll = time.monotonic() + self.interval
+
+            if self.changes.due():
+                self.flush()
+
+        self.flush()
+
+    def stop(self):
+        self.stopped.set()
+
+    def poll(self, full: bool = False):
+        """
+        Fetch messages and record the changes they make.
+        """
+
+        for channel in self.messages:
+            if full or self.latest[channel] is None:
+                self.compare_history(channel)
+                continue
+
+            pages = self.source.get_new_messages(channel_id=channel,
+                                                 after=self.latest[channel])
+            messages = [j for i in pages for j in i]
+            for i in sorted(messages, key=lambda k: int(k["id"])):
+                self.handle("MESSAGE_CREATE", {**i, "channel_id": channel})
+
+    def compare_history(self, channel: str):
+        """
+        Fetch the channel history again and record edits and deletes, as well
+        as any new messages.
+        """
+
+        pages = self.source.get_messages(channel_id=channel)
+        messages = {j["id"]: j for i in pages for j in i}
+        if not messages:
+            return
+
+        # Messages older than what was fetched may still exist, they are
+        # only beyond max_messages.
+        oldest = min(int(i) for i in messages)
+        for i in list(self.messages[channel]):
+            if int(i) >= oldest and i not in messages:
+                self.handle("MESSAGE_DELETE", {"id": i,
+                                               "channel_id": channel})
+
+        for i in sorted(messages, key=int):
+            self.handle("MESSAGE_UPDATE", {**messages[i],
+                                           "channel_id": channel})